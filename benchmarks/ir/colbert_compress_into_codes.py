@@ -0,0 +1,111 @@
+"""
+Measures the throughput (tokens/sec) and peak memory of assigning embeddings to their nearest centroid in
+`ResidualCodec.compress_into_codes`: the previous implementation, which materializes the full
+(#centroids x #tokens) score matrix of each batch, against the tiled argmax and FAISS's exact inner-product search
+(`ColBERTConfig(centroid_assignment=...)`). Codes are compared against those of the previous implementation.
+Each engine runs in a fresh process, so that its peak RSS is measured on its own.
+
+    python benchmarks/ir/colbert_compress_into_codes.py --num_centroids 65536 --num_tokens 262144 --dim 128
+"""
+import multiprocessing
+import resource
+import time
+import torch
+
+from argparse import ArgumentParser
+
+from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual import ResidualCodec
+from primeqa.ir.dense.colbert_top.colbert.infra.config import ColBERTConfig
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
+
+
+def legacy_compress_into_codes(self, embs, out_device):
+    codes = []
+
+    bsize = (1 << 29) // self.centroids.size(0)
+    for batch in embs.split(bsize):
+        if self.use_gpu:
+            indices = (self.centroids @ batch.T.cuda().half()).max(dim=0).indices.to(device=out_device)
+        else:
+            indices = (self.centroids @ batch.T.cpu().float()).max(dim=0).indices.to(device=out_device)
+        codes.append(indices)
+
+    return torch.cat(codes)
+
+
+def random_unit_vectors(n, dim, generator):
+    return torch.nn.functional.normalize(torch.randn(n, dim, generator=generator), dim=-1)
+
+
+def peak_memory_mb(use_gpu):
+    if use_gpu:
+        return torch.cuda.max_memory_allocated() / (1 << 20)
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_engine(args, engine, results):
+    torch.set_num_threads(args.num_threads)
+
+    generator = torch.Generator().manual_seed(args.seed)
+    centroids = random_unit_vectors(args.num_centroids, args.dim, generator)
+    embs = random_unit_vectors(args.num_tokens, args.dim, generator)
+
+    config = ColBERTConfig(dim=args.dim, nbits=2, centroid_assignment='faiss' if engine == 'faiss' else 'tiled')
+    codec = ResidualCodec(config=config, centroids=centroids)
+    out_device = 'cuda' if codec.use_gpu else 'cpu'
+
+    compress_into_codes = legacy_compress_into_codes if engine == 'legacy' else ResidualCodec.compress_into_codes
+    compress_into_codes(codec, embs[:1024], out_device)  # warm-up
+
+    if codec.use_gpu:
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+
+    baseline = peak_memory_mb(codec.use_gpu)
+
+    start = time.time()
+    codes = compress_into_codes(codec, embs, out_device)
+    if codec.use_gpu:
+        torch.cuda.synchronize()
+    elapsed = time.time() - start
+
+    results[engine] = (args.num_tokens / elapsed, peak_memory_mb(codec.use_gpu) - baseline, codes.cpu())
+
+
+def main(args):
+    engines = ['legacy', 'tiled'] + (['faiss'] if not torch.cuda.is_available() else [])
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Manager().dict()
+
+    for engine in engines:
+        process = context.Process(target=run_engine, args=(args, engine, results))
+        process.start()
+        process.join()
+        assert process.exitcode == 0, (engine, process.exitcode)
+
+    print_message(f"#> {args.num_tokens} tokens, {args.num_centroids} centroids, dim {args.dim}, "
+                  f"{args.num_threads} threads")
+
+    legacy_codes = results['legacy'][2]
+    for engine in engines:
+        tokens_per_sec, peak_mb, codes = results[engine]
+        agreement = (codes == legacy_codes).float().mean().item()
+
+        print_message(f"#> {engine:6s} {tokens_per_sec:12,.0f} tokens/sec, peak memory +{peak_mb:8.1f}MB, "
+                      f"codes agree with legacy: {100 * agreement:.2f}%")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Benchmark centroid assignment in ResidualCodec.compress_into_codes.')
+
+    parser.add_argument('--num_centroids', dest='num_centroids', default=1 << 16, type=int)
+    parser.add_argument('--num_tokens', dest='num_tokens', default=1 << 18, type=int)
+    parser.add_argument('--dim', dest='dim', default=128, type=int)
+    parser.add_argument('--num_threads', dest='num_threads', default=torch.get_num_threads(), type=int)
+    parser.add_argument('--seed', dest='seed', default=12345, type=int)
+
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,74 @@
+"""
+Measures the indexing throughput of `CollectionEncoder.encode_passages`, with the on-device lookup-table
+masking in `ColBERT.mask` and, for comparison, with the previous per-token Python implementation.
+
+    python benchmarks/ir/colbert_encode_passages.py --checkpoint <checkpoint> --collection <collection.tsv>
+"""
+import time
+import torch
+
+from argparse import ArgumentParser
+
+from primeqa.ir.dense.colbert_top.colbert.data import Collection
+from primeqa.ir.dense.colbert_top.colbert.infra.config import ColBERTConfig
+from primeqa.ir.dense.colbert_top.colbert.modeling.checkpoint import Checkpoint
+from primeqa.ir.dense.colbert_top.colbert.modeling.colbert import ColBERT
+from primeqa.ir.dense.colbert_top.colbert.indexing.collection_encoder import CollectionEncoder
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
+
+
+def legacy_mask(self, input_ids, skiplist):
+    skiplist = self.skiplist if skiplist is self.doc_mask_lookup else []
+    mask = [[(x not in skiplist) and (x != 0) for x in d] for d in input_ids.cpu().tolist()]
+    return torch.tensor(mask, device=self.device)
+
+
+def time_encoding(encoder, passages, nruns):
+    encoder.encode_passages(passages[:encoder.config.bsize])  # warm-up
+
+    start = time.time()
+    for _ in range(nruns):
+        embs, doclens = encoder.encode_passages(passages)
+    elapsed = (time.time() - start) / nruns
+
+    return elapsed, embs
+
+
+def main(args):
+    config = ColBERTConfig(checkpoint=args.checkpoint, doc_maxlen=args.doc_maxlen, bsize=args.bsize)
+    checkpoint = Checkpoint(args.checkpoint, colbert_config=config)
+    if torch.cuda.is_available():
+        checkpoint = checkpoint.cuda()
+
+    encoder = CollectionEncoder(config, checkpoint)
+    passages = list(Collection.cast(args.collection))[:args.num_passages]
+
+    lookup_time, lookup_embs = time_encoding(encoder, passages, args.nruns)
+
+    lookup_mask = ColBERT.mask
+    ColBERT.mask = legacy_mask
+    try:
+        legacy_time, legacy_embs = time_encoding(encoder, passages, args.nruns)
+    finally:
+        ColBERT.mask = lookup_mask
+
+    assert torch.equal(lookup_embs, legacy_embs)
+
+    print_message(f"#> Python mask:  {len(passages) / legacy_time:.1f} passages/sec ({legacy_time:.2f}s)")
+    print_message(f"#> Lookup mask:  {len(passages) / lookup_time:.1f} passages/sec ({lookup_time:.2f}s)")
+    print_message(f"#> Speedup: {legacy_time / lookup_time:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Benchmark ColBERT passage encoding throughput.')
+
+    parser.add_argument('--checkpoint', dest='checkpoint', required=True, type=str)
+    parser.add_argument('--collection', dest='collection', required=True, type=str)
+    parser.add_argument('--num_passages', dest='num_passages', default=2048, type=int)
+    parser.add_argument('--doc_maxlen', dest='doc_maxlen', default=180, type=int)
+    parser.add_argument('--bsize', dest='bsize', default=64, type=int)
+    parser.add_argument('--nruns', dest='nruns', default=3, type=int)
+
+    args = parser.parse_args()
+
+    main(args)
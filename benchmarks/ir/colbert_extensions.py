@@ -0,0 +1,106 @@
+"""
+Measures, per kernel, the latency of the ColBERT C++ extensions against their pure-PyTorch fallbacks on synthetic
+inputs, and checks that both return identical outputs. The extensions are built into (or loaded from) their cache
+directory first, see `colbert.utils.cpp_extensions`.
+
+    python benchmarks/ir/colbert_extensions.py --num_passages 100000 --repeats 10
+"""
+import time
+import torch
+
+from argparse import ArgumentParser
+
+from primeqa.ir.dense.colbert_top.colbert.infra.config import ColBERTConfig
+from primeqa.ir.dense.colbert_top.colbert.indexing.codecs import residual
+from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual import ResidualCodec
+from primeqa.ir.dense.colbert_top.colbert.modeling.colbert import segmented_maxsim
+from primeqa.ir.dense.colbert_top.colbert.search.index_storage import filter_pids, decompress_residuals
+from primeqa.ir.dense.colbert_top.colbert.search.strided_tensor import segmented_lookup
+from primeqa.ir.dense.colbert_top.colbert.utils.cpp_extensions import load_extension, extensions_cache_dir
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
+
+
+def timed(fn, args, repeats):
+    output = fn(*args)  # warm-up
+
+    start = time.time()
+    for _ in range(repeats):
+        fn(*args)
+
+    return (time.time() - start) / repeats, output
+
+
+def compare(name, extension, fallback, args, repeats):
+    if extension is None:
+        fallback_time, _ = timed(fallback, args, repeats)
+        print_message(f"#> {name}: extension unavailable, PyTorch {1000 * fallback_time:.2f}ms")
+        return
+
+    extension_time, expected = timed(extension, args, repeats)
+    fallback_time, output = timed(fallback, args, repeats)
+
+    print_message(f"#> {name}: extension {1000 * extension_time:.2f}ms, PyTorch {1000 * fallback_time:.2f}ms "
+                  f"({fallback_time / extension_time:.2f}x), identical outputs: {torch.equal(output, expected)}")
+
+
+def main(args):
+    torch.set_num_threads(args.num_threads)
+    generator = torch.Generator().manual_seed(12345)
+
+    print_message(f"#> Extensions cache: {extensions_cache_dir()}")
+
+    doclens = torch.randint(1, 2 * args.doclen, (args.num_passages,), generator=generator)
+    offsets = torch.cumsum(doclens, dim=0) - doclens
+    num_embeddings = int(doclens.sum())
+
+    codes = torch.randint(0, args.num_partitions, (num_embeddings,), generator=generator).to(torch.int32)
+    pids = torch.randperm(args.num_passages, generator=generator)[:args.num_candidates].to(torch.int32)
+
+    compare('segmented_lookup', load_extension('segmented_lookup'), segmented_lookup,
+            (codes, pids.long(), doclens[pids.long()], offsets[pids.long()]), args.repeats)
+
+    lengths = doclens[pids.long()]
+    scores = torch.rand(int(lengths.sum()), args.query_maxlen, generator=generator) * 2 - 1
+    compare('segmented_maxsim', load_extension('segmented_maxsim'), segmented_maxsim,
+            (scores, lengths), args.repeats)
+
+    centroid_scores = torch.rand(args.num_partitions, args.query_maxlen, generator=generator)
+    idx = centroid_scores.max(-1).values >= args.centroid_score_threshold
+    compare('filter_pids', load_extension('filter_pids'), filter_pids,
+            (pids, centroid_scores, codes, doclens, offsets, idx, args.ndocs), args.repeats)
+
+    config = ColBERTConfig(dim=args.dim, nbits=args.nbits)
+    codec = ResidualCodec(config, centroids=torch.randn(args.num_partitions, args.dim, generator=generator),
+                          bucket_cutoffs=torch.linspace(-0.1, 0.1, 2 ** args.nbits - 1),
+                          bucket_weights=torch.linspace(-0.2, 0.2, 2 ** args.nbits))
+    residuals = torch.randint(0, 256, (num_embeddings, args.dim * args.nbits // 8), generator=generator)
+    final_pids = pids[:args.ndocs // 4]
+    compare('decompress_residuals', load_extension('decompress_residuals'), decompress_residuals,
+            (final_pids, doclens, offsets, codec.bucket_weights, codec.reversed_bit_map,
+             codec.decompression_lookup_table, residuals.to(torch.uint8), codes, codec.centroids, args.dim,
+             args.nbits), args.repeats)
+
+    if torch.cuda.is_available():
+        bits = torch.randint(0, 2, (num_embeddings * args.dim * args.nbits,), generator=generator)
+        compare('packbits_cuda', load_extension('packbits_cuda'), residual.packbits,
+                (bits.to(torch.uint8).cuda(),), args.repeats)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Benchmark the ColBERT C++ extensions against their PyTorch fallbacks.')
+
+    parser.add_argument('--num_passages', dest='num_passages', default=100_000, type=int)
+    parser.add_argument('--doclen', dest='doclen', default=64, type=int)
+    parser.add_argument('--num_partitions', dest='num_partitions', default=1 << 14, type=int)
+    parser.add_argument('--num_candidates', dest='num_candidates', default=20_000, type=int)
+    parser.add_argument('--ndocs', dest='ndocs', default=4096, type=int)
+    parser.add_argument('--query_maxlen', dest='query_maxlen', default=32, type=int)
+    parser.add_argument('--centroid_score_threshold', dest='centroid_score_threshold', default=0.9, type=float)
+    parser.add_argument('--dim', dest='dim', default=128, type=int)
+    parser.add_argument('--nbits', dest='nbits', default=2, type=int)
+    parser.add_argument('--repeats', dest='repeats', default=10, type=int)
+    parser.add_argument('--num_threads', dest='num_threads', default=torch.get_num_threads(), type=int)
+
+    args = parser.parse_args()
+
+    main(args)
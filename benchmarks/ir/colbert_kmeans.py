@@ -0,0 +1,119 @@
+"""
+Compares the in-memory faiss k-means of ColBERT indexing with the streaming mini-batch k-means
+(`ColBERTConfig(kmeans_mode='streaming')`), which reads the sample from a flat float16 file on disk in chunks
+of `--memory_budget_mb`: wall time, peak memory and clustering quality, as the mean absolute residual of a heldout
+sub-sample (the `avg_residual` of the codec). The sample is either a float16 tensor saved with torch.save
+(e.g., a `sample.0.pt` kept from indexing) or synthetic, drawn around random cluster centers.
+Each engine runs in a fresh process, so that its peak RSS is measured on its own. For the streaming k-means, it
+includes the pages of the sample file mapped so far, which the OS can reclaim under memory pressure.
+
+    python benchmarks/ir/colbert_kmeans.py --num_partitions 4096 --num_embeddings 1000000 --kmeans_niters 4
+"""
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import torch
+
+from argparse import ArgumentParser
+
+from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual import argmax_inner_product
+from primeqa.ir.dense.colbert_top.colbert.indexing.collection_indexer import compute_faiss_kmeans, \
+    compute_streaming_kmeans
+from primeqa.ir.dense.colbert_top.colbert.indexing.loaders import load_flat_tensor, save_flat_tensor
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
+
+
+def synthetic_sample(num_embeddings, dim, num_clusters, seed):
+    generator = torch.Generator().manual_seed(seed)
+
+    centers = torch.randn(num_clusters, dim, generator=generator)
+    assignments = torch.randint(num_clusters, (num_embeddings,), generator=generator)
+    sample = centers[assignments] + 0.5 * torch.randn(num_embeddings, dim, generator=generator)
+
+    return torch.nn.functional.normalize(sample, dim=-1).half()
+
+
+def mean_residual(centroids, heldout):
+    centroids = torch.nn.functional.normalize(centroids, dim=-1)
+    codes = argmax_inner_product(centroids, heldout.float())
+
+    return (heldout.float() - centroids[codes]).abs().mean().item()
+
+
+def run_engine(args, engine, sample_path, results):
+    torch.set_num_threads(args.num_threads)
+
+    shard = load_flat_tensor(sample_path, torch.float16, inner_dims=(args.dim,))
+    is_heldout = torch.zeros(shard.size(0), dtype=torch.bool)
+    is_heldout[-args.heldout_size:] = True
+
+    baseline_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    start = time.time()
+
+    if engine == 'faiss':
+        centroids = compute_faiss_kmeans(args.dim, args.num_partitions, args.kmeans_niters,
+                                         [[shard[~is_heldout].clone()]])
+    else:
+        centroids = compute_streaming_kmeans([shard], args.num_partitions, args.kmeans_niters,
+                                             args.memory_budget_mb, is_heldout=is_heldout)
+
+    elapsed = time.time() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - baseline_mb
+
+    results[engine] = (elapsed, peak_mb, mean_residual(centroids, shard[is_heldout]))
+
+
+def main(args):
+    if args.sample is not None:
+        sample = torch.load(args.sample, map_location='cpu').half()
+    else:
+        sample = synthetic_sample(args.num_embeddings, args.dim, args.num_clusters, args.seed)
+
+    args.dim = sample.size(1)
+    sample = sample[torch.randperm(sample.size(0), generator=torch.Generator().manual_seed(args.seed))]
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Manager().dict()
+
+    with tempfile.TemporaryDirectory() as directory:
+        sample_path = os.path.join(directory, 'sample.0.bin')
+        with open(sample_path, 'wb') as f:
+            save_flat_tensor(f, sample)
+
+        num_embeddings = sample.size(0)
+        del sample
+
+        for engine in ['faiss', 'streaming']:
+            process = context.Process(target=run_engine, args=(args, engine, sample_path, results))
+            process.start()
+            process.join()
+            assert process.exitcode == 0, (engine, process.exitcode)
+
+    print_message(f"#> {num_embeddings:,} embeddings ({args.heldout_size:,} heldout), dim {args.dim}, "
+                  f"{args.num_partitions:,} partitions, {args.kmeans_niters} iterations, {args.num_threads} threads")
+
+    for engine, (elapsed, peak_mb, residual) in results.items():
+        print_message(f"#> {engine:9s} {elapsed:8.1f}s, peak memory +{peak_mb:8.1f}MB, "
+                      f"heldout mean residual {residual:.5f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Benchmark faiss vs. streaming k-means for ColBERT indexing.')
+
+    parser.add_argument('--sample', dest='sample', default=None, type=str,
+                        help='float16 tensor of embeddings saved with torch.save, otherwise a synthetic sample is used')
+    parser.add_argument('--num_embeddings', dest='num_embeddings', default=1_000_000, type=int)
+    parser.add_argument('--num_clusters', dest='num_clusters', default=8192, type=int)
+    parser.add_argument('--dim', dest='dim', default=128, type=int)
+    parser.add_argument('--num_partitions', dest='num_partitions', default=4096, type=int)
+    parser.add_argument('--kmeans_niters', dest='kmeans_niters', default=4, type=int)
+    parser.add_argument('--memory_budget_mb', dest='memory_budget_mb', default=256, type=int)
+    parser.add_argument('--heldout_size', dest='heldout_size', default=50_000, type=int)
+    parser.add_argument('--num_threads', dest='num_threads', default=torch.get_num_threads(), type=int)
+    parser.add_argument('--seed', dest='seed', default=12345, type=int)
+
+    args = parser.parse_args()
+
+    main(args)
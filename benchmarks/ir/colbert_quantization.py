@@ -0,0 +1,90 @@
+"""
+Measures the CPU latency of ColBERT query encoding in fp32 and with the int8 query encoder
+(`ColBERTConfig(quantize_query_encoder=True)`), and how much quantization changes retrieval: overlap of the top-K
+passages and, if qrels are given, MRR@10 and Recall@K of both.
+
+    python benchmarks/ir/colbert_quantization.py --index_location <index> --queries <queries.tsv> --qrels <qrels.tsv>
+"""
+import time
+import torch
+
+from argparse import ArgumentParser
+
+from primeqa.ir.dense.colbert_top.colbert.data import Queries
+from primeqa.ir.dense.colbert_top.colbert.evaluation.loaders import load_qrels
+from primeqa.ir.dense.colbert_top.colbert.infra.config import ColBERTConfig
+from primeqa.ir.dense.colbert_top.colbert.searcher import Searcher
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
+
+
+def encode_and_search(searcher, queries, k):
+    searcher.encode(queries[0])  # warm-up
+
+    encoding_time, rankings = 0.0, []
+    for query in queries:
+        start = time.time()
+        Q = searcher.encode(query)
+        encoding_time += time.time() - start
+
+        rankings.append(searcher.dense_search(Q, k=k)[0])
+
+    return encoding_time, rankings
+
+
+def retrieval_metrics(qids, rankings, qrels, k):
+    mrr, recall = 0.0, 0.0
+    for qid, pids in zip(qids, rankings):
+        positives = set(qrels.get(qid, []))
+        ranks = [rank for rank, pid in enumerate(pids[:10], start=1) if pid in positives]
+        mrr += 1.0 / ranks[0] if ranks else 0.0
+        recall += len(positives & set(pids[:k])) / max(len(positives), 1)
+
+    return mrr / len(qids), recall / len(qids)
+
+
+def main(args):
+    torch.set_num_threads(args.num_threads)
+
+    config = ColBERTConfig(index_location=args.index_location)
+    searcher = Searcher(args.index_location, checkpoint=args.checkpoint, config=config)
+
+    queries = Queries.cast(args.queries)
+    qids = list(queries.keys())[:args.num_queries]
+    texts = [queries[qid] for qid in qids]
+
+    fp32_time, fp32_rankings = encode_and_search(searcher, texts, args.topK)
+    similarity = searcher.checkpoint.quantize_query_encoder(min_similarity=0.0)
+    int8_time, int8_rankings = encode_and_search(searcher, texts, args.topK)
+
+    overlap = [len(set(a) & set(b)) / max(len(a), 1) for a, b in zip(fp32_rankings, int8_rankings)]
+
+    print_message(f"#> fp32: {1000 * fp32_time / len(texts):.1f}ms/query encoding")
+    print_message(f"#> int8: {1000 * int8_time / len(texts):.1f}ms/query encoding, "
+                  f"speedup {fp32_time / int8_time:.2f}x")
+    print_message(f"#> Mean cosine similarity of int8 to fp32 query embeddings (calibration queries): {similarity:.4f}")
+    print_message(f"#> Mean top-{args.topK} overlap: {sum(overlap) / len(overlap):.4f}")
+
+    if args.qrels is not None:
+        qrels = load_qrels(args.qrels)
+        fp32_mrr, fp32_recall = retrieval_metrics(qids, fp32_rankings, qrels, args.topK)
+        int8_mrr, int8_recall = retrieval_metrics(qids, int8_rankings, qrels, args.topK)
+
+        print_message(f"#> fp32: MRR@10 {fp32_mrr:.4f}, Recall@{args.topK} {fp32_recall:.4f}")
+        print_message(f"#> int8: MRR@10 {int8_mrr:.4f}, Recall@{args.topK} {int8_recall:.4f}")
+        print_message(f"#> delta: MRR@10 {int8_mrr - fp32_mrr:+.4f}, Recall@{args.topK} {int8_recall - fp32_recall:+.4f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Benchmark fp32 vs. int8 ColBERT query encoding on CPU.')
+
+    parser.add_argument('--index_location', dest='index_location', required=True, type=str)
+    parser.add_argument('--checkpoint', dest='checkpoint', default=None, type=str)
+    parser.add_argument('--queries', dest='queries', required=True, type=str)
+    parser.add_argument('--qrels', dest='qrels', default=None, type=str)
+    parser.add_argument('--num_queries', dest='num_queries', default=500, type=int)
+    parser.add_argument('--topK', dest='topK', default=100, type=int)
+    parser.add_argument('--num_threads', dest='num_threads', default=torch.get_num_threads(), type=int)
+
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,54 @@
+"""
+Compares the throughput of per-query PLAID search (one `Searcher.dense_search` call per query)
+with the batched path used by `Searcher.search_all` (`Searcher.dense_search_batch`).
+
+    python benchmarks/ir/colbert_search_all.py --index_location <index> --queries <queries.tsv> --topK 100
+"""
+import time
+
+from argparse import ArgumentParser
+
+from primeqa.ir.dense.colbert_top.colbert.data import Queries
+from primeqa.ir.dense.colbert_top.colbert.infra.config import ColBERTConfig
+from primeqa.ir.dense.colbert_top.colbert.searcher import Searcher
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
+
+
+def main(args):
+    config = ColBERTConfig(index_location=args.index_location)
+    searcher = Searcher(args.index_location, checkpoint=args.checkpoint, config=config)
+
+    queries = list(Queries.cast(args.queries).values())[:args.num_queries]
+    Q = searcher.encode(queries)
+    print_message(f"#> Encoded {Q.size(0)} queries.")
+
+    start = time.time()
+    looped = [searcher.dense_search(Q[query_idx:query_idx+1], k=args.topK) for query_idx in range(Q.size(0))]
+    looped_time = time.time() - start
+
+    start = time.time()
+    batched = []
+    for offset in range(0, Q.size(0), args.bsize):
+        batched.extend(searcher.dense_search_batch(Q[offset:offset+args.bsize], k=args.topK))
+    batched_time = time.time() - start
+
+    overlap = [len(set(a[0]) & set(b[0])) / max(len(a[0]), 1) for a, b in zip(looped, batched)]
+
+    print_message(f"#> Looped:  {Q.size(0) / looped_time:.1f} queries/sec ({looped_time:.2f}s)")
+    print_message(f"#> Batched: {Q.size(0) / batched_time:.1f} queries/sec ({batched_time:.2f}s, bsize={args.bsize})")
+    print_message(f"#> Speedup: {looped_time / batched_time:.2f}x, mean top-{args.topK} overlap: {sum(overlap) / len(overlap):.4f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Benchmark batched vs. per-query ColBERT search.')
+
+    parser.add_argument('--index_location', dest='index_location', required=True, type=str)
+    parser.add_argument('--checkpoint', dest='checkpoint', default=None, type=str)
+    parser.add_argument('--queries', dest='queries', required=True, type=str)
+    parser.add_argument('--num_queries', dest='num_queries', default=1000, type=int)
+    parser.add_argument('--topK', dest='topK', default=100, type=int)
+    parser.add_argument('--bsize', dest='bsize', default=128, type=int)
+
+    args = parser.parse_args()
+
+    main(args)
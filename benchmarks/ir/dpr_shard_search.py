@@ -0,0 +1,79 @@
+"""
+Measures the latency of searching a sharded DPR index as the number of shards grows, searching the shards
+one after another vs. concurrently (`search_shards` with a thread pool, as `DPRSearcher` does).
+
+The shards are HNSW indexes over random vectors, so no trained model or corpus is needed.
+
+    python benchmarks/ir/dpr_shard_search.py --num_vectors 1000000 --shards 1 2 4 8 --bsize 32 --top_k 100
+"""
+import os
+import time
+import tempfile
+import faiss
+import numpy as np
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+from primeqa.ir.dense.dpr_top.dpr.faiss_index import ANNIndex, search_shards
+
+
+def build_shards(vectors, num_shards, args, directory):
+    indexes = []
+    for shard_num, shard_vectors in enumerate(np.array_split(vectors, num_shards)):
+        index = faiss.IndexHNSWFlat(vectors.shape[1], args.m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = args.ef_construction
+        index.hnsw.efSearch = args.ef_search
+        index.add(shard_vectors)
+
+        index_file = os.path.join(directory, f'index_{shard_num+1}_of_{num_shards}.faiss')
+        faiss.write_index(index, index_file)
+        indexes.append(ANNIndex(index_file))
+    return indexes
+
+
+def time_search(indexes, query_batches, k, executor):
+    start = time.time()
+    results = [search_shards(indexes, query_vectors, k, executor=executor) for query_vectors in query_batches]
+    return (time.time() - start) / len(query_batches), results
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    vectors = rng.standard_normal((args.num_vectors, args.dim), dtype=np.float32)
+    queries = rng.standard_normal((args.num_queries, args.dim), dtype=np.float32)
+    query_batches = [queries[offset:offset+args.bsize] for offset in range(0, len(queries), args.bsize)]
+
+    print(f'{"shards":>6} {"sequential ms/batch":>20} {"concurrent ms/batch":>20} {"speedup":>8}')
+    for num_shards in args.shards:
+        with tempfile.TemporaryDirectory() as directory:
+            indexes = build_shards(vectors, num_shards, args, directory)
+
+            sequential_time, sequential = time_search(indexes, query_batches, args.top_k, None)
+            with ThreadPoolExecutor(max_workers=num_shards) as executor:
+                concurrent_time, concurrent = time_search(indexes, query_batches, args.top_k, executor)
+
+            for (scores_a, shards_a, ndxs_a), (scores_b, shards_b, ndxs_b) in zip(sequential, concurrent):
+                assert np.array_equal(scores_a, scores_b) and np.array_equal(shards_a, shards_b) and np.array_equal(ndxs_a, ndxs_b)
+
+            print(f'{num_shards:>6} {1000 * sequential_time:>20.2f} {1000 * concurrent_time:>20.2f} '
+                  f'{sequential_time / concurrent_time:>7.2f}x')
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Benchmark DPR search latency vs. number of shards.')
+
+    parser.add_argument('--num_vectors', default=200_000, type=int)
+    parser.add_argument('--dim', default=768, type=int)
+    parser.add_argument('--shards', default=[1, 2, 4, 8], type=int, nargs='+')
+    parser.add_argument('--num_queries', default=512, type=int)
+    parser.add_argument('--bsize', default=32, type=int)
+    parser.add_argument('--top_k', default=100, type=int)
+    parser.add_argument('--m', default=32, type=int)
+    parser.add_argument('--ef_construction', default=200, type=int)
+    parser.add_argument('--ef_search', default=128, type=int)
+    parser.add_argument('--seed', default=12345, type=int)
+
+    args = parser.parse_args()
+
+    main(args)
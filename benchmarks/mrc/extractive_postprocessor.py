@@ -0,0 +1,133 @@
+"""
+Measures the throughput of `ExtractivePostProcessor.process`, which decodes the top-k spans of each example
+with array operations over all of its features, and, for comparison, with the previous implementation that
+scores every pair of n-best start/end indexes of every feature in a Python loop.
+
+The features and logits are random, so no model or dataset is needed.
+
+    python benchmarks/mrc/extractive_postprocessor.py --num_examples 1000 --features_per_example 8 --n_best_size 20
+"""
+import time
+import numpy as np
+
+from argparse import ArgumentParser
+from operator import itemgetter
+
+from primeqa.mrc.data_models.target_type import TargetType
+from primeqa.mrc.processors.postprocessors.extractive import ExtractivePostProcessor
+
+
+def legacy_top_k_span_predictions(self, example, example_features, start_logits, end_logits, target_type_logits,
+                                  start_stdev=None, end_stdev=None, query_passage_similarity=None):
+    predictions = []
+    for i, feature in enumerate(example_features):
+        feature_start_logits = start_logits[i].tolist()
+        feature_end_logits = end_logits[i].tolist()
+        feature_target_type_logits = target_type_logits[i].tolist()
+        offset_mapping = feature["offset_mapping"]
+        token_is_max_context = feature.get("token_is_max_context", None)
+        feature_null_score = feature_start_logits[0] + feature_end_logits[0]
+
+        start_indexes = np.argsort(feature_start_logits[:len(offset_mapping)])[-1:-self._n_best_size - 1:-1].tolist()
+        end_indexes = np.argsort(feature_end_logits[:len(offset_mapping)])[-1:-self._n_best_size - 1:-1].tolist()
+        for start_index in start_indexes:
+            for end_index in end_indexes:
+                if offset_mapping[start_index] is None or offset_mapping[end_index] is None:
+                    continue
+                if end_index < start_index or end_index - start_index + 1 > self._max_answer_length:
+                    continue
+                if token_is_max_context is not None and not token_is_max_context.get(str(start_index), False):
+                    continue
+
+                start_position = offset_mapping[start_index][0]
+                end_position = offset_mapping[end_index][1]
+                predictions.append({
+                    'example_id': feature['example_id'],
+                    'cls_score': feature_null_score,
+                    'start_logit': feature_start_logits[start_index],
+                    'end_logit': feature_end_logits[end_index],
+                    'span_answer': {"start_position": start_position, "end_position": end_position},
+                    'span_answer_score': self._score_calculator(
+                        feature_start_logits[start_index] + feature_end_logits[end_index],
+                        feature_null_score, feature_target_type_logits),
+                    'start_index': start_index,
+                    'end_index': end_index,
+                    'passage_index': feature['context_idx'],
+                    'target_type_logits': feature_target_type_logits,
+                    'span_answer_text': example['context'][feature['context_idx']][start_position:end_position],
+                    'yes_no_answer': int(TargetType.NO_ANSWER),
+                    'start_stdev': 0.0,
+                    'end_stdev': 0.0,
+                    'query_passage_similarity': 0.0
+                })
+
+    return sorted(predictions, key=itemgetter('span_answer_score'), reverse=True)[:self._k]
+
+
+def make_inputs(args):
+    rng = np.random.default_rng(args.seed)
+    question_length, context = 16, 'x' * (4 * args.max_seq_length)
+
+    examples, features = [], []
+    for example_idx in range(args.num_examples):
+        example_id = f'example-{example_idx}'
+        examples.append({'example_id': example_id, 'context': [context]})
+
+        for _ in range(args.features_per_example):
+            offset_mapping = [None] * question_length + \
+                             [[4 * i, 4 * i + 3] for i in range(args.max_seq_length - question_length - 1)] + [None]
+            features.append({'example_id': example_id, 'example_idx': example_idx, 'context_idx': 0,
+                             'offset_mapping': offset_mapping,
+                             'token_is_max_context': {str(i): True for i in range(len(offset_mapping))}})
+
+    num_features = len(features)
+    predictions = (rng.standard_normal((num_features, args.max_seq_length), dtype=np.float32),
+                   rng.standard_normal((num_features, args.max_seq_length), dtype=np.float32),
+                   rng.standard_normal((num_features, len(TargetType)), dtype=np.float32))
+    return examples, features, predictions
+
+
+def time_process(postprocessor, examples, features, predictions):
+    start = time.time()
+    all_predictions = postprocessor.process(examples, features, predictions)
+    return time.time() - start, all_predictions
+
+
+def main(args):
+    examples, features, predictions = make_inputs(args)
+    postprocessor = ExtractivePostProcessor(k=args.k, n_best_size=args.n_best_size,
+                                            max_answer_length=args.max_answer_length)
+
+    vectorized_time, vectorized = time_process(postprocessor, examples, features, predictions)
+
+    vectorized_decoder = ExtractivePostProcessor._top_k_span_predictions
+    ExtractivePostProcessor._top_k_span_predictions = legacy_top_k_span_predictions
+    try:
+        legacy_time, legacy = time_process(postprocessor, examples, features, predictions)
+    finally:
+        ExtractivePostProcessor._top_k_span_predictions = vectorized_decoder
+
+    for example_id, example_predictions in legacy.items():
+        assert [(p['span_answer'], p['span_answer_score']) for p in example_predictions] == \
+               [(p['span_answer'], p['span_answer_score']) for p in vectorized[example_id]], example_id
+
+    print(f'{len(features):,} features, n_best_size={args.n_best_size}, k={args.k}')
+    print(f'legacy:     {legacy_time:.2f}s ({len(examples) / legacy_time:,.1f} examples/s)')
+    print(f'vectorized: {vectorized_time:.2f}s ({len(examples) / vectorized_time:,.1f} examples/s)')
+    print(f'speedup:    {legacy_time / vectorized_time:.2f}x')
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Benchmark top-k span decoding in ExtractivePostProcessor.')
+
+    parser.add_argument('--num_examples', default=500, type=int)
+    parser.add_argument('--features_per_example', default=8, type=int)
+    parser.add_argument('--max_seq_length', default=384, type=int)
+    parser.add_argument('--n_best_size', default=20, type=int)
+    parser.add_argument('--max_answer_length', default=30, type=int)
+    parser.add_argument('--k', default=20, type=int)
+    parser.add_argument('--seed', default=12345, type=int)
+
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,118 @@
+"""
+Measures the CPU latency and throughput of `ExtractiveReader.predict` with the eager PyTorch backend and with the
+onnxruntime backend, on random questions and contexts, and checks that both backends return the same answers.
+
+The model is exported to ONNX first, unless an exported directory is given with --onnx_dir.
+
+    python benchmarks/mrc/reader_backends.py --model PrimeQA/nq_tydi_sq1-reader-xlmr_large-20221110 --num_requests 20
+"""
+import os
+import random
+import tempfile
+import time
+import numpy as np
+import torch
+
+from argparse import ArgumentParser
+
+from transformers import AutoConfig, AutoTokenizer
+
+from primeqa.mrc.models.heads.extractive import EXTRACTIVE_HEAD
+from primeqa.mrc.models.onnx_model import ONNX_MODEL_FILENAME, export_extractive_model_to_onnx
+from primeqa.mrc.models.task_model import ModelForDownstreamTasks
+from primeqa.pipelines.components.reader.extractive import ExtractiveReader
+
+WORDS = ("the of and to in is was for on as with by he at from his an were are which this be or has had first one "
+         "their its new after who they have her she two been other when there all during into school time may years "
+         "more most only over city some world would where later up such used many can state about national out known "
+         "university united then made").split()
+
+
+def export(model_name_or_path, output_dir):
+    config = AutoConfig.from_pretrained(model_name_or_path)
+    tokenizer = AutoTokenizer.from_pretrained(model_name_or_path, config=config)
+    config.sep_token_id = tokenizer.convert_tokens_to_ids(tokenizer.sep_token)
+    model = ModelForDownstreamTasks.from_config(config, model_name_or_path, task_heads=EXTRACTIVE_HEAD)
+    model.set_task_head(next(iter(EXTRACTIVE_HEAD)))
+
+    export_extractive_model_to_onnx(model, tokenizer, os.path.join(output_dir, ONNX_MODEL_FILENAME))
+    tokenizer.save_pretrained(output_dir)
+    config.save_pretrained(output_dir)
+
+
+def make_requests(args):
+    rng = random.Random(args.seed)
+
+    def text(num_words):
+        return ' '.join(rng.choice(WORDS) for _ in range(num_words))
+
+    return [([text(8) for _ in range(args.questions_per_request)],
+             [[text(args.context_words) for _ in range(args.contexts_per_question)]
+              for _ in range(args.questions_per_request)])
+            for _ in range(args.num_requests)]
+
+
+def time_reader(reader, requests):
+    reader.predict(*requests[0])  # warm-up
+
+    latencies, predictions = [], []
+    for questions, contexts in requests:
+        start = time.time()
+        predictions.append(reader.predict(questions, contexts))
+        latencies.append(time.time() - start)
+    return np.array(latencies), predictions
+
+
+def main(args):
+    torch.set_num_threads(args.num_threads)
+    requests = make_requests(args)
+    reader_kwargs = dict(max_seq_len=args.max_seq_len, batch_size=args.batch_size)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        onnx_dir = args.onnx_dir
+        if onnx_dir is None:
+            onnx_dir = tmp_dir
+            export(args.model, onnx_dir)
+
+        results = {}
+        for backend, model in [('pytorch', args.model), ('onnxruntime', onnx_dir)]:
+            reader = ExtractiveReader(model=model, backend=backend, **reader_kwargs)
+            reader.load()
+            results[backend] = time_reader(reader, requests)
+
+    num_same_answers = num_answers = 0
+    for pytorch_predictions, onnx_predictions in zip(results['pytorch'][1], results['onnxruntime'][1]):
+        for example_id, example_predictions in pytorch_predictions.items():
+            num_answers += 1
+            num_same_answers += [p['span_answer'] for p in example_predictions] == \
+                                [p['span_answer'] for p in onnx_predictions[example_id]]
+
+    num_questions = args.num_requests * args.questions_per_request
+    print(f'{args.num_requests} requests x {args.questions_per_request} questions x '
+          f'{args.contexts_per_question} contexts of {args.context_words} words, {args.num_threads} threads')
+    for backend, (latencies, _) in results.items():
+        print(f'{backend:12s} p50 {np.percentile(latencies, 50) * 1000:8.1f}ms  '
+              f'p95 {np.percentile(latencies, 95) * 1000:8.1f}ms  '
+              f'{num_questions / latencies.sum():8.1f} questions/s')
+    print(f'speedup:     {results["pytorch"][0].sum() / results["onnxruntime"][0].sum():.2f}x')
+    print(f'same answers for {num_same_answers}/{num_answers} questions')
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Benchmark the eager PyTorch and onnxruntime backends of ExtractiveReader.')
+
+    parser.add_argument('--model', default='PrimeQA/nq_tydi_sq1-reader-xlmr_large-20221110', type=str)
+    parser.add_argument('--onnx_dir', default=None, type=str,
+                        help='Directory exported with `python -m primeqa.mrc.models.onnx_model`')
+    parser.add_argument('--num_requests', default=20, type=int)
+    parser.add_argument('--questions_per_request', default=1, type=int)
+    parser.add_argument('--contexts_per_question', default=3, type=int)
+    parser.add_argument('--context_words', default=150, type=int)
+    parser.add_argument('--max_seq_len', default=512, type=int)
+    parser.add_argument('--batch_size', default=8, type=int)
+    parser.add_argument('--num_threads', default=torch.get_num_threads(), type=int)
+    parser.add_argument('--seed', default=12345, type=int)
+
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,109 @@
+"""
+Measures the CPU latency of `ExtractiveReader.predict` in fp32 and with int8 dynamic quantization (`quantize=True`),
+and how much quantization changes the answers: exact match and F1 against the gold answers of a SQuAD v1.1 file
+if one is given with --squad_file, and in any case exact match and F1 of the int8 answers against the fp32 ones.
+
+    python benchmarks/mrc/reader_quantization.py --model PrimeQA/nq_tydi_sq1-reader-xlmr_large-20221110 \
+        --squad_file dev-v1.1.json --num_questions 200
+"""
+import json
+import random
+import time
+import numpy as np
+import torch
+
+from argparse import ArgumentParser
+
+from primeqa.mrc.metrics.squad.evaluate import exact_match_score, f1_score, metric_max_over_ground_truths
+from primeqa.pipelines.components.reader.extractive import ExtractiveReader
+
+WORDS = ("the of and to in is was for on as with by he at from his an were are which this be or has had first one "
+         "their its new after who they have her she two been other when there all during into school time may years "
+         "more most only over city some world would where later up such used many can state about national out known "
+         "university united then made").split()
+
+
+def load_questions(args):
+    """
+    Returns (question, context, gold answers) triples, from the SQuAD file or made of random words without answers.
+    """
+    if args.squad_file is None:
+        rng = random.Random(args.seed)
+
+        def text(num_words):
+            return ' '.join(rng.choice(WORDS) for _ in range(num_words))
+
+        return [(text(8), text(args.context_words), None) for _ in range(args.num_questions)]
+
+    with open(args.squad_file, encoding='utf-8') as f:
+        dataset = json.load(f)['data']
+
+    questions = [(qa['question'], paragraph['context'], [answer['text'] for answer in qa['answers']])
+                 for article in dataset for paragraph in article['paragraphs'] for qa in paragraph['qas']]
+    return questions[:args.num_questions]
+
+
+def time_reader(reader, questions):
+    reader.predict([questions[0][0]], [[questions[0][1]]])  # warm-up
+
+    latencies, answers = [], []
+    for question, context, _ in questions:
+        start = time.time()
+        predictions = reader.predict([question], [[context]])
+        latencies.append(time.time() - start)
+        answers.append(predictions['0'][0]['span_answer_text'] if predictions['0'] else '')
+    return np.array(latencies), answers
+
+
+def score(answers, references):
+    exact_match = np.mean([metric_max_over_ground_truths(exact_match_score, answer, reference)
+                           for answer, reference in zip(answers, references)])
+    f1 = np.mean([metric_max_over_ground_truths(f1_score, answer, reference)
+                  for answer, reference in zip(answers, references)])
+    return 100.0 * exact_match, 100.0 * f1
+
+
+def main(args):
+    torch.set_num_threads(args.num_threads)
+    questions = load_questions(args)
+
+    results = {}
+    for name, quantize in [('fp32', False), ('int8', True)]:
+        reader = ExtractiveReader(model=args.model, max_seq_len=args.max_seq_len, batch_size=args.batch_size,
+                                  quantize=quantize)
+        reader.load()
+        results[name] = time_reader(reader, questions)
+
+    print(f'{len(questions)} questions, {args.num_threads} threads')
+    for name, (latencies, answers) in results.items():
+        line = (f'{name:5s} p50 {np.percentile(latencies, 50) * 1000:8.1f}ms  '
+                f'p95 {np.percentile(latencies, 95) * 1000:8.1f}ms')
+        if args.squad_file is not None:
+            line += '  EM {:6.2f}  F1 {:6.2f}'.format(*score(answers, [gold for _, _, gold in questions]))
+        print(line)
+
+    print(f'speedup: {results["fp32"][0].sum() / results["int8"][0].sum():.2f}x')
+    if args.squad_file is not None:
+        fp32_scores = score(results['fp32'][1], [gold for _, _, gold in questions])
+        int8_scores = score(results['int8'][1], [gold for _, _, gold in questions])
+        print(f'delta: EM {int8_scores[0] - fp32_scores[0]:+.2f}  F1 {int8_scores[1] - fp32_scores[1]:+.2f}')
+    print('int8 vs fp32 answers: EM {:.2f}  F1 {:.2f}'.format(
+        *score(results['int8'][1], [[answer] for answer in results['fp32'][1]])))
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Benchmark the fp32 and int8 quantized ExtractiveReader on CPU.')
+
+    parser.add_argument('--model', default='PrimeQA/nq_tydi_sq1-reader-xlmr_large-20221110', type=str)
+    parser.add_argument('--squad_file', default=None, type=str,
+                        help='SQuAD v1.1 json file to score the answers with, otherwise random texts are used')
+    parser.add_argument('--num_questions', default=100, type=int)
+    parser.add_argument('--context_words', default=150, type=int)
+    parser.add_argument('--max_seq_len', default=512, type=int)
+    parser.add_argument('--batch_size', default=8, type=int)
+    parser.add_argument('--num_threads', default=torch.get_num_threads(), type=int)
+    parser.add_argument('--seed', default=12345, type=int)
+
+    args = parser.parse_args()
+
+    main(args)
@@ -5,29 +5,113 @@
 # I think multiprocessing.Manager can do that!
 
 import os
+import mmap
 import itertools
+import numpy as np
 
-from primeqa.ir.dense.colbert_top.colbert.evaluation.loaders import load_collection
+from primeqa.ir.dense.colbert_top.colbert.evaluation.loaders import load_collection, parse_collection_line
 from primeqa.ir.dense.colbert_top.colbert.infra.run import Run
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
 
 
 class Collection:
-    def __init__(self, path=None, data=None):
+    """
+        A collection of passages, indexed by pid (i.e., line number in the TSV).
+
+        With `lazy=True`, passages stay on disk: a byte-offset index of the lines is built once and cached next to
+        the file (`<path>.offsets.npy`), and passages are read on demand through mmap, so memory stays bounded
+        regardless of the size of the collection. With `lazy=None`, TSVs of at least `LAZY_MIN_BYTES` load lazily.
+    """
+
+    LAZY_MIN_BYTES = 1 << 30
+
+    def __init__(self, path=None, data=None, lazy=None):
         self.path = path
-        self.data = data or self._load_file(path)
+        self.offsets = None
+        self.file = None
+
+        if data is None and lazy is None:
+            lazy = path.endswith('.tsv') and os.path.getsize(path) >= Collection.LAZY_MIN_BYTES
+
+        if data is None and lazy:
+            assert path.endswith('.tsv'), "TODO: Support lazy loading of .json[l] too."
+            self.data = None
+            self.offsets = self._load_offsets(path)
+        else:
+            self.data = data or self._load_file(path)
 
     def __iter__(self):
-        # TODO: If __data isn't there, stream from disk!
+        if self.data is None:
+            return self._stream_tsv(self.path)
+
         return self.data.__iter__()
 
     def __getitem__(self, item):
-        # TODO: Load from disk the first time this is called. Unless self.data is already not None.
+        if self.data is None:
+            item = int(item)
+            assert 0 <= item < len(self), item
+
+            line = self._mmap()[self.offsets[item]:self.offsets[item+1]]
+            return parse_collection_line(item, line.decode('utf-8'))
+
         return self.data[item]
 
     def __len__(self):
-        # TODO: Load here too. Basically, let's make data a property function and, on first call, either load or get __data.
+        if self.data is None:
+            return len(self.offsets) - 1
+
         return len(self.data)
 
+    def __getstate__(self):
+        # mmap objects can't be pickled (e.g., when passed to other processes); they are re-opened on demand.
+        state = self.__dict__.copy()
+        state['file'] = None
+        return state
+
+    def _mmap(self):
+        if self.file is None:
+            with open(self.path, 'rb') as f:
+                self.file = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return self.file
+
+    def _stream_tsv(self, path):
+        with open(path, 'rb') as f:
+            for line_idx, line in enumerate(f):
+                yield parse_collection_line(line_idx, line.decode('utf-8'))
+
+    def _load_offsets(self, path):
+        offsets_path = path + '.offsets.npy'
+
+        if os.path.exists(offsets_path) and os.path.getmtime(offsets_path) >= os.path.getmtime(path):
+            return np.load(offsets_path, mmap_mode='r')
+
+        print_message(f"#> Building the line offsets of {path}...")
+
+        offsets = [np.zeros(1, dtype=np.int64)]
+        position = 0
+
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 26), b''):
+                newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+                offsets.append(newlines.astype(np.int64) + position + 1)
+                position += len(block)
+
+        offsets = np.concatenate(offsets)
+
+        # The last line may lack its trailing newline, in which case the file size closes it.
+        if offsets[-1] != position:
+            offsets = np.append(offsets, position)
+
+        try:
+            temp_path = f'{offsets_path}.{os.getpid()}.tmp'
+            np.save(temp_path, offsets)
+            os.replace(temp_path + '.npy', offsets_path)
+        except OSError as e:
+            print_message(f"#> Could not cache the line offsets at {offsets_path} ({e}), keeping them in memory.")
+
+        return offsets
+
     def _load_file(self, path):
         self.path = path
         return self._load_tsv(path) if path.endswith('.tsv') else self._load_jsonl(path)
@@ -50,7 +134,7 @@ class Collection:
 
         with Run().open(new_path, 'w') as f:
             # TODO: expects content to always be a string here; no separate title!
-            for pid, content in enumerate(self.data):
+            for pid, content in enumerate(self):
                 content = f'{pid}\t{content}\n'
                 f.write(content)
             
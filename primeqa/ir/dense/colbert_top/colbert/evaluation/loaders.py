@@ -164,20 +164,7 @@ def load_collection(collection_path):
             if line_idx % (1000*1000) == 0:
                 print(f'{line_idx // 1000 // 1000}M', end=' ', flush=True)
 
-            pid, passage, *rest = line.strip('\n\r ').split('\t')
-            # pid, passage, *rest = line.strip().split('\t')
-            assert pid == 'id' or int(pid) == line_idx
-
-            # if pid == 'id':
-            #     continue
-
-            if len(rest) >= 1:
-                title = rest[0]
-                passage = title + ' | ' + passage
-                # Don't add | between title and passage
-                # remove (") at passage and add with space
-                # passage = remove_first_and_last_quote(passage)
-                # passage = remove_first_and_last_quote(title) + ' | ' + passage
+            passage = parse_collection_line(line_idx, line)
 
             collection.append(passage)
 
@@ -186,6 +173,25 @@ def load_collection(collection_path):
     return collection
 
 
+def parse_collection_line(line_idx, line):
+    pid, passage, *rest = line.strip('\n\r ').split('\t')
+    # pid, passage, *rest = line.strip().split('\t')
+    assert pid == 'id' or int(pid) == line_idx
+
+    # if pid == 'id':
+    #     continue
+
+    if len(rest) >= 1:
+        title = rest[0]
+        passage = title + ' | ' + passage
+        # Don't add | between title and passage
+        # remove (") at passage and add with space
+        # passage = remove_first_and_last_quote(passage)
+        # passage = remove_first_and_last_quote(title) + ' | ' + passage
+
+    return passage
+
+
 def load_colbert(args, do_print=True):
     colbert, checkpoint = load_model(args, do_print)
 
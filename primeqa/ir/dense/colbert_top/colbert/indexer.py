@@ -15,6 +15,7 @@ from primeqa.ir.dense.colbert_top.colbert.infra.launcher import Launcher
 from primeqa.ir.dense.colbert_top.colbert.utils.utils import create_directory, print_message
 
 from primeqa.ir.dense.colbert_top.colbert.indexing.collection_indexer import encode
+from primeqa.ir.dense.colbert_top.colbert.indexing.index_updater import IndexUpdater
 
 
 class Indexer:
@@ -94,6 +95,35 @@ class Indexer:
 
         return self.index_path
 
+    def add(self, collection, name=None):
+        """
+            Appends the passages in `collection` to an existing index, reusing its codec.
+            Returns the range of pids assigned to the new passages.
+        """
+        updater = self.__updater(name)
+        updater.config.configure(bsize=64, checkpoint=self.checkpoint)
+
+        return updater.add(collection)
+
+    def delete(self, pids, name=None):
+        """
+            Removes `pids` from the search results of an existing index.
+        """
+        return self.__updater(name).delete(pids)
+
+    def __updater(self, name):
+        if name is not None:
+            self.configure(index_name=name)
+
+        self.index_path = self.config.index_path_
+        assert os.path.exists(os.path.join(self.index_path, 'metadata.json')), self.index_path
+
+        index_config = ColBERTConfig.load_from_index(self.index_path)
+        config = ColBERTConfig.from_existing(self.config, index_config)
+        config.configure(index_path=self.index_path)
+
+        return IndexUpdater(config)
+
     def __launch(self, collection):
         manager = mp.Manager()
         shared_lists = [manager.list() for _ in range(self.config.nranks)]
@@ -6,14 +6,10 @@ import os
 import torch
 import numpy as np
 from itertools import product
-import sys
 
 from primeqa.ir.dense.colbert_top.colbert.infra.config import ColBERTConfig
 from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual_embeddings import ResidualEmbeddings
-from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message, print_torch_extension_error_message
-
-import pathlib
-from torch.utils.cpp_extension import load
+from primeqa.ir.dense.colbert_top.colbert.utils.cpp_extensions import load_extension
 
 
 class ResidualCodec:
@@ -23,6 +19,8 @@ class ResidualCodec:
         self.dim, self.nbits = config.dim, config.nbits
 
         self.use_gpu = torch.cuda.is_available()
+        self.centroid_assignment = config.centroid_assignment
+        self.faiss_centroids_index = None
 
         ResidualCodec.try_load_torch_extensions(self.use_gpu)
 
@@ -108,53 +106,8 @@ class ResidualCodec:
         if hasattr(cls, "loaded_extensions") or not use_gpu:
             return
 
-        verbose=os.getenv("COLBERT_LOAD_TORCH_EXTENSION_VERBOSE", "False") == "True"
-
-        print_message(f"Loading decompress_residuals_cpp extension (set COLBERT_LOAD_TORCH_EXTENSION_VERBOSE=True for more info)...")
-        try:
-            decompress_residuals_cpp = load(
-                name="decompress_residuals_cpp",
-                sources=[
-                    os.path.join(
-                        pathlib.Path(__file__).parent.resolve(), "decompress_residuals.cpp"
-                    ),
-                    os.path.join(
-                        pathlib.Path(__file__).parent.resolve(), "decompress_residuals.cu"
-                    ),
-                ],
-                extra_cflags=["-O3"],
-                verbose=verbose,
-            )
-        except (RuntimeError, KeyboardInterrupt) as e:
-            if not verbose:
-                import traceback
-                traceback.print_exc()
-            print_torch_extension_error_message()
-            sys.exit(1)
-        cls.decompress_residuals = decompress_residuals_cpp.decompress_residuals_cpp
-
-        print_message(f"Loading packbits_cpp extension (set COLBERT_LOAD_TORCH_EXTENSION_VERBOSE=True for more info)...")
-        try:
-            packbits_cpp = load(
-                name="packbits_cpp",
-                sources=[
-                    os.path.join(
-                        pathlib.Path(__file__).parent.resolve(), "packbits.cpp"
-                    ),
-                    os.path.join(
-                        pathlib.Path(__file__).parent.resolve(), "packbits.cu"
-                    ),
-                ],
-                extra_cflags=["-O3"],
-                verbose=os.getenv("COLBERT_LOAD_TORCH_EXTENSION_VERBOSE", "False") == "True",
-            )
-        except (RuntimeError, KeyboardInterrupt) as e:
-            if not verbose:
-                import traceback
-                traceback.print_exc()
-            print_torch_extension_error_message()
-            sys.exit(1)
-        cls.packbits = packbits_cpp.packbits_cpp
+        cls.decompress_residuals = load_extension('decompress_residuals_cuda') or decompress_residuals
+        cls.packbits = load_extension('packbits_cuda') or packbits
 
         cls.loaded_extensions = True
 
@@ -235,24 +188,40 @@ class ResidualCodec:
 
     def compress_into_codes(self, embs, out_device):
         """
-            EVENTUALLY: Fusing the kernels or otherwise avoiding materalizing the entire matrix before max(dim=0)
-                        seems like it would help here a lot.
+            Assigns each embedding to the centroid with the highest inner product. Centroids are scored block by
+            block while keeping a running max/argmax per embedding, so the (#centroids x #embeddings) score matrix is
+            never materialized. With `centroid_assignment='faiss'`, CPU codecs use FAISS's exact inner-product search.
         """
 
+        if self.centroid_assignment == 'faiss' and not self.use_gpu:
+            return self._faiss_compress_into_codes(embs).to(device=out_device)
+
+        assert self.centroid_assignment in ['tiled', 'faiss'], self.centroid_assignment
+
         codes = []
 
-        bsize = (1 << 29) // self.centroids.size(0)
-        for batch in embs.split(bsize):
+        for batch in embs.split(1 << 12):
 
             if self.use_gpu:
-                indices = (self.centroids @ batch.T.cuda().half()).max(dim=0).indices.to(device=out_device)
+                batch = batch.cuda().half()
             else:
-                indices = (self.centroids @ batch.T.cpu().float()).max(dim=0).indices.to(device=out_device)
+                batch = batch.cpu().float()
 
-            codes.append(indices)
+            codes.append(argmax_inner_product(self.centroids, batch).to(device=out_device))
 
         return torch.cat(codes)
 
+    def _faiss_compress_into_codes(self, embs):
+        import faiss
+
+        if self.faiss_centroids_index is None:
+            self.faiss_centroids_index = faiss.IndexFlatIP(self.dim)
+            self.faiss_centroids_index.add(np.ascontiguousarray(self.centroids.numpy()))
+
+        _, codes = self.faiss_centroids_index.search(np.ascontiguousarray(embs.cpu().float().numpy()), 1)
+
+        return torch.from_numpy(codes).squeeze(1)
+
     def lookup_centroids(self, codes, out_device):
         """
             Handles multi-dimensional codes too.
@@ -297,3 +266,44 @@ class ResidualCodec:
             D.append(D_)
 
         return torch.cat(D)
+
+
+def argmax_inner_product(centroids, embs, centroids_bsize=1 << 12):
+    """
+        Returns the index of the row of `centroids` with the highest inner product with each row of `embs`,
+        scoring `centroids_bsize` centroids at a time. Ties go to the lowest index, like max().
+    """
+
+    best_scores = torch.full((embs.size(0),), float('-inf'), dtype=embs.dtype, device=embs.device)
+    best_codes = torch.zeros(embs.size(0), dtype=torch.long, device=embs.device)
+
+    for offset in range(0, centroids.size(0), centroids_bsize):
+        scores, codes = (embs @ centroids[offset:offset+centroids_bsize].T).max(dim=1)
+
+        improved = scores > best_scores
+        best_scores = torch.where(improved, scores, best_scores)
+        best_codes = torch.where(improved, codes + offset, best_codes)
+
+    return best_codes
+
+
+def decompress_residuals(binary_residuals, bucket_weights, reversed_bit_map, bucket_weight_combinations, codes,
+                         centroids, dim, nbits):
+    """
+        PyTorch implementation of the decompress_residuals extensions: each embedding is its centroid plus, in every
+        dimension, the bucket weight of its `nbits` residual bits.
+    """
+    bucket_idxs = bucket_weight_combinations[reversed_bit_map[binary_residuals.long()].long()]
+    bucket_idxs = bucket_idxs.reshape(binary_residuals.size(0), dim).long()
+
+    return bucket_weights[bucket_idxs] + centroids[codes.long()]
+
+
+def packbits(bits):
+    """
+        PyTorch implementation of the packbits extension, like np.packbits: packs a flat tensor of 0/1 bits into
+        bytes, the first bit being the most significant one of each byte.
+    """
+    weights = torch.tensor([128, 64, 32, 16, 8, 4, 2, 1], dtype=torch.uint8, device=bits.device)
+
+    return ((bits.reshape(-1, 8) != 0).to(torch.uint8) * weights).sum(-1, dtype=torch.uint8)
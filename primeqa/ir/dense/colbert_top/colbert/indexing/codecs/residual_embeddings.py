@@ -3,6 +3,7 @@ import torch
 import ujson
 
 from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual_embeddings_strided import ResidualEmbeddingsStrided
+from primeqa.ir.dense.colbert_top.colbert.indexing.loaders import save_flat_tensor, load_flat_tensor, open_flat_file
 
 
 class ResidualEmbeddings:
@@ -47,6 +48,63 @@ class ResidualEmbeddings:
 
         return cls(codes, residuals)
 
+    @classmethod
+    def save_chunks_as_mmap(cls, index_path, chunk_idxs):
+        """
+            Writes the codes and residuals of all chunks into the flat `codes.bin` and `residuals.bin` files,
+            one chunk at a time, followed by the same padding that `load_chunks` adds.
+        """
+        dim, nbits = get_dim_and_nbits(index_path)
+
+        with open_flat_file(os.path.join(index_path, 'codes.bin')) as codes_f, \
+             open_flat_file(os.path.join(index_path, 'residuals.bin')) as residuals_f:
+            for chunk_idx in chunk_idxs:
+                chunk = cls.load(index_path, chunk_idx)
+
+                save_flat_tensor(codes_f, chunk.codes)
+                save_flat_tensor(residuals_f, chunk.residuals)
+
+            save_flat_tensor(codes_f, torch.zeros(512, dtype=torch.int32))
+            save_flat_tensor(residuals_f, torch.zeros(512, dim // 8 * nbits, dtype=torch.uint8))
+
+    @classmethod
+    def append_chunks_to_mmap(cls, index_path, chunk_idxs, num_embeddings):
+        """
+            Appends the codes and residuals of the new chunks to the flat files of an index of `num_embeddings`,
+            over their padding, and pads them again. The files only grow, so processes that have them mapped
+            keep reading the same bytes for all the embeddings they know of.
+        """
+        dim, nbits = get_dim_and_nbits(index_path)
+
+        with open(os.path.join(index_path, 'codes.bin'), 'r+b') as codes_f, \
+             open(os.path.join(index_path, 'residuals.bin'), 'r+b') as residuals_f:
+            codes_f.seek(num_embeddings * 4)
+            residuals_f.seek(num_embeddings * (dim // 8 * nbits))
+
+            for chunk_idx in chunk_idxs:
+                chunk = cls.load(index_path, chunk_idx)
+
+                save_flat_tensor(codes_f, chunk.codes)
+                save_flat_tensor(residuals_f, chunk.residuals)
+
+            save_flat_tensor(codes_f, torch.zeros(512, dtype=torch.int32))
+            save_flat_tensor(residuals_f, torch.zeros(512, dim // 8 * nbits, dtype=torch.uint8))
+
+    @classmethod
+    def load_mmap(cls, index_path, num_embeddings):
+        """
+            Zero-copy counterpart of `load_chunks` for indexes saved with `save_chunks_as_mmap`.
+        """
+        dim, nbits = get_dim_and_nbits(index_path)
+
+        codes = load_flat_tensor(os.path.join(index_path, 'codes.bin'), torch.int32)
+        residuals = load_flat_tensor(os.path.join(index_path, 'residuals.bin'), torch.uint8, (dim // 8 * nbits,))
+
+        # The files may already have grown past `num_embeddings` with passages being added to the index.
+        assert codes.size(0) >= num_embeddings + 512, (codes.size(), num_embeddings)
+
+        return cls(codes[:num_embeddings + 512], residuals[:num_embeddings + 512])
+
     @classmethod
     def load(cls, index_path, chunk_idx):
         codes = cls.load_codes(index_path, chunk_idx)
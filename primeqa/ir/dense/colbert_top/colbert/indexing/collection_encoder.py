@@ -1,4 +1,6 @@
+import copy
 import torch
+import threading
 
 from primeqa.ir.dense.colbert_top.colbert.infra.run import Run
 from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message, batch
@@ -9,6 +11,9 @@ class CollectionEncoder():
         self.config = config
         self.checkpoint = checkpoint
 
+        self.thread_local = threading.local()
+        self.thread_lock = threading.Lock()
+
     def encode_passages(self, passages):
         Run().print(f"#> Encoding {len(passages)} passages..")
 
@@ -43,3 +48,43 @@ class CollectionEncoder():
         #     embs = torch.cat(embs)
 
         return embs, doclens
+
+    def tokenize_passages_async(self, passages, executor):
+        """
+            Submits the tokenization of `passages` to `executor`, in the same sub-batches as `encode_passages`.
+            Each worker thread tokenizes with its own copy of the doc tokenizer, as (fast) HF tokenizers
+            cannot be called concurrently. Returns a list of futures for `encode_tokenized_passages`.
+        """
+        return [executor.submit(self._tensorize, passages_batch)
+                for passages_batch in batch(passages, self.config.bsize * 50)]
+
+    def encode_tokenized_passages(self, passages, tokenized_batches):
+        """
+            Like `encode_passages`, but with the tokenization already submitted by `tokenize_passages_async`.
+        """
+        Run().print(f"#> Encoding {len(passages)} passages..")
+
+        if len(passages) == 0:
+            return None, None
+
+        with torch.inference_mode():
+            embs, doclens = [], []
+
+            for tokenized_batch in tokenized_batches:
+                text_batches, reverse_indices = tokenized_batch.result()
+                embs_, doclens_ = self.checkpoint.docFromTensorized(text_batches, reverse_indices,
+                                                                    keep_dims='flatten', showprogress=False)
+                embs.append(embs_)
+                doclens.extend(doclens_)
+
+            embs = torch.cat(embs)
+
+        return embs, doclens
+
+    def _tensorize(self, passages):
+        if not hasattr(self.thread_local, 'doc_tokenizer'):
+            with self.thread_lock:
+                self.thread_local.doc_tokenizer = copy.deepcopy(self.checkpoint.doc_tokenizer)
+
+        return self.thread_local.doc_tokenizer.tensorize(passages, bsize=self.config.bsize,
+                                                         max_batch_tokens=self.config.max_batch_tokens)
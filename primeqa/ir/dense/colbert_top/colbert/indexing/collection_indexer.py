@@ -7,6 +7,8 @@ import torch
 import random
 
 import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import torch.multiprocessing as mp
 from primeqa.ir.dense.colbert_top.colbert.infra.config.config import ColBERTConfig
 
@@ -19,10 +21,11 @@ from primeqa.ir.dense.colbert_top.colbert.data.collection import Collection
 
 from primeqa.ir.dense.colbert_top.colbert.indexing.collection_encoder import CollectionEncoder
 from primeqa.ir.dense.colbert_top.colbert.indexing.index_saver import IndexSaver
-from primeqa.ir.dense.colbert_top.colbert.indexing.utils import optimize_ivf
-from primeqa.ir.dense.colbert_top.colbert.utils.utils import flatten, print_message
+from primeqa.ir.dense.colbert_top.colbert.indexing.loaders import load_flat_tensor, save_flat_tensor
+from primeqa.ir.dense.colbert_top.colbert.indexing.utils import optimize_ivf, save_mmap_index
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import batch, flatten, print_message
 
-from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual import ResidualCodec
+from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual import ResidualCodec, argmax_inner_product
 
 
 def encode(config, collection, shared_lists, shared_queues):
@@ -102,7 +105,7 @@ class CollectionIndexer():
         # Then we subsample the vectors to 100 * num_partitions
 
         typical_doclen = 120  # let's keep sampling independent of the actual doc_maxlen
-        sampled_pids = 16 * np.sqrt(typical_doclen * num_passages)
+        sampled_pids = self.config.kmeans_sample_factor * np.sqrt(typical_doclen * num_passages)
         # sampled_pids = int(2 ** np.floor(np.log2(1 + sampled_pids)))
         sampled_pids = min(1 + int(sampled_pids), num_passages)
 
@@ -115,10 +118,14 @@ class CollectionIndexer():
         local_pids = self.collection.enumerate(rank=self.rank)
         local_sample = [passage for pid, passage in local_pids if pid in sampled_pids]
 
-        local_sample_embs, doclens = self.encoder.encode_passages(local_sample)
+        if self.config.kmeans_mode == 'streaming':
+            num_local_sample_embs, doclens = self._save_sample_shard(local_sample)
+        else:
+            local_sample_embs, doclens = self.encoder.encode_passages(local_sample)
+            num_local_sample_embs = local_sample_embs.size(0)
 
         if torch.cuda.is_available():
-            self.num_sample_embs = torch.tensor([local_sample_embs.size(0)]).cuda()
+            self.num_sample_embs = torch.tensor([num_local_sample_embs]).cuda()
             torch.distributed.all_reduce(self.num_sample_embs)
 
             avg_doclen_est = sum(doclens) / len(doclens) if doclens else 0
@@ -129,7 +136,7 @@ class CollectionIndexer():
             torch.distributed.all_reduce(nonzero_ranks)
         else:
             if torch.distributed.is_initialized():
-                self.num_sample_embs = torch.tensor([local_sample_embs.size(0)]).cpu()
+                self.num_sample_embs = torch.tensor([num_local_sample_embs]).cpu()
                 torch.distributed.all_reduce(self.num_sample_embs)
 
                 avg_doclen_est = sum(doclens) / len(doclens) if doclens else 0
@@ -139,7 +146,7 @@ class CollectionIndexer():
                 nonzero_ranks = torch.tensor([float(len(local_sample) > 0)]).cpu()
                 torch.distributed.all_reduce(nonzero_ranks)
             else:
-                self.num_sample_embs = torch.tensor([local_sample_embs.size(0)]).cpu()
+                self.num_sample_embs = torch.tensor([num_local_sample_embs]).cpu()
 
                 avg_doclen_est = sum(doclens) / len(doclens) if doclens else 0
                 avg_doclen_est = torch.tensor([avg_doclen_est]).cpu()
@@ -151,10 +158,28 @@ class CollectionIndexer():
 
         Run().print(f'avg_doclen_est = {avg_doclen_est} \t len(local_sample) = {len(local_sample):,}')
 
-        torch.save(local_sample_embs, os.path.join(self.config.index_path_, f'sample.{self.rank}.pt'))
+        if self.config.kmeans_mode != 'streaming':
+            torch.save(local_sample_embs, os.path.join(self.config.index_path_, f'sample.{self.rank}.pt'))
 
         return avg_doclen_est
 
+    def _save_sample_shard(self, local_sample):
+        """
+            Encodes the local sample batch by batch and appends the embeddings to `sample.{rank}.bin`, as a flat
+            float16 array, so that the sample never has to fit in memory. Returns their number and the doclens.
+        """
+        num_embs, doclens = 0, []
+
+        with open(os.path.join(self.config.index_path_, f'sample.{self.rank}.bin'), 'wb') as f:
+            for passages in batch(local_sample, 25_000):
+                embs, doclens_ = self.encoder.encode_passages(passages)
+                save_flat_tensor(f, embs.cpu().half())
+
+                num_embs += embs.size(0)
+                doclens.extend(doclens_)
+
+        return num_embs, doclens
+
     def _save_plan(self):
         if self.rank < 1:
             config = self.config
@@ -174,12 +199,18 @@ class CollectionIndexer():
         if self.rank > 0:
             return
 
-        sample, heldout = self._concatenate_and_split_sample()
+        start = time.time()
 
-        centroids = self._train_kmeans(sample, shared_lists)
+        if self.config.kmeans_mode == 'streaming':
+            centroids, heldout = self._train_streaming_kmeans()
+        else:
+            sample, heldout = self._concatenate_and_split_sample()
+            centroids = self._train_kmeans(sample, shared_lists)
+            del sample
 
+        print_message(f'#> Trained {self.num_partitions:,} centroids in {time.time() - start:.1f}s '
+                      f'({self.config.kmeans_mode} k-means)')
         print_memory_stats(f'RANK:{self.rank}')
-        del sample
 
         bucket_cutoffs, bucket_weights, avg_residual = self._compute_avg_residual(centroids, heldout)
 
@@ -252,6 +283,37 @@ class CollectionIndexer():
 
         return centroids
 
+    def _train_streaming_kmeans(self):
+        """
+            Trains the centroids with mini-batch k-means over the sample shards on disk, reading chunks of
+            at most `kmeans_memory_budget_mb` at a time. Returns them and the (in-memory) heldout sub-sample.
+        """
+        shard_paths = [os.path.join(self.config.index_path_, f'sample.{r}.bin') for r in range(self.nranks)]
+        shards = [load_flat_tensor(path, torch.float16, inner_dims=(self.config.dim,)) for path in shard_paths]
+        num_sample_embs = sum(shard.size(0) for shard in shards)
+
+        # Hold out the same 5% sub-sample [up to 50k elements] as _concatenate_and_split_sample
+        heldout_size = int(min(0.05 * num_sample_embs, 50_000))
+        is_heldout = torch.zeros(num_sample_embs, dtype=torch.bool)
+        is_heldout[torch.randperm(num_sample_embs)[:heldout_size]] = True
+
+        heldout, offset = [], 0
+        for shard in shards:
+            heldout.append(shard[is_heldout[offset:offset+shard.size(0)]])
+            offset += shard.size(0)
+        heldout = torch.cat(heldout)
+
+        centroids = compute_streaming_kmeans(shards, self.num_partitions, self.config.kmeans_niters,
+                                             self.config.kmeans_memory_budget_mb, is_heldout=is_heldout)
+
+        del shards
+        for path in shard_paths:
+            os.remove(path)
+
+        centroids = torch.nn.functional.normalize(centroids, dim=-1).half()
+
+        return centroids, heldout
+
     def _compute_avg_residual(self, centroids, heldout):
         compressor = ResidualCodec(config=self.config, centroids=centroids, avg_residual=None)
 
@@ -286,10 +348,23 @@ class CollectionIndexer():
         # sample_avg_residual = (sample - sample_reconstruct).mean(dim=0)
 
     def index(self):
-        with self.saver.thread():
+        """
+            Encodes and saves the collection chunk by chunk, as a pipeline: `index_tokenizer_threads` threads
+            tokenize the next chunks while the model encodes the current one, and the saver compresses and writes
+            the previous ones in the background. With `index_tokenizer_threads=0`, chunks are tokenized inline.
+        """
+        nthreads = self.config.index_tokenizer_threads
+
+        with self.saver.thread(), ThreadPoolExecutor(max_workers=max(nthreads, 1)) as executor:
             batches = self.collection.enumerate_batches(rank=self.rank)
-            for chunk_idx, offset, passages in tqdm.tqdm(batches, disable=self.rank > 0):
-                embs, doclens = self.encoder.encode_passages(passages)
+            batches = self._tokenize_ahead(batches, executor) if nthreads > 0 else batches
+
+            for chunk_idx, offset, passages, *tokenized in tqdm.tqdm(batches, disable=self.rank > 0):
+                if tokenized:
+                    embs, doclens = self.encoder.encode_tokenized_passages(passages, *tokenized)
+                else:
+                    embs, doclens = self.encoder.encode_passages(passages)
+
                 if torch.cuda.is_available():
                     assert embs.dtype == torch.float16, embs.dtype
                 else:
@@ -302,6 +377,19 @@ class CollectionIndexer():
                 self.saver.save_chunk(chunk_idx, offset, embs, doclens)
                 del embs, doclens
 
+    def _tokenize_ahead(self, batches, executor, depth=2):
+        # Keeps the tokenization of up to `depth` chunks in flight ahead of the one being encoded.
+        pending = deque()
+
+        for chunk_idx, offset, passages in batches:
+            pending.append((chunk_idx, offset, passages, self.encoder.tokenize_passages_async(passages, executor)))
+
+            if len(pending) > depth:
+                yield pending.popleft()
+
+        while pending:
+            yield pending.popleft()
+
     def finalize(self):
         if self.rank > 0:
             return
@@ -312,6 +400,9 @@ class CollectionIndexer():
         self._build_ivf()
         self._update_metadata()
 
+        if self.config.index_format == 'mmap':
+            save_mmap_index(self.config.index_path_)
+
     def _check_all_files_are_saved(self):
         for chunk_idx in range(self.num_chunks):
             # EVENTUALLY: Check those files!
@@ -386,7 +477,7 @@ class CollectionIndexer():
 
         print_memory_stats(f'RANK:{self.rank}')
 
-        _, _ = optimize_ivf(ivf, ivf_lengths, self.config.index_path_)
+        _, _ = optimize_ivf(ivf, ivf_lengths, self.config.index_path_, compress=self.config.compress_ivf)
 
     def _update_metadata(self):
         config = self.config
@@ -420,6 +511,74 @@ def compute_faiss_kmeans(dim, num_partitions, kmeans_niters, shared_lists, retur
     return centroids
 
 
+def compute_streaming_kmeans(shards, num_partitions, kmeans_niters, memory_budget_mb, is_heldout=None, seed=123,
+                             batch_size=1 << 14):
+    """
+        Spherical mini-batch k-means (Sculley, 2010) over the rows of the 2D tensors `shards` (e.g., memory-mapped),
+        which are read in chunks of at most about `memory_budget_mb`, in random order, skipping the rows where
+        `is_heldout` (over the concatenated shards) is true. Each mini-batch moves the centroids it is assigned to
+        towards its embeddings, with a per-centroid learning rate of 1 / #embeddings assigned so far.
+        `kmeans_niters` is the number of passes over the sample.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    dim = shards[0].size(1)
+
+    # A float16 row as read and its float32 copy, besides the (bounded) score tiles of argmax_inner_product
+    chunk_size = max(batch_size, (memory_budget_mb << 20) // (6 * dim))
+    offsets = [0] + np.cumsum([shard.size(0) for shard in shards]).tolist()
+
+    chunks = [(shard_idx, start, min(start + chunk_size, shard.size(0)))
+              for shard_idx, shard in enumerate(shards) for start in range(0, shard.size(0), chunk_size)]
+
+    # Initialize the centroids with random (non-heldout) embeddings
+    init_idxs = torch.randperm(offsets[-1], generator=generator)
+    if is_heldout is not None:
+        init_idxs = init_idxs[~is_heldout[init_idxs]]
+    init_idxs = init_idxs[:num_partitions].sort().values
+    assert init_idxs.size(0) == num_partitions, (init_idxs.size(0), num_partitions)
+
+    centroids = torch.cat([shard[init_idxs[(init_idxs >= offsets[idx]) & (init_idxs < offsets[idx+1])] - offsets[idx]]
+                           for idx, shard in enumerate(shards)])
+    centroids = torch.nn.functional.normalize(centroids.float(), dim=-1).to(device)
+    counts = torch.zeros(num_partitions, device=device)
+
+    for iteration in range(kmeans_niters):
+        start_time = time.time()
+
+        for chunk_idx in torch.randperm(len(chunks), generator=generator).tolist():
+            shard_idx, start, end = chunks[chunk_idx]
+            chunk = shards[shard_idx][start:end]
+
+            if is_heldout is not None:
+                chunk = chunk[~is_heldout[offsets[shard_idx]+start:offsets[shard_idx]+end]]
+
+            chunk = chunk[torch.randperm(chunk.size(0), generator=generator)]
+
+            for embs in chunk.split(batch_size):
+                embs = embs.to(device).float()
+                codes = argmax_inner_product(centroids, embs)
+
+                batch_counts = torch.bincount(codes, minlength=num_partitions).float()
+                batch_sums = torch.zeros_like(centroids).index_add_(0, codes, embs)
+                counts += batch_counts
+
+                updated = batch_counts > 0
+                step = (batch_sums[updated] - batch_counts[updated, None] * centroids[updated]) / counts[updated, None]
+                centroids[updated] = torch.nn.functional.normalize(centroids[updated] + step, dim=-1)
+
+        # Re-seed the centroids that no embedding was assigned to yet, with embeddings of the last mini-batch
+        empty = (counts == 0).nonzero().squeeze(1)
+        if empty.numel() > 0:
+            reseed_idxs = torch.randint(embs.size(0), (empty.numel(),), generator=generator).to(device)
+            centroids[empty] = torch.nn.functional.normalize(embs[reseed_idxs], dim=-1)
+
+        print_message(f"#> Streaming k-means iteration {iteration + 1}/{kmeans_niters}: {time.time() - start_time:.1f}s, "
+                      f"{empty.numel():,} empty centroids re-seeded")
+
+    return centroids.cpu()
+
+
 """
 TODOs:
 
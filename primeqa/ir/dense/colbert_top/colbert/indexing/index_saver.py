@@ -1,5 +1,6 @@
 import os
 import queue
+import torch
 import ujson
 import threading
 
@@ -22,30 +23,83 @@ class IndexSaver():
 
     @contextmanager
     def thread(self):
+        """
+            Compresses and writes chunks in two background threads, so that `save_chunk` returns right away and
+            the caller can move on to encoding the next chunk. Both queues are bounded: `save_chunk` blocks when
+            compression falls behind, which caps the number of uncompressed chunks held in memory.
+
+            If either thread fails, both keep draining their queue so that nothing blocks, and the error is
+            raised again from the next `save_chunk` and when leaving the context.
+        """
         self.codec = self.load_codec()
+        device = torch.cuda.current_device() if torch.cuda.is_available() else None
 
+        self.compressor_queue = queue.Queue(maxsize=1)
         self.saver_queue = queue.Queue(maxsize=3)
-        thread = threading.Thread(target=self._saver_thread)
-        thread.start()
+        self.error = None
+
+        threads = [threading.Thread(target=self._compressor_thread, args=(device,)),
+                   threading.Thread(target=self._saver_thread)]
+
+        for thread in threads:
+            thread.start()
 
         try:
             yield
 
         finally:
-            self.saver_queue.put(None)
-            thread.join()
+            self.compressor_queue.put(None)
 
+            for thread in threads:
+                thread.join()
+
+            error = self.error
+
+            del self.compressor_queue
             del self.saver_queue
             del self.codec
+            del self.error
+
+        if error is not None:
+            raise error
 
     def save_chunk(self, chunk_idx, offset, embs, doclens):
-        compressed_embs = self.codec.compress(embs)
+        if self.error is not None:
+            raise self.error
 
-        self.saver_queue.put((chunk_idx, offset, compressed_embs, doclens))
+        self.compressor_queue.put((chunk_idx, offset, embs, doclens))
+
+    def _compressor_thread(self, device):
+        # The CUDA device and inference mode are thread-local, so re-enter the caller's here.
+        if device is not None:
+            torch.cuda.set_device(device)
+
+        try:
+            with torch.inference_mode():
+                for chunk_idx, offset, embs, doclens in iter(self.compressor_queue.get, None):
+                    if self.error is not None:
+                        continue
+
+                    try:
+                        compressed_embs = self.codec.compress(embs)
+                    except Exception as e:
+                        self.error = e
+                        continue
+
+                    del embs
+                    self.saver_queue.put((chunk_idx, offset, compressed_embs, doclens))
+        finally:
+            self.saver_queue.put(None)
 
     def _saver_thread(self):
         for args in iter(self.saver_queue.get, None):
-            self._write_chunk_to_disk(*args)
+            if self.error is not None:
+                continue
+
+            try:
+                self._write_chunk_to_disk(*args)
+            except Exception as e:
+                self.error = e
 
     def _write_chunk_to_disk(self, chunk_idx, offset, compressed_embs, doclens):
         path_prefix = os.path.join(self.config.index_path_, str(chunk_idx))
@@ -0,0 +1,177 @@
+import os
+import ujson
+import torch
+import itertools
+
+from primeqa.ir.dense.colbert_top.colbert.infra.config.config import ColBERTConfig
+from primeqa.ir.dense.colbert_top.colbert.modeling.checkpoint import Checkpoint
+from primeqa.ir.dense.colbert_top.colbert.data.collection import Collection
+
+from primeqa.ir.dense.colbert_top.colbert.indexing.collection_encoder import CollectionEncoder
+from primeqa.ir.dense.colbert_top.colbert.indexing.loaders import load_doclens
+from primeqa.ir.dense.colbert_top.colbert.indexing.utils import save_mmap_doclens_and_ivf, load_ivf, save_ivf, \
+    unique_postings
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
+
+from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual import ResidualCodec
+
+
+class IndexUpdater():
+    """
+        Adds passages to and deletes passages from an existing index without rebuilding it.
+
+        New passages are compressed with the index's existing codec (centroids and buckets) into new chunks,
+        and their postings are merged into the IVF. Deleted passages are only marked in a tombstone
+        bitmap (`tombstones.pt`), which `IndexScorer` uses to drop them from the candidates.
+    """
+
+    def __init__(self, config: ColBERTConfig):
+        self.config = config
+        self.index_path = config.index_path_
+
+        with open(os.path.join(self.index_path, 'metadata.json')) as f:
+            self.metadata = ujson.load(f)
+
+        self.num_passages = len(load_doclens(self.index_path, flatten=True))
+
+    def add(self, collection):
+        """
+            Encodes `collection` and appends it to the index. The new passages get the pids that follow
+            the last pid already in the index, in order. Returns the range of the new pids.
+
+            The collection is read in chunks of 25k passages, so it is never held in memory as a whole. The
+            flat files of a memory-mapped index are extended, and their doclens and IVF replaced, not rewritten.
+        """
+        collection = Collection.cast(collection)
+
+        codec = ResidualCodec.load(self.index_path)
+
+        if torch.cuda.is_available():
+            checkpoint = Checkpoint(self.config.checkpoint, colbert_config=self.config).cuda()
+        else:
+            checkpoint = Checkpoint(self.config.checkpoint, colbert_config=self.config).cpu()
+
+        encoder = CollectionEncoder(self.config, checkpoint)
+
+        first_pid = self.num_passages
+        first_chunk_idx = chunk_idx = self.metadata['num_chunks']
+        first_embedding_offset = embedding_offset = self.metadata['num_embeddings']
+
+        all_codes, all_pids = [], []
+        passages_iterator, offset = iter(collection), 0
+
+        with torch.inference_mode():
+            while True:
+                passages = list(itertools.islice(passages_iterator, 25_000))
+                if len(passages) == 0:
+                    break
+
+                embs, doclens = encoder.encode_passages(passages)
+                if not torch.cuda.is_available():
+                    embs = embs.half()
+
+                compressed_embs = codec.compress(embs)
+                passage_offset = first_pid + offset
+
+                print_message(f"#> Saving chunk {chunk_idx}: \t {len(passages):,} passages "
+                              f"and {embs.size(0):,} embeddings. From #{passage_offset:,} onward.")
+
+                self._write_chunk_to_disk(chunk_idx, passage_offset, embedding_offset, compressed_embs, doclens)
+
+                pids = torch.arange(passage_offset, passage_offset + len(doclens))
+                all_pids.append(pids.repeat_interleave(torch.tensor(doclens)))
+                all_codes.append(compressed_embs.codes)
+
+                chunk_idx += 1
+                embedding_offset += len(compressed_embs)
+                offset += len(passages)
+
+        if len(all_codes) == 0:
+            return range(first_pid, first_pid)
+
+        self._merge_ivf(torch.cat(all_codes), torch.cat(all_pids))
+
+        if self.metadata['config'].get('index_format', 'torch') == 'mmap':
+            ResidualCodec.Embeddings.append_chunks_to_mmap(self.index_path, range(first_chunk_idx, chunk_idx),
+                                                           first_embedding_offset)
+            save_mmap_doclens_and_ivf(self.index_path)
+
+        self.num_passages = first_pid + offset
+        self.metadata['num_chunks'] = chunk_idx
+        self.metadata['num_embeddings'] = embedding_offset
+        self.metadata['avg_doclen'] = embedding_offset / self.num_passages
+        self._update_metadata()
+
+        # Existing tombstones are extended to the new passages, even if none is set (e.g., after `delete([])`)
+        if os.path.exists(os.path.join(self.index_path, 'tombstones.pt')):
+            self._save_tombstones(self._load_tombstones())
+
+        return range(first_pid, self.num_passages)
+
+    def delete(self, pids):
+        """
+            Marks `pids` as deleted. Their embeddings and postings stay on disk until the index is rebuilt.
+        """
+        pids = torch.as_tensor(list(pids), dtype=torch.long)
+        assert pids.numel() == 0 or (pids.min() >= 0 and pids.max() < self.num_passages), pids
+
+        tombstones = self._load_tombstones()
+        tombstones[pids] = True
+        self._save_tombstones(tombstones)
+
+        print_message(f"#> Deleted {pids.numel():,} passages, {tombstones.sum().item():,} deleted in total.")
+
+        return tombstones
+
+    def _write_chunk_to_disk(self, chunk_idx, passage_offset, embedding_offset, compressed_embs, doclens):
+        path_prefix = os.path.join(self.index_path, str(chunk_idx))
+        compressed_embs.save(path_prefix)
+
+        doclens_path = os.path.join(self.index_path, f'doclens.{chunk_idx}.json')
+        with open(doclens_path, 'w') as output_doclens:
+            ujson.dump(doclens, output_doclens)
+
+        metadata_path = os.path.join(self.index_path, f'{chunk_idx}.metadata.json')
+        with open(metadata_path, 'w') as output_metadata:
+            metadata = {'passage_offset': passage_offset, 'num_passages': len(doclens),
+                        'num_embeddings': len(compressed_embs), 'embedding_offset': embedding_offset}
+            output_metadata.write(ujson.dumps(metadata, indent=4) + '\n')
+
+    def _merge_ivf(self, codes, pids):
+        ivf, ivf_lengths, compressed = load_ivf(self.index_path)
+
+        num_partitions = ivf_lengths.size(0)
+        ivf_centroids = torch.arange(num_partitions).repeat_interleave(ivf_lengths)
+
+        centroids = torch.cat((ivf_centroids, codes.long()))
+        pids = torch.cat((ivf.long(), pids))
+
+        ivf, ivf_lengths = unique_postings(centroids, pids, num_partitions)
+        ivf_path = save_ivf(self.index_path, ivf, ivf_lengths, compress=compressed)
+
+        print_message(f"#> Merged {codes.size(0):,} new embeddings into the IVF at {ivf_path}")
+
+    def _update_metadata(self):
+        metadata_path = os.path.join(self.index_path, 'metadata.json')
+
+        with open(metadata_path + '.tmp', 'w') as f:
+            f.write(ujson.dumps(self.metadata, indent=4) + '\n')
+
+        os.replace(metadata_path + '.tmp', metadata_path)
+
+    def _load_tombstones(self):
+        tombstones = torch.zeros(self.num_passages, dtype=torch.bool)
+        tombstones_path = os.path.join(self.index_path, 'tombstones.pt')
+
+        if os.path.exists(tombstones_path):
+            old_tombstones = torch.load(tombstones_path, map_location='cpu')
+            tombstones[:old_tombstones.size(0)] = old_tombstones
+
+        return tombstones
+
+    def _save_tombstones(self, tombstones):
+        # Searchers may be loading the tombstones, so the file is replaced once complete.
+        tombstones_path = os.path.join(self.index_path, 'tombstones.pt')
+
+        torch.save(tombstones, tombstones_path + '.tmp')
+        os.replace(tombstones_path + '.tmp', tombstones_path)
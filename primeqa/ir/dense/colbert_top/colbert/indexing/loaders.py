@@ -1,6 +1,10 @@
 import re
 import os
 import ujson
+import torch
+import contextlib
+
+import numpy as np
 
 
 def get_parts(directory):
@@ -64,3 +68,52 @@ def get_deltas(directory):
 #                 return [float(v) for v in line[1:]]
 
 #     raise ValueError(f"No data found for {level}-bit compression")
+
+
+FLAT_DTYPES = {
+    torch.uint8: '<u1',
+    torch.int32: '<i4',
+    torch.int64: '<i8',
+    torch.float16: '<f2',
+    torch.float32: '<f4',
+}
+
+
+def save_flat_tensor(f, tensor):
+    """
+        Appends `tensor` to the open binary file `f` as a flat, raw little-endian array.
+    """
+    f.write(tensor.contiguous().numpy().astype(FLAT_DTYPES[tensor.dtype], copy=False).tobytes())
+
+
+@contextlib.contextmanager
+def open_flat_file(path):
+    """
+        Opens `<path>.tmp` for writing flat tensors and moves it to `path` once it is complete. Other processes
+        may have `path` memory-mapped, so it must be replaced (a new inode) rather than truncated and rewritten.
+    """
+    temp_path = path + '.tmp'
+
+    try:
+        with open(temp_path, 'wb') as f:
+            yield f
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+    os.replace(temp_path, path)
+
+
+def load_flat_tensor(path, dtype, inner_dims=()):
+    """
+        Memory-maps a flat array written by `save_flat_tensor`. The mapping is copy-on-write, so the
+        pages are shared (through the page cache) by every process that maps the same file.
+    """
+    # np.memmap cannot map empty files, e.g., the sample shard of a rank with no sampled passages
+    if os.path.getsize(path) == 0:
+        return torch.empty((0, *inner_dims), dtype=dtype)
+
+    array = np.memmap(path, dtype=FLAT_DTYPES[dtype], mode='c')
+    array = array.reshape(-1, *inner_dims)
+
+    return torch.from_numpy(array)
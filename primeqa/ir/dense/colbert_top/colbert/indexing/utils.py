@@ -1,53 +1,119 @@
 import os
 import torch
-import tqdm
+import ujson
 
-from primeqa.ir.dense.colbert_top.colbert.indexing.loaders import load_doclens
-from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message, flatten
+from primeqa.ir.dense.colbert_top.colbert.indexing.loaders import load_doclens, save_flat_tensor, open_flat_file
+from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual_embeddings import ResidualEmbeddings
+from primeqa.ir.dense.colbert_top.colbert.search.strided_tensor import encode_delta_varint, decode_delta_varint
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
 
-def optimize_ivf(orig_ivf, orig_ivf_lengths, index_path):
+def optimize_ivf(orig_ivf, orig_ivf_lengths, index_path, compress=False):
     print_message("#> Optimizing IVF to store map from centroids to list of pids..")
 
     print_message("#> Building the emb2pid mapping..")
-    all_doclens = load_doclens(index_path, flatten=False)
+    all_doclens = load_doclens(index_path, flatten=True)
 
-    all_doclens = flatten(all_doclens)
-    total_num_embeddings = sum(all_doclens)
+    emb2pid = torch.arange(len(all_doclens)).repeat_interleave(torch.tensor(all_doclens, dtype=torch.long))
+    print_message("len(emb2pid) =", len(emb2pid))
+
+    num_partitions = orig_ivf_lengths.size(0)
+    centroids = torch.arange(num_partitions).repeat_interleave(orig_ivf_lengths.long())
+
+    ivf, ivf_lengths = unique_postings(centroids, emb2pid[orig_ivf.long()], num_partitions)
+
+    optimized_ivf_path = save_ivf(index_path, ivf, ivf_lengths, compress=compress)
+    print_message(f"#> Saved optimized IVF to {optimized_ivf_path}")
+
+    original_ivf_path = os.path.join(index_path, 'ivf.pt')
+    if os.path.exists(original_ivf_path):
+        print_message(f"#> Original IVF at path \"{original_ivf_path}\" can now be removed")
+
+    return ivf, ivf_lengths
 
-    emb2pid = torch.zeros(total_num_embeddings, dtype=torch.int)
 
+def unique_postings(centroids, pids, num_partitions):
     """
-    EVENTUALLY: Use two tensors. emb2pid_offsets will have every 256th element.
-    emb2pid_delta will have the delta from the corresponding offset,
+        Returns the sorted, unique pids of each centroid (packed) and the number of them, for the postings
+        (`centroids[i]`, `pids[i]`). Each pair becomes one key, so a single sort de-duplicates and orders them all.
     """
+    num_pids = pids.max().item() + 1
+    keys = torch.unique(centroids.long() * num_pids + pids.long())
 
-    offset_doclens = 0
-    for pid, dlength in enumerate(all_doclens):
-        emb2pid[offset_doclens: offset_doclens + dlength] = pid
-        offset_doclens += dlength
+    ivf_lengths = torch.bincount(keys // num_pids, minlength=num_partitions)
 
-    print_message("len(emb2pid) =", len(emb2pid))
+    return (keys % num_pids).to(torch.int32), ivf_lengths
 
-    ivf = emb2pid[orig_ivf]
-    unique_pids_per_centroid = []
-    ivf_lengths = []
 
-    offset = 0
-    for length in tqdm.tqdm(orig_ivf_lengths.tolist()):
-        pids = torch.unique(ivf[offset:offset+length])
-        unique_pids_per_centroid.append(pids)
-        ivf_lengths.append(pids.shape[0])
-        offset += length
-    ivf = torch.cat(unique_pids_per_centroid)
-    ivf_lengths = torch.tensor(ivf_lengths)
+def save_ivf(index_path, ivf, ivf_lengths, compress=False):
+    """
+        Saves the IVF of pids either as is, to `ivf.pid.pt`, or delta + varint encoded, to `ivf.pid.varint.pt`.
+        Removes the other file if it exists. Returns the path of the saved IVF.
+    """
+    pid_ivf_path = os.path.join(index_path, 'ivf.pid.pt')
+    varint_ivf_path = os.path.join(index_path, 'ivf.pid.varint.pt')
 
-    original_ivf_path = os.path.join(index_path, 'ivf.pt')
-    optimized_ivf_path = os.path.join(index_path, 'ivf.pid.pt')
-    torch.save((ivf, ivf_lengths), optimized_ivf_path)
-    print_message(f"#> Saved optimized IVF to {optimized_ivf_path}")
-    if os.path.exists(original_ivf_path):
-        print_message(f"#> Original IVF at path \"{original_ivf_path}\" can now be removed")
+    if compress:
+        torch.save((*encode_delta_varint(ivf, ivf_lengths), ivf_lengths), varint_ivf_path)
+        path, stale_path = varint_ivf_path, pid_ivf_path
+    else:
+        torch.save((ivf, ivf_lengths), pid_ivf_path)
+        path, stale_path = pid_ivf_path, varint_ivf_path
 
-    return ivf, ivf_lengths
+    if os.path.exists(stale_path):
+        os.remove(stale_path)
+
+    return path
+
+
+def load_ivf(index_path):
+    """
+        Loads the IVF of pids saved by `save_ivf`, decoded. Returns it, its lengths and whether it was compressed.
+    """
+    varint_ivf_path = os.path.join(index_path, 'ivf.pid.varint.pt')
+
+    if os.path.exists(varint_ivf_path):
+        encoded, _, ivf_lengths = torch.load(varint_ivf_path, map_location='cpu')
+        return decode_delta_varint(encoded, ivf_lengths), ivf_lengths, True
+
+    ivf, ivf_lengths = torch.load(os.path.join(index_path, 'ivf.pid.pt'), map_location='cpu')
+    return ivf, ivf_lengths, False
+
+
+def save_mmap_index(index_path):
+    """
+        Writes the codes, residuals, doclens and IVF of an existing index as flat little-endian arrays
+        that `IndexLoader` memory-maps instead of loading into RAM, and marks the index as such.
+    """
+    metadata_path = os.path.join(index_path, 'metadata.json')
+    with open(metadata_path) as f:
+        metadata = ujson.load(f)
+
+    print_message(f"#> Saving the memory-mapped index to {index_path}..")
+
+    ResidualEmbeddings.save_chunks_as_mmap(index_path, range(metadata['num_chunks']))
+    save_mmap_doclens_and_ivf(index_path)
+
+    # Searchers may be loading the metadata, so the file is replaced once complete.
+    metadata['config']['index_format'] = 'mmap'
+    with open(metadata_path + '.tmp', 'w') as f:
+        f.write(ujson.dumps(metadata, indent=4) + '\n')
+
+    os.replace(metadata_path + '.tmp', metadata_path)
+
+
+def save_mmap_doclens_and_ivf(index_path):
+    """
+        Writes the doclens and the IVF of the index as the flat arrays of its memory-mapped format.
+    """
+    with open_flat_file(os.path.join(index_path, 'doclens.bin')) as f:
+        save_flat_tensor(f, torch.tensor(load_doclens(index_path, flatten=True), dtype=torch.int64))
+
+    ivf, ivf_lengths, _ = load_ivf(index_path)
 
+    # Pad the IVF in advance so that StridedTensor never has to copy it to add the padding itself.
+    with open_flat_file(os.path.join(index_path, 'ivf.pid.bin')) as f:
+        save_flat_tensor(f, ivf.to(torch.int32))
+        save_flat_tensor(f, torch.zeros(ivf_lengths.max().item(), dtype=torch.int32))
 
+    with open_flat_file(os.path.join(index_path, 'ivf.lengths.bin')) as f:
+        save_flat_tensor(f, ivf_lengths.to(torch.int64))
@@ -112,6 +112,10 @@ class QuerySettings:
     attend_to_mask_tokens : bool = DefaultVal(False)
     interaction: str = DefaultVal('colbert')
 
+    # Encode queries on CPU with int8 Linear layers, unless their embeddings differ too much from the fp32 ones
+    quantize_query_encoder: bool = DefaultVal(False)
+    quantization_min_similarity: float = DefaultVal(0.95)
+
 
 @dataclass
 class TrainingSettings:
@@ -119,6 +123,9 @@ class TrainingSettings:
 
     bsize: int = DefaultVal(32)
 
+    # Token budget of the batches of queries and passages to encode (padded, at most bsize of them); None = bsize only
+    max_batch_tokens: int = DefaultVal(None)
+
     accumsteps: int = DefaultVal(1)
 
     lr: float = DefaultVal(3e-06)
@@ -149,6 +156,11 @@ class TrainingSettings:
 
     shuffle_every_epoch: bool = DefaultVal(False)
 
+    # Tokenize the training queries and passages once, into memory-mapped token ids cached under this directory
+    tokens_cache_dir: str = DefaultVal(None)
+    # Number of batches read and collated ahead by a background thread during training (0 = inline, as before)
+    prefetch_batches: int = DefaultVal(0)
+
     save_steps: int = DefaultVal(2000)
     save_epochs: int = DefaultVal(-1)
     epochs: int = DefaultVal(10)
@@ -181,7 +193,22 @@ class IndexingSettings:
 
     kmeans_niters: int = DefaultVal(20)
 
+    kmeans_mode: str = DefaultVal('faiss')  # 'faiss' (sample in memory) or 'streaming' (mini-batches read from disk)
+
+    kmeans_memory_budget_mb: int = DefaultVal(1024)  # streaming k-means: memory for the sample chunks read at once
+
+    kmeans_sample_factor: float = DefaultVal(16.0)  # sample factor * sqrt(120 * #passages) passages for k-means
+
     num_partitions_max: int = DefaultVal(10000000)
+
+    index_format: str = DefaultVal('torch')  # 'torch' or 'mmap' (flat arrays that searchers memory-map)
+
+    index_tokenizer_threads: int = DefaultVal(2)  # tokenize chunks ahead of the encoder; 0 tokenizes inline
+
+    centroid_assignment: str = DefaultVal('tiled')  # 'tiled' (blocks of centroids) or 'faiss' (exact search, on CPU)
+
+    compress_ivf: bool = DefaultVal(False)  # store the posting lists delta + varint encoded, decoded on lookup
+
     @property
     def index_path_(self):
         return self.index_path or os.path.join(self.index_root_, self.index_name)
@@ -9,6 +9,19 @@ from primeqa.ir.dense.colbert_top.colbert.modeling.colbert import ColBERT
 from primeqa.ir.dense.colbert_top.colbert.utils.utils import torch_load_dnn
 from primeqa.ir.dense.colbert_top.colbert.modeling.factory import get_query_tokenizer, get_doc_tokenizer
 from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
+from primeqa.util.transformers_utils.quantization import quantize_dynamic_int8, output_similarity
+
+# Queries on which the int8 query encoder is checked against the fp32 one, unless others are given
+QUANTIZATION_CHECK_QUERIES = [
+    "who wrote the declaration of independence",
+    "what is the boiling point of water at high altitude",
+    "how many moons does jupiter have",
+    "when did the first world war end",
+    "symptoms of vitamin d deficiency in adults",
+    "what does a data scientist do",
+    "where is the largest coral reef in the world",
+    "why is the sky blue",
+]
 
 class Checkpoint(ColBERT):
     """
@@ -36,6 +49,55 @@ class Checkpoint(ColBERT):
 
         self.docFromText_used = False
 
+        # Kept out of the registered submodules, so that .cuda() and state_dict() leave it alone
+        object.__setattr__(self, '_quantized_query_encoder', None)
+        if self.colbert_config.quantize_query_encoder:
+            self.quantize_query_encoder()
+
+    @property
+    def query_encoder(self):
+        if self._quantized_query_encoder is not None and self.device.type == 'cpu':
+            return self._quantized_query_encoder
+
+        return self.model
+
+    def quantize_query_encoder(self, calibration_queries=None, min_similarity=None):
+        """
+            Encodes queries on CPU with int8 Linear layers (dynamic quantization), if the embeddings of
+            calibration_queries stay on average within min_similarity (cosine) of the fp32 ones.
+            Documents are always encoded in fp32. Returns the mean cosine similarity.
+        """
+        assert self.device.type == 'cpu', "Quantize the query encoder before moving the checkpoint to GPU"
+
+        calibration_queries = calibration_queries or QUANTIZATION_CHECK_QUERIES
+        min_similarity = self.colbert_config.quantization_min_similarity if min_similarity is None else min_similarity
+
+        object.__setattr__(self, '_quantized_query_encoder', None)
+        input_ids, attention_mask = self.query_tokenizer.tensorize(calibration_queries)
+        Q = self.query(input_ids, attention_mask)
+        similarities = []
+
+        def accuracy_check(model, quantized):
+            object.__setattr__(self, '_quantized_query_encoder', quantized)
+            try:
+                similarities.append(output_similarity(Q, self.query(input_ids, attention_mask)))
+            finally:
+                object.__setattr__(self, '_quantized_query_encoder', None)
+
+            return similarities[-1]
+
+        quantized = quantize_dynamic_int8(self.model, accuracy_check=accuracy_check, min_score=min_similarity)
+
+        if quantized is not self.model:
+            object.__setattr__(self, '_quantized_query_encoder', quantized)
+            print_message(f"#> Encoding queries with int8 Linear layers on CPU, mean cosine similarity "
+                          f"to fp32 query embeddings: {similarities[-1]:.4f}")
+        else:
+            print_message(f"#> Encoding queries in fp32, mean cosine similarity of int8 query embeddings "
+                          f"{similarities[-1]:.4f} < {min_similarity}")
+
+        return similarities[-1]
+
     def query(self, *args, to_cpu=False, **kw_args):
         with torch.no_grad():
             with self.amp_manager.context():
@@ -54,7 +116,8 @@ class Checkpoint(ColBERT):
 
     def queryFromText(self, queries, bsize=None, to_cpu=False, context=None):
         if bsize:
-            batches = self.query_tokenizer.tensorize(queries, context=context, bsize=bsize)
+            batches = self.query_tokenizer.tensorize(queries, context=context, bsize=bsize,
+                                                     max_batch_tokens=self.colbert_config.max_batch_tokens)
             batches = [self.query(input_ids, attention_mask, to_cpu=to_cpu) for input_ids, attention_mask in batches]
             return torch.cat(batches)
 
@@ -68,49 +131,62 @@ class Checkpoint(ColBERT):
             print_message(f"#> checkpoint, docFromText, Input: {docs[0]}, \t\t {bsize}")
 
         if bsize:
-            text_batches, reverse_indices = self.doc_tokenizer.tensorize(docs, bsize=bsize)
+            text_batches, reverse_indices = self.doc_tokenizer.tensorize(
+                docs, bsize=bsize, max_batch_tokens=self.colbert_config.max_batch_tokens)
 
             if not self.docFromText_used:
                 print_message(f"#> checkpoint, docFromText, Output IDs: {text_batches[0]}")
                 self.docFromText_used = True
 
-            returned_text = []
-            if return_tokens:
-                returned_text = [text for batch in text_batches for text in batch[0]]
-                returned_text = [returned_text[idx] for idx in reverse_indices.tolist()]
-                returned_text = [returned_text]
+            return self.docFromTensorized(text_batches, reverse_indices, keep_dims=keep_dims, to_cpu=to_cpu,
+                                          showprogress=showprogress, return_tokens=return_tokens)
+
+        input_ids, attention_mask = self.doc_tokenizer.tensorize(docs)
+        return self.doc(input_ids, attention_mask, keep_dims=keep_dims, to_cpu=to_cpu)
+
+    def docFromTensorized(self, text_batches, reverse_indices, keep_dims=True, to_cpu=False, showprogress=False,
+                          return_tokens=False):
+        """
+            Encodes the output of `doc_tokenizer.tensorize(docs, bsize=bsize)`, so that tokenization can happen
+            elsewhere (e.g., ahead of time, in other threads). Returns the same as `docFromText`.
+        """
+        assert keep_dims in [True, False, 'flatten']
 
-            keep_dims_ = 'return_mask' if keep_dims == 'flatten' else keep_dims
-            batches = [self.doc(input_ids, attention_mask, keep_dims=keep_dims_, to_cpu=to_cpu)
-                       for input_ids, attention_mask in tqdm(text_batches, disable=not showprogress)]
+        returned_text = []
+        if return_tokens:
+            returned_text = [text for batch in text_batches for text in batch[0]]
+            returned_text = [returned_text[idx] for idx in reverse_indices.tolist()]
+            returned_text = [returned_text]
 
-            if keep_dims is True:
-                D = _stack_3D_tensors(batches)
-                return (D[reverse_indices], *returned_text)
+        keep_dims_ = 'return_mask' if keep_dims == 'flatten' else keep_dims
+        batches = [self.doc(input_ids, attention_mask, keep_dims=keep_dims_, to_cpu=to_cpu)
+                   for input_ids, attention_mask in tqdm(text_batches, disable=not showprogress)]
 
-            elif keep_dims == 'flatten':
-                D, mask = [], []
+        if keep_dims is True:
+            D = _stack_3D_tensors(batches)
+            return (D[reverse_indices], *returned_text)
 
-                for D_, mask_ in batches:
-                    D.append(D_)
-                    mask.append(mask_)
+        elif keep_dims == 'flatten':
+            D, mask = [], []
 
-                D, mask = torch.cat(D)[reverse_indices], torch.cat(mask)[reverse_indices]
+            for D_, mask_ in batches:
+                D.append(D_)
+                mask.append(mask_)
 
-                doclens = mask.squeeze(-1).sum(-1).tolist()
+            # Batches are padded to different lengths
+            D, mask = _stack_3D_tensors(D)[reverse_indices], _stack_3D_tensors(mask)[reverse_indices]
 
-                D = D.view(-1, self.colbert_config.dim)
-                D = D[mask.bool().flatten()].cpu()
+            doclens = mask.squeeze(-1).sum(-1).tolist()
 
-                return (D, doclens, *returned_text)
+            D = D.view(-1, self.colbert_config.dim)
+            D = D[mask.bool().flatten()].cpu()
 
-            assert keep_dims is False
+            return (D, doclens, *returned_text)
 
-            D = [d for batch in batches for d in batch]
-            return ([D[idx] for idx in reverse_indices.tolist()], *returned_text)
+        assert keep_dims is False
 
-        input_ids, attention_mask = self.doc_tokenizer.tensorize(docs)
-        return self.doc(input_ids, attention_mask, keep_dims=keep_dims, to_cpu=to_cpu)
+        D = [d for batch in batches for d in batch]
+        return ([D[idx] for idx in reverse_indices.tolist()], *returned_text)
 
     def lazy_rank(self, queries, docs):
         Q = self.queryFromText(queries, bsize=128, to_cpu=True)
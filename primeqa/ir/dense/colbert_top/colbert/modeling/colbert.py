@@ -1,6 +1,7 @@
 from primeqa.ir.dense.colbert_top.colbert.infra.config.config import ColBERTConfig
 from primeqa.ir.dense.colbert_top.colbert.search.strided_tensor import StridedTensor
-from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message, flatten, print_torch_extension_error_message
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message, flatten
+from primeqa.ir.dense.colbert_top.colbert.utils.cpp_extensions import load_extension
 from primeqa.ir.dense.colbert_top.colbert.modeling.base_colbert import BaseColBERT
 from primeqa.ir.dense.colbert_top.colbert.parameters import DEVICE
 
@@ -10,11 +11,6 @@ import string
 import random
 import numpy as np
 
-import os
-import pathlib
-from torch.utils.cpp_extension import load
-import sys
-
 class ColBERT(BaseColBERT):
     """
         This class handles the basic encoding and scoring operations in ColBERT. It is used for training.
@@ -29,10 +25,18 @@ class ColBERT(BaseColBERT):
 
         ColBERT.try_load_torch_extensions(self.use_gpu)
 
+        self.skiplist = {}
         if self.colbert_config.mask_punctuation:
             self.skiplist = {w: True
                              for symbol in string.punctuation
                              for w in [symbol, self.raw_tokenizer.encode(symbol, add_special_tokens=False)[0]]}
+
+        # Boolean lookup tables over the vocabulary (True = keep the token), so that masking is a single
+        # on-device gather instead of a Python loop over every token.
+        self.vocab_size = max(len(self.raw_tokenizer), self.bert.config.vocab_size)
+        self.register_buffer('query_mask_lookup', self.skiplist_lookup([]), persistent=False)
+        self.register_buffer('doc_mask_lookup', self.skiplist_lookup(self.skiplist), persistent=False)
+
         self.query_used = False
         self.doc_used = False
 
@@ -41,27 +45,7 @@ class ColBERT(BaseColBERT):
         if hasattr(cls, "loaded_extensions") or use_gpu:
             return
 
-        verbose=os.getenv("COLBERT_LOAD_TORCH_EXTENSION_VERBOSE", "False") == "True"
-
-        print_message(f"Loading segmented_maxsim_cpp extension (set COLBERT_LOAD_TORCH_EXTENSION_VERBOSE=True for more info)...")
-        try:
-            segmented_maxsim_cpp = load(
-                name="segmented_maxsim_cpp",
-                sources=[
-                    os.path.join(
-                        pathlib.Path(__file__).parent.resolve(), "segmented_maxsim.cpp"
-                    ),
-                ],
-                extra_cflags=["-O3"],
-                verbose=verbose,
-            )
-        except (RuntimeError, KeyboardInterrupt) as e:
-            if not verbose:
-                import traceback
-                traceback.print_exc()
-            print_torch_extension_error_message()
-            sys.exit(1)
-        cls.segmented_maxsim = segmented_maxsim_cpp.segmented_maxsim_cpp
+        cls.segmented_maxsim = load_extension('segmented_maxsim') or segmented_maxsim
 
         cls.loaded_extensions = True
 
@@ -106,6 +90,10 @@ class ColBERT(BaseColBERT):
 
         return torch.nn.CrossEntropyLoss()(scores, labels)
 
+    @property
+    def query_encoder(self):
+        return self.model
+
     def query(self, input_ids, attention_mask):
         input_ids, attention_mask = input_ids.to(self.device), attention_mask.to(self.device)
         # print query input_ids
@@ -114,7 +102,8 @@ class ColBERT(BaseColBERT):
             print_message("#>>>> colbert query ==")
             print_message(f"#>>>>> input_ids: {input_ids[0].size()}, {input_ids[0]}")
 
-        Q = self.bert(input_ids, attention_mask=attention_mask)[0]
+        encoder = self.query_encoder
+        Q = encoder.bert(input_ids, attention_mask=attention_mask)[0]
 
         # print out Q
         if not self.query_used:
@@ -122,7 +111,7 @@ class ColBERT(BaseColBERT):
             print_message(f"#>>>>> Q: {Q[0].size()}, {Q[0]}")
             print_message(f"#>>>>> self.linear query : {self.linear.weight}")
 
-        Q = self.linear(Q)
+        Q = encoder.linear(Q)
 
         if not self.query_used:
             self.query_used = True
@@ -131,7 +120,7 @@ class ColBERT(BaseColBERT):
             print_message(f"#>>>>> Q: {Q[0].size()}, {Q[0]}")
 
 
-        mask = torch.tensor(self.mask(input_ids, skiplist=[]), device=self.device).unsqueeze(2).float()
+        mask = self.mask(input_ids, skiplist=self.query_mask_lookup).unsqueeze(2).float()
         Q = Q * mask
 
         return torch.nn.functional.normalize(Q, p=2, dim=2)
@@ -164,7 +153,7 @@ class ColBERT(BaseColBERT):
             print_message(f"#>>>>> D: {D[0].size()}, {D[0]}")
 
 
-        mask = torch.tensor(self.mask(input_ids, skiplist=self.skiplist), device=self.device).unsqueeze(2).float()
+        mask = self.mask(input_ids, skiplist=self.doc_mask_lookup).unsqueeze(2).float()
         D = D * mask
 
         D = torch.nn.functional.normalize(D, p=2, dim=2)
@@ -191,8 +180,21 @@ class ColBERT(BaseColBERT):
         return colbert_score(Q, D_padded, D_mask, config=self.colbert_config)
 
     def mask(self, input_ids, skiplist):
-        mask = [[(x not in skiplist) and (x != 0) for x in d] for d in input_ids.cpu().tolist()]
-        return mask
+        """
+            Supply `skiplist` either as a lookup table from `skiplist_lookup` or as a collection of token ids.
+            Returns a boolean mask, on the device of `input_ids`, that is False for skipped and padding tokens.
+        """
+        if not torch.is_tensor(skiplist):
+            skiplist = self.skiplist_lookup(skiplist)
+
+        return skiplist.to(input_ids.device)[input_ids]
+
+    def skiplist_lookup(self, skiplist):
+        lookup = torch.ones(self.vocab_size, dtype=torch.bool)
+        lookup[[x for x in skiplist if isinstance(x, int)]] = False
+        lookup[0] = False
+
+        return lookup
 
 
 # TODO: In Query/DocTokenizer, use colbert.raw_tokenizer
@@ -223,6 +225,29 @@ def colbert_score_reduce(scores_padded, D_mask, config: ColBERTConfig):
     return scores.sum(-1)
 
 
+def segmented_maxsim(scores, lengths):
+    """
+        PyTorch implementation of the segmented_maxsim extension: the sum over the query vectors (columns) of the
+        max score of each document, i.e., of the segments of rows of `scores` with `lengths`. Maxima start at 0.
+    """
+    if lengths.numel() == 0:
+        return scores.new_zeros(0)
+
+    # With the documents sorted by decreasing length, those with a vector at each position are a prefix.
+    sorted_lengths, order = lengths.sort(descending=True)
+    starts = (torch.cumsum(lengths, dim=0) - lengths)[order]
+    num_docs_with_position = torch.bincount(sorted_lengths).flip(0).cumsum(0).flip(0)[1:].tolist()
+
+    max_scores = scores.new_zeros(lengths.size(0), scores.size(1))
+    for position, num_docs in enumerate(num_docs_with_position):
+        torch.maximum(max_scores[:num_docs], scores[starts[:num_docs] + position], out=max_scores[:num_docs])
+
+    output = torch.empty_like(max_scores[:, 0])
+    output[order] = max_scores.sum(1)
+
+    return output
+
+
 # TODO: Wherever this is called, pass `config=`
 def colbert_score(Q, D_padded, D_mask, config=ColBERTConfig()):
     """
@@ -3,7 +3,7 @@ import torch
 
 from primeqa.ir.dense.colbert_top.colbert.modeling.hf_colbert import HF_ColBERT
 from primeqa.ir.dense.colbert_top.colbert.infra import ColBERTConfig
-from primeqa.ir.dense.colbert_top.colbert.modeling.tokenization.utils import _split_into_batches, _sort_by_length
+from primeqa.ir.dense.colbert_top.colbert.modeling.tokenization.utils import _sort_by_length, _split_into_length_bucketed_batches
 from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
 
 class DocTokenizer():
@@ -52,7 +52,7 @@ class DocTokenizer():
 
         return ids
 
-    def tensorize(self, batch_text, bsize=None):
+    def tensorize(self, batch_text, bsize=None, max_batch_tokens=None):
         assert type(batch_text) in [list, tuple], (type(batch_text))
 
         # add placehold for the [D] marker
@@ -74,8 +74,8 @@ class DocTokenizer():
             print_message(f"#> Output Mask: {mask[0].size()}, {mask[0]}")
 
         if bsize:
-            ids, mask, reverse_indices = _sort_by_length(ids, mask, bsize)
-            batches = _split_into_batches(ids, mask, bsize)
+            ids, mask, reverse_indices = _sort_by_length(ids, mask, bsize, max_batch_tokens)
+            batches = _split_into_length_bucketed_batches(ids, mask, bsize, max_batch_tokens)
             return batches, reverse_indices
 
         return ids, mask
@@ -2,7 +2,7 @@ import torch
 
 from transformers import XLMRobertaTokenizer # there's no Fast version
 from primeqa.ir.dense.colbert_top.colbert.modeling.hf_colbert_xlmr import HF_ColBERT_XLMR
-from primeqa.ir.dense.colbert_top.colbert.modeling.tokenization.utils import _split_into_batches, _sort_by_length
+from primeqa.ir.dense.colbert_top.colbert.modeling.tokenization.utils import _sort_by_length, _split_into_length_bucketed_batches
 from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
 
 class DocTokenizerXLMR():
@@ -23,7 +23,7 @@ class DocTokenizerXLMR():
     def encode(self, batch_text, add_special_tokens=False):
         raise NotImplementedError()
 
-    def tensorize(self, batch_text, bsize=None):
+    def tensorize(self, batch_text, bsize=None, max_batch_tokens=None):
         assert type(batch_text) in [list, tuple], (type(batch_text))
 
         # add placehold for the [D] marker
@@ -52,8 +52,8 @@ class DocTokenizerXLMR():
             # print()
 
         if bsize:
-            ids, mask, reverse_indices = _sort_by_length(ids, mask, bsize)
-            batches = _split_into_batches(ids, mask, bsize)
+            ids, mask, reverse_indices = _sort_by_length(ids, mask, bsize, max_batch_tokens)
+            batches = _split_into_length_bucketed_batches(ids, mask, bsize, max_batch_tokens)
             return batches, reverse_indices
 
         return ids, mask
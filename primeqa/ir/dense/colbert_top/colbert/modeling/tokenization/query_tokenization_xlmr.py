@@ -2,7 +2,7 @@ import torch
 
 from primeqa.ir.dense.colbert_top.colbert.modeling.hf_colbert_xlmr import HF_ColBERT_XLMR
 from transformers import XLMRobertaTokenizer # there's no Fast version
-from primeqa.ir.dense.colbert_top.colbert.modeling.tokenization.utils import _split_into_batches
+from primeqa.ir.dense.colbert_top.colbert.modeling.tokenization.utils import _split_into_batches, _bsize_for_token_budget
 from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
 
 # only the following official escape sequences are available
@@ -37,7 +37,7 @@ class QueryTokenizerXLMR():
     def encode(self, batch_text, add_special_tokens=False):
         raise NotImplementedError()
 
-    def tensorize(self, batch_text, bsize=None, context=None):
+    def tensorize(self, batch_text, bsize=None, context=None, max_batch_tokens=None):
         assert type(batch_text) in [list, tuple], (type(batch_text))
 
         # add placehold for the [Q] marker
@@ -69,8 +69,9 @@ class QueryTokenizerXLMR():
             print_message(f"#> Output IDs: {ids[0].size()}, {ids[0]}")
             print_message(f"#> Output Mask: {mask[0].size()}, {mask[0]}")
 
+        # Every query is augmented with [MASK] up to query_maxlen, so batches only differ by their number of queries
         if bsize:
-            batches = _split_into_batches(ids, mask, bsize)
+            batches = _split_into_batches(ids, mask, _bsize_for_token_budget(bsize, ids.size(1), max_batch_tokens))
             return batches
 
         return ids, mask
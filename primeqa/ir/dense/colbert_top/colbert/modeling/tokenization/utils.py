@@ -37,8 +37,8 @@ def tensorize_triples(query_tokenizer, doc_tokenizer, queries, passages, scores,
     return batches
 
 
-def _sort_by_length(ids, mask, bsize):
-    if ids.size(0) <= bsize:
+def _sort_by_length(ids, mask, bsize, max_batch_tokens=None):
+    if ids.size(0) <= bsize and max_batch_tokens is None:
         return ids, mask, torch.arange(ids.size(0))
 
     indices = mask.sum(-1).sort().indices
@@ -55,6 +55,35 @@ def _split_into_batches(ids, mask, bsize):
     return batches
 
 
+def _bsize_for_token_budget(bsize, seqlen, max_batch_tokens=None):
+    if max_batch_tokens is None:
+        return bsize
+
+    return max(1, min(bsize, max_batch_tokens // max(seqlen, 1)))
+
+
+def _split_into_length_bucketed_batches(ids, mask, bsize, max_batch_tokens=None):
+    """
+        Splits right-padded sequences, sorted by length (see `_sort_by_length`), into batches of at most bsize
+        sequences and, if max_batch_tokens is given, of at most max_batch_tokens tokens once padded.
+        Each batch is only padded to the longest sequence in it.
+    """
+    lengths = mask.sum(-1).tolist()
+
+    batches, offset = [], 0
+    while offset < len(lengths):
+        end, maxlen = offset + 1, lengths[offset]
+        while end < len(lengths) and end - offset < _bsize_for_token_budget(bsize, max(maxlen, lengths[end]),
+                                                                            max_batch_tokens):
+            maxlen = max(maxlen, lengths[end])
+            end += 1
+
+        batches.append((ids[offset:end, :maxlen], mask[offset:end, :maxlen]))
+        offset = end
+
+    return batches
+
+
 def _split_into_batches2(scores, bsize):
     batches = []
     for offset in range(0, len(scores), bsize):
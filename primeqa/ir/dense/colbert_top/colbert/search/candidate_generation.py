@@ -10,13 +10,17 @@ class CandidateGeneration:
 
     def get_cells(self, Q, ncells):
         scores = (self.codec.centroids @ Q.T)
+        cells = self.get_cells_from_scores(scores, ncells)
+        return cells, scores
+
+    def get_cells_from_scores(self, scores, ncells):
         if ncells == 1:
             cells = scores.argmax(dim=0, keepdim=True).permute(1, 0)
         else:
             cells = scores.topk(ncells, dim=0, sorted=False).indices.permute(1, 0)  # (32, ncells)
         cells = cells.flatten().contiguous()  # (32 * ncells,)
         cells = cells.unique(sorted=False)
-        return cells, scores
+        return cells
 
     def generate_candidate_eids(self, Q, ncells):
         cells, scores = self.get_cells(Q, ncells)
@@ -30,10 +34,13 @@ class CandidateGeneration:
     def generate_candidate_pids(self, Q, ncells):
         cells, scores = self.get_cells(Q, ncells)
 
+        return self.lookup_cells(cells), scores
+
+    def lookup_cells(self, cells):
         pids, cell_lengths = self.ivf.lookup(cells)
         if self.use_gpu:
             pids = pids.cuda()
-        return pids, scores
+        return pids
 
     def generate_candidate_scores(self, Q, eids):
         E = self.lookup_eids(eids)
@@ -53,6 +60,32 @@ class CandidateGeneration:
 
         pids, centroid_scores = self.generate_candidate_pids(Q, ncells)
 
+        return self.deduplicate_pids(pids), centroid_scores
+
+    def generate_candidates_batch(self, config, Q):
+        """
+            Candidate generation for a batch of queries Q = (num_queries, *, dim).
+
+            All queries are scored against the centroids in a single (batched) matmul. Returns one
+            flat tensor of candidate pids per query along with the (num_queries, num_centroids, *)
+            centroid scores.
+        """
+        ncells = config.ncells
+
+        assert isinstance(self.ivf, StridedTensor)
+        assert Q.dim() == 3
+
+        if self.use_gpu:
+            Q = Q.cuda().half()
+
+        centroid_scores = self.codec.centroids @ Q.permute(0, 2, 1)  # (num_queries, num_centroids, 32)
+
+        all_pids = [self.deduplicate_pids(self.lookup_cells(self.get_cells_from_scores(scores, ncells)))
+                    for scores in centroid_scores]
+
+        return all_pids, centroid_scores
+
+    def deduplicate_pids(self, pids):
         sorter = pids.sort()
         pids = sorter.values
 
@@ -60,4 +93,4 @@ class CandidateGeneration:
         if self.use_gpu:
             pids, pids_counts = pids.cuda(), pids_counts.cuda()
 
-        return pids, centroid_scores
+        return pids
@@ -6,7 +6,8 @@ import numpy as np
 from primeqa.ir.dense.colbert_top.colbert.utils.utils import lengths2offsets, print_message, dotdict, flatten
 from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual import ResidualCodec
 from primeqa.ir.dense.colbert_top.colbert.indexing.utils import optimize_ivf
-from primeqa.ir.dense.colbert_top.colbert.search.strided_tensor import StridedTensor
+from primeqa.ir.dense.colbert_top.colbert.indexing.loaders import load_flat_tensor
+from primeqa.ir.dense.colbert_top.colbert.search.strided_tensor import StridedTensor, DeltaVarintStridedTensor
 
 
 class IndexLoader:
@@ -19,6 +20,7 @@ class IndexLoader:
 
         self._load_doclens()
         self._load_embeddings()
+        self._load_tombstones()
 
     def _load_codec(self):
         print_message(f"#> Loading codec...")
@@ -27,18 +29,31 @@ class IndexLoader:
     def _load_ivf(self):
         print_message(f"#> Loading IVF...")
 
-        if os.path.exists(os.path.join(self.index_path, "ivf.pid.pt")):
+        if self.is_mmap:
+            ivf = load_flat_tensor(os.path.join(self.index_path, "ivf.pid.bin"), torch.int32)
+            ivf_lengths = load_flat_tensor(os.path.join(self.index_path, "ivf.lengths.bin"), torch.int64)
+        elif os.path.exists(os.path.join(self.index_path, "ivf.pid.varint.pt")):
+            encoded, encoded_lengths, ivf_lengths = torch.load(os.path.join(self.index_path, "ivf.pid.varint.pt"),
+                                                               map_location='cpu')
+            self.ivf = DeltaVarintStridedTensor(encoded, encoded_lengths, ivf_lengths, use_gpu=self.use_gpu)
+            return
+        elif os.path.exists(os.path.join(self.index_path, "ivf.pid.pt")):
             ivf, ivf_lengths = torch.load(os.path.join(self.index_path, "ivf.pid.pt"), map_location='cpu')
         else:
             assert os.path.exists(os.path.join(self.index_path, "ivf.pt")), f"ivf.pt not found in {self.index_path}"
             ivf, ivf_lengths = torch.load(os.path.join(self.index_path, "ivf.pt"), map_location='cpu')
-            ivf, ivf_lengths = optimize_ivf(ivf, ivf_lengths, self.index_path)
+            ivf, ivf_lengths = optimize_ivf(ivf, ivf_lengths, self.index_path,
+                                            compress=self.metadata['config'].get('compress_ivf', False))
 
         ivf = StridedTensor(ivf, ivf_lengths, use_gpu=self.use_gpu)
 
         self.ivf = ivf
 
     def _load_doclens(self):
+        if self.is_mmap:
+            self.doclens = load_flat_tensor(os.path.join(self.index_path, 'doclens.bin'), torch.int64)
+            return
+
         doclens = []
 
         for chunk_idx in range(self.num_chunks):
@@ -49,9 +64,26 @@ class IndexLoader:
         self.doclens = torch.tensor(doclens)
 
     def _load_embeddings(self):
+        if self.is_mmap:
+            self.embeddings = ResidualCodec.Embeddings.load_mmap(self.index_path, self.num_embeddings)
+            return
+
         self.embeddings = ResidualCodec.Embeddings.load_chunks(self.index_path, range(self.num_chunks),
                                                                self.num_embeddings)
 
+    def _load_tombstones(self):
+        tombstones_path = os.path.join(self.index_path, 'tombstones.pt')
+        self.tombstones = None
+
+        if os.path.exists(tombstones_path):
+            # Passages added after the tombstones were saved are not deleted
+            tombstones = torch.load(tombstones_path, map_location='cpu')
+            self.tombstones = torch.zeros(len(self.doclens), dtype=torch.bool)
+            self.tombstones[:tombstones.size(0)] = tombstones
+
+            if self.use_gpu:
+                self.tombstones = self.tombstones.cuda()
+
     @property
     def metadata(self):
         try:
@@ -66,6 +98,10 @@ class IndexLoader:
     def config(self):
         raise NotImplementedError()  # load from dict at metadata['config']
 
+    @property
+    def is_mmap(self):
+        return self.metadata['config'].get('index_format', 'torch') == 'mmap'
+
     @property
     def num_chunks(self):
         # EVENTUALLY: If num_chunks doesn't exist (i.e., old index), fall back to counting doclens.*.json files.
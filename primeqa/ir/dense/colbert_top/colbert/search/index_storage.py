@@ -1,12 +1,13 @@
 import torch
 
-from primeqa.ir.dense.colbert_top.colbert.utils.utils import flatten, print_message, print_torch_extension_error_message
+from primeqa.ir.dense.colbert_top.colbert.utils.cpp_extensions import load_extension
 
 
 from primeqa.ir.dense.colbert_top.colbert.indexing.loaders import load_doclens
 from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual_embeddings_strided import ResidualEmbeddingsStrided
+from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual import decompress_residuals as decompress_codes
 
-from primeqa.ir.dense.colbert_top.colbert.search.strided_tensor import StridedTensor
+from primeqa.ir.dense.colbert_top.colbert.search.strided_tensor import StridedTensor, segmented_index
 from primeqa.ir.dense.colbert_top.colbert.search.candidate_generation import CandidateGeneration
 
 from .index_loader import IndexLoader
@@ -14,10 +15,9 @@ from primeqa.ir.dense.colbert_top.colbert.modeling.colbert import colbert_score,
 
 from math import ceil
 
-import os
-import pathlib
-from torch.utils.cpp_extension import load
-import sys
+# Upper bound on the (num_queries, num_centroids, query_maxlen) centroid scores held at once by `rank_batch`
+MAX_CENTROID_SCORES_BYTES = 1 << 28
+
 
 class IndexScorer(IndexLoader, CandidateGeneration):
     def __init__(self, index_path, use_gpu):
@@ -32,47 +32,8 @@ class IndexScorer(IndexLoader, CandidateGeneration):
         if hasattr(cls, "loaded_extensions") or use_gpu:
             return
 
-        verbose=os.getenv("COLBERT_LOAD_TORCH_EXTENSION_VERBOSE", "False") == "True"
-
-        print_message(f"Loading filter_pids_cpp extension (set COLBERT_LOAD_TORCH_EXTENSION_VERBOSE=True for more info)...")
-        try:
-            filter_pids_cpp = load(
-                name="filter_pids_cpp",
-                sources=[
-                    os.path.join(
-                        pathlib.Path(__file__).parent.resolve(), "filter_pids.cpp"
-                    ),
-                ],
-                extra_cflags=["-O3"],
-                verbose=verbose,
-            )
-        except (RuntimeError, KeyboardInterrupt) as e:
-            if not verbose:
-                import traceback
-                traceback.print_exc()
-            print_torch_extension_error_message()
-            sys.exit(1)
-        cls.filter_pids = filter_pids_cpp.filter_pids_cpp
-
-        print_message(f"Loading decompress_residuals_cpp extension (set COLBERT_LOAD_TORCH_EXTENSION_VERBOSE=True for more info)...")
-        try:
-            decompress_residuals_cpp = load(
-                name="decompress_residuals_cpp",
-                sources=[
-                    os.path.join(
-                        pathlib.Path(__file__).parent.resolve(), "decompress_residuals.cpp"
-                    ),
-                ],
-                extra_cflags=["-O3"],
-                verbose=verbose,
-            )
-        except (RuntimeError, KeyboardInterrupt) as e:
-            if not verbose:
-                import traceback
-                traceback.print_exc()
-            print_torch_extension_error_message()
-            sys.exit(1)
-        cls.decompress_residuals = decompress_residuals_cpp.decompress_residuals_cpp
+        cls.filter_pids = load_extension('filter_pids') or filter_pids
+        cls.decompress_residuals = load_extension('decompress_residuals') or decompress_residuals
 
         cls.loaded_extensions = True
 
@@ -103,6 +64,40 @@ class IndexScorer(IndexLoader, CandidateGeneration):
 
             return pids, scores
 
+    def retrieve_batch(self, config, Q):
+        Q = Q[:, :config.query_maxlen]   # NOTE: Candidate generation uses only the query tokens
+        all_pids, centroid_scores = self.generate_candidates_batch(config, Q)
+
+        return all_pids, centroid_scores
+
+    def rank_batch(self, config, Q, k):
+        """
+            Batched version of `rank` for Q = (num_queries, *, dim).
+
+            Queries are ranked in blocks whose centroid scores fit in `MAX_CENTROID_SCORES_BYTES`. Within a
+            block, centroid scoring happens in one matmul for all queries and each candidate passage that
+            survives filtering is decompressed only once, even when it is shared across queries.
+            Returns a list with one (pids, scores) pair per query, in the same order as Q.
+        """
+        query_scores_bytes = self.codec.centroids.size(0) * min(Q.size(1), config.query_maxlen) * \
+            self.codec.centroids.element_size()
+        query_bsize = max(1, MAX_CENTROID_SCORES_BYTES // query_scores_bytes)
+
+        rankings = []
+
+        with torch.inference_mode():
+            for offset in range(0, Q.size(0), query_bsize):
+                Q_ = Q[offset:offset+query_bsize]
+                all_pids, centroid_scores = self.retrieve_batch(config, Q_)
+                all_scores, all_pids = self.score_pids_batch(config, Q_, all_pids, centroid_scores)
+                del centroid_scores
+
+                for scores, pids in zip(all_scores, all_pids):
+                    scores_sorter = scores.sort(descending=True)
+                    rankings.append((pids[scores_sorter.indices].tolist(), scores_sorter.values.tolist()))
+
+        return rankings
+
     def score_pids(self, config, Q, pids, centroid_scores):
         """
             Always supply a flat list or tensor for `pids`.
@@ -112,9 +107,55 @@ class IndexScorer(IndexLoader, CandidateGeneration):
             Otherwise, each query matrix will be compared against the *aligned* passage.
         """
 
+        pids = self.filter_candidate_pids(config, pids, centroid_scores)
+
+        # Rank final list of docs using full approximate embeddings (including residuals)
+        D_packed, D_mask = self.decompress_pids(pids)
+
+        if Q.size(0) == 1:
+            return colbert_score_packed(Q, D_packed, D_mask, config), pids
+
+        D_strided = StridedTensor(D_packed, D_mask, use_gpu=self.use_gpu)
+        D_padded, D_lengths = D_strided.as_padded_tensor()
+
+        return colbert_score(Q, D_padded, D_lengths, config), pids
+
+    def score_pids_batch(self, config, Q, all_pids, centroid_scores):
+        """
+            Supply one flat tensor of candidate pids per query in `all_pids`, along with the
+            (num_queries, num_centroids, *) `centroid_scores` from `retrieve_batch`.
+
+            Candidates are filtered per query, then the union of the surviving pids is decompressed
+            once and each query is scored against its own passages, gathered in packed form.
+        """
+
+        all_pids = [self.filter_candidate_pids(config, pids, centroid_scores_)
+                    for pids, centroid_scores_ in zip(all_pids, centroid_scores)]
+
+        pids_lengths = [len(pids) for pids in all_pids]
+        unique_pids, inverse = torch.unique(torch.cat(all_pids), return_inverse=True)
+
+        # Rank final lists of docs using full approximate embeddings (including residuals)
+        D_packed, D_lengths = self.decompress_pids(unique_pids)
+        D_lengths = D_lengths.to(D_packed.device)
+        D_offsets = torch.cumsum(D_lengths, dim=0) - D_lengths
+
+        all_scores = []
+
+        for query_idx, positions in enumerate(torch.split(inverse.to(D_packed.device), pids_lengths)):
+            Q_ = Q[query_idx:query_idx+1]
+            D_packed_ = D_packed[segmented_index(D_lengths[positions], D_offsets[positions])]
+            all_scores.append(colbert_score_packed(Q_, D_packed_, D_lengths[positions], config))
+
+        return all_scores, all_pids
+
+    def filter_candidate_pids(self, config, pids, centroid_scores):
         # TODO: Remove batching?
         batch_size = 2 ** 20
 
+        if self.tombstones is not None:
+            pids = pids[~self.tombstones[pids.long()]]
+
         if self.use_gpu:
             centroid_scores = centroid_scores.cuda()
 
@@ -154,35 +195,87 @@ class IndexScorer(IndexLoader, CandidateGeneration):
                 pids = pids[torch.topk(approx_scores, k=(config.ndocs // 4)).indices]
         else:
             pids = IndexScorer.filter_pids(
-                    pids, centroid_scores, self.embeddings.codes, self.doclens,
+                    pids, centroid_scores.contiguous(), self.embeddings.codes, self.doclens,
                     self.embeddings_strided.codes_strided.offsets, idx, config.ndocs
                 )
 
-        # Rank final list of docs using full approximate embeddings (including residuals)
+        return pids
+
+    def decompress_pids(self, pids):
         if self.use_gpu:
-            D_packed, D_mask = self.lookup_pids(pids)
-        else:
-            D_packed = IndexScorer.decompress_residuals(
-                    pids,
-                    self.doclens,
-                    self.embeddings_strided.codes_strided.offsets,
-                    self.codec.bucket_weights,
-                    self.codec.reversed_bit_map,
-                    self.codec.decompression_lookup_table,
-                    self.embeddings.residuals,
-                    self.embeddings.codes,
-                    self.codec.centroids,
-                    self.codec.dim,
-                    self.codec.nbits
-                )
-            D_packed = torch.nn.functional.normalize(D_packed.to(torch.float32), p=2, dim=-1)
-            D_mask = self.doclens[pids.long()]
+            return self.lookup_pids(pids)
+
+        D_packed = IndexScorer.decompress_residuals(
+                pids,
+                self.doclens,
+                self.embeddings_strided.codes_strided.offsets,
+                self.codec.bucket_weights,
+                self.codec.reversed_bit_map,
+                self.codec.decompression_lookup_table,
+                self.embeddings.residuals,
+                self.embeddings.codes,
+                self.codec.centroids,
+                self.codec.dim,
+                self.codec.nbits
+            )
+        D_packed = torch.nn.functional.normalize(D_packed.to(torch.float32), p=2, dim=-1)
+        D_mask = self.doclens[pids.long()]
 
-        if Q.size(0) == 1:
-            return colbert_score_packed(Q, D_packed, D_mask, config), pids
+        return D_packed, D_mask
 
-        D_strided = StridedTensor(D_packed, D_mask, use_gpu=self.use_gpu)
-        D_padded, D_lengths = D_strided.as_padded_tensor()
 
-        return colbert_score(Q, D_padded, D_lengths, config), pids
+def filter_pids(pids, centroid_scores, codes, doclens, offsets, idx, nfiltered_docs):
+    """
+        PyTorch implementation of the filter_pids extension. Scores `pids` by summing, over the query vectors,
+        their max centroid score among the codes of the passage whose centroids are in `idx`, and keeps the top
+        `nfiltered_docs`. Then rescores those with all of their codes and returns the top `nfiltered_docs // 4`.
+        Ties are broken towards the larger pid, like the extension.
+    """
+    pids = _top_approx_pids(pids, centroid_scores, codes, doclens, offsets, idx, nfiltered_docs)
+    pids = _top_approx_pids(pids, centroid_scores, codes, doclens, offsets, None, nfiltered_docs // 4)
+
+    return pids.to(torch.int32)
+
+
+def _top_approx_pids(pids, centroid_scores, codes, doclens, offsets, idx, k, bsize=1 << 10):
+    pids = pids.long()
+    scores = [torch.zeros(0, dtype=centroid_scores.dtype)]
+
+    for pids_ in pids.split(bsize):
+        lengths = doclens[pids_]
+        codes_ = codes[segmented_index(lengths, offsets[pids_])].long()
+
+        code_scores = centroid_scores[codes_]
+        if idx is not None:
+            code_scores[~idx[codes_]] = -9999
+
+        mask = torch.arange(int(lengths.max())).unsqueeze(0) < lengths.unsqueeze(1)
+        code_scores_padded = torch.full((*mask.size(), centroid_scores.size(1)), -9999, dtype=centroid_scores.dtype)
+        code_scores_padded[mask] = code_scores
+        max_scores = code_scores_padded.max(1).values
+
+        # Sum in the order of the query vectors, as the extension does, for identical rounding
+        scores_ = torch.zeros(pids_.size(0), dtype=centroid_scores.dtype)
+        for column in max_scores.T:
+            scores_ += column
+
+        scores.append(scores_)
+
+    scores = torch.cat(scores)
+
+    # Sort by descending (score, pid)
+    order = pids.sort(descending=True, stable=True).indices
+    order = order[scores[order].sort(descending=True, stable=True).indices]
+
+    return pids[order[:k]]
+
+
+def decompress_residuals(pids, doclens, offsets, bucket_weights, reversed_bit_map, bucket_weight_combinations,
+                         binary_residuals, codes, centroids, dim, nbits):
+    """
+        PyTorch implementation of the (CPU) decompress_residuals extension: the decompressed embeddings of `pids`.
+    """
+    embedding_ids = segmented_index(doclens[pids.long()], offsets[pids.long()])
 
+    return decompress_codes(binary_residuals[embedding_ids], bucket_weights, reversed_bit_map,
+                            bucket_weight_combinations, codes[embedding_ids], centroids, dim, nbits)
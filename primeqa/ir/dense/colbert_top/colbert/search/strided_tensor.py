@@ -2,12 +2,11 @@ from struct import pack
 import torch
 from torch._C import device
 
-from primeqa.ir.dense.colbert_top.colbert.utils.utils import flatten, print_message
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import flatten
+
+from primeqa.ir.dense.colbert_top.colbert.utils.cpp_extensions import load_extension
 
 from .strided_tensor_core import StridedTensorCore, _create_mask, _create_view
-import os
-import pathlib
-from torch.utils.cpp_extension import load
 
 
 class StridedTensor(StridedTensorCore):
@@ -21,18 +20,7 @@ class StridedTensor(StridedTensorCore):
         if hasattr(cls, "loaded_extensions") or use_gpu:
             return
 
-        print_message(f"Loading segmented_lookup_cpp extension (set COLBERT_LOAD_TORCH_EXTENSION_VERBOSE=True for more info)...")
-        segmented_lookup_cpp = load(
-            name="segmented_lookup_cpp",
-            sources=[
-                os.path.join(
-                    pathlib.Path(__file__).parent.resolve(), "segmented_lookup.cpp"
-                ),
-            ],
-            extra_cflags=["-O3"],
-            verbose=os.getenv("COLBERT_LOAD_TORCH_EXTENSION_VERBOSE", "False") == "True",
-        )
-        cls.segmented_lookup = segmented_lookup_cpp.segmented_lookup_cpp
+        cls.segmented_lookup = load_extension('segmented_lookup') or segmented_lookup
 
         cls.loaded_extensions = True
 
@@ -168,6 +156,104 @@ class StridedTensor(StridedTensorCore):
         return tensor, lengths, mask
 
 
+class DeltaVarintStridedTensor(StridedTensor):
+    """
+        A StridedTensor of sorted posting lists (e.g., the pids of each IVF centroid) stored delta + varint
+        encoded: each list is kept as the gaps between its consecutive values, seven bits per byte with the high
+        bit set on all but the last byte of a value. `lookup` only decodes the lists it returns.
+    """
+
+    def __init__(self, encoded, encoded_lengths, lengths, use_gpu=torch.cuda.is_available()):
+        super().__init__(encoded, encoded_lengths, use_gpu=use_gpu)
+
+        self.postings_lengths = lengths.long()
+
+    @classmethod
+    def from_postings(cls, values, lengths, use_gpu=torch.cuda.is_available()):
+        return cls(*encode_delta_varint(values, lengths), lengths, use_gpu=use_gpu)
+
+    def lookup(self, pids, output='packed'):
+        assert output == 'packed', output
+
+        encoded, _ = super().lookup(pids)
+
+        pids = torch.tensor(pids) if isinstance(pids, list) else pids
+        lengths = self.postings_lengths[pids.long().cpu()].to(encoded.device)
+
+        return decode_delta_varint(encoded, lengths), lengths
+
+
+def segmented_index(lengths, offsets):
+    """
+        The indices of the rows [offsets[i], offsets[i] + lengths[i]) of each segment i, concatenated.
+    """
+    starts = torch.cumsum(lengths, dim=0) - lengths
+    positions = torch.arange(int(lengths.sum()), device=lengths.device) - starts.repeat_interleave(lengths)
+
+    return offsets.repeat_interleave(lengths) + positions
+
+
+def segmented_lookup(input, pids, lengths, offsets):
+    """
+        PyTorch implementation of the segmented_lookup extension: concatenates the segments of the rows of `input`
+        with `offsets` and `lengths` (one per pid).
+    """
+    return input[segmented_index(lengths, offsets)]
+
+
+def encode_delta_varint(values, lengths):
+    """
+        Encodes the concatenated, individually sorted lists of non-negative `values` with `lengths`.
+        Returns the bytes of all lists (uint8) and the number of bytes of each list.
+    """
+    values, lengths = values.long(), lengths.long()
+    offsets = torch.cumsum(lengths, dim=0) - lengths
+
+    deltas = values.clone()
+    deltas[1:] -= values[:-1]
+    deltas[offsets[lengths > 0]] = values[offsets[lengths > 0]]  # each list starts from zero
+    assert deltas.numel() == 0 or deltas.min() >= 0, "The lists must be sorted."
+
+    num_bytes = torch.ones_like(deltas)
+    for shift in range(7, 63, 7):
+        num_bytes += (deltas >= (1 << shift)).long()
+
+    value_idxs = torch.arange(deltas.size(0)).repeat_interleave(num_bytes)
+    byte_idxs = torch.arange(value_idxs.size(0)) - (torch.cumsum(num_bytes, dim=0) - num_bytes)[value_idxs]
+
+    encoded = (deltas[value_idxs] >> (7 * byte_idxs)) & 0x7F
+    encoded |= (byte_idxs < num_bytes[value_idxs] - 1).long() << 7
+
+    list_idxs = torch.arange(lengths.size(0)).repeat_interleave(lengths)
+    encoded_lengths = torch.zeros_like(lengths).index_add_(0, list_idxs, num_bytes)
+
+    return encoded.to(torch.uint8), encoded_lengths
+
+
+def decode_delta_varint(encoded, lengths):
+    """
+        Decodes the concatenated lists of `encode_delta_varint`, given the number of values of each list.
+    """
+    if encoded.numel() == 0:
+        return torch.zeros(0, dtype=torch.int32, device=encoded.device)
+
+    encoded = encoded.long()
+    is_last_byte = encoded < 0x80
+
+    value_idxs = torch.cumsum(is_last_byte.long(), dim=0) - is_last_byte.long()
+    value_starts = torch.nonzero(torch.cat((is_last_byte.new_ones(1), is_last_byte[:-1]))).squeeze(1)
+    byte_idxs = torch.arange(encoded.size(0), device=encoded.device) - value_starts[value_idxs]
+
+    deltas = torch.zeros(value_starts.size(0), dtype=torch.long, device=encoded.device)
+    deltas.index_add_(0, value_idxs, (encoded & 0x7F) << (7 * byte_idxs))
+
+    values = torch.cumsum(deltas, dim=0)
+    list_ends = torch.cumsum(lengths, dim=0)
+    list_bases = torch.cat((values.new_zeros(1), values))[list_ends - lengths]
+
+    return (values - list_bases.repeat_interleave(lengths)).to(torch.int32)
+
+
 if __name__ == '__main__':
     # lst = []
     # for _ in range(10):
@@ -60,27 +60,29 @@ class Searcher:
 
     def encode(self, text: TextQueries):
         queries = text if isinstance(text, list) else [text]
-        bsize = 128 if len(queries) > 128 else None
 
         self.checkpoint.query_tokenizer.query_maxlen = self.config.query_maxlen
-        Q = self.checkpoint.queryFromText(queries, bsize=bsize, to_cpu=True)
+        Q = self.checkpoint.queryFromText(queries, bsize=128, to_cpu=True)
 
         return Q
 
     def search(self, text: str, k=10):
         return self.dense_search(self.encode(text), k)
 
-    def search_all(self, queries: TextQueries, k=10):
+    def search_all(self, queries: TextQueries, k=10, bsize=128):
         queries = Queries.cast(queries)
         queries_ = list(queries.values())
 
         Q = self.encode(queries_)
 
-        return self._search_all_Q(queries, Q, k)
+        return self._search_all_Q(queries, Q, k, bsize=bsize)
 
-    def _search_all_Q(self, queries, Q, k):
-        all_scored_pids = [list(zip(*self.dense_search(Q[query_idx:query_idx+1], k=k)))
-                           for query_idx in tqdm(range(Q.size(0)))]
+    def _search_all_Q(self, queries, Q, k, bsize=128):
+        all_scored_pids = []
+
+        for offset in tqdm(range(0, Q.size(0), bsize)):
+            all_scored_pids.extend([list(zip(*results))
+                                    for results in self.dense_search_batch(Q[offset:offset+bsize], k=k)])
 
         data = {qid: val for qid, val in zip(queries.keys(), all_scored_pids)}
 
@@ -93,6 +95,24 @@ class Searcher:
         return Ranking(data=data, provenance=provenance)
 
     def dense_search(self, Q: torch.Tensor, k=10):
+        self._configure_search_defaults(k)
+
+        pids, scores = self.ranker.rank(self.config, Q, k)
+
+        return pids[:k], list(range(1, k+1)), scores[:k]
+
+    def dense_search_batch(self, Q: torch.Tensor, k=10):
+        """
+            Searches Q = (num_queries, *, dim) in one batched pass over the index.
+            Returns one (pids, ranks, scores) triple per query, like `dense_search`.
+        """
+        self._configure_search_defaults(k)
+
+        rankings = self.ranker.rank_batch(self.config, Q, k)
+
+        return [(pids[:k], list(range(1, k+1)), scores[:k]) for pids, scores in rankings]
+
+    def _configure_search_defaults(self, k):
         if k <= 10:
             if self.config.ncells is None:
                 self.configure(ncells=1)
@@ -114,7 +134,3 @@ class Searcher:
                 self.configure(centroid_score_threshold=0.4)
             if self.config.ndocs is None:
                 self.configure(ndocs=max(k * 4, 4096))
-
-        pids, scores = self.ranker.rank(self.config, Q, k)
-
-        return pids[:k], list(range(1, k+1)), scores[:k]
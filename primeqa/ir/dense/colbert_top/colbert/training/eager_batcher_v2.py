@@ -3,6 +3,7 @@ import csv
 import random
 import os
 import ujson
+import numpy as np
 
 from functools import partial
 from primeqa.ir.dense.colbert_top.colbert.infra.config.config import ColBERTConfig
@@ -14,6 +15,8 @@ from primeqa.ir.dense.colbert_top.colbert.evaluation.loaders import load_collect
 from primeqa.ir.dense.colbert_top.colbert.data.collection import Collection
 from primeqa.ir.dense.colbert_top.colbert.data.queries import Queries
 from primeqa.ir.dense.colbert_top.colbert.data.examples import Examples
+from primeqa.ir.dense.colbert_top.colbert.training.tokenized_cache import TokenizedTexts, iter_batches, \
+    tensorize_tokenized_triples
 
 
 
@@ -33,13 +36,34 @@ class EagerBatcher():
         self.tensorize_triples = partial(tensorize_triples, self.query_tokenizer, self.doc_tokenizer)
         self.position = 0
 
-        self.triples = self._load_triples(triples, rank, nranks)
-        self.reader = open(triples, mode='r', encoding="utf-8")
-        self.length = len(self.reader.readlines())
+        self.tokenized = None
+        if config.tokens_cache_dir:
+            # (query, positive, negative) token ids of every line; this rank's triples are rows of them
+            self.tokenized = self._load_tokenized_triples(config.tokens_cache_dir, triples)
+            self.tensorize_triples = partial(tensorize_tokenized_triples, self.query_tokenizer, self.doc_tokenizer)
+            self.length = len(self.tokenized[0])
+            self.triples = np.arange(rank, self.length, nranks)
+        else:
+            self.triples = self._load_triples(triples, rank, nranks)
+            self.reader = open(triples, mode='r', encoding="utf-8")
+            self.length = len(self.reader.readlines())
 
     def shuffle(self):
         print_message("#> Shuffling triples...")
-        random.shuffle(self.triples)
+        if self.tokenized is None:
+            random.shuffle(self.triples)
+        else:
+            np.random.shuffle(self.triples)
+
+    def _load_tokenized_triples(self, cache_dir, path):
+        def column(name):
+            with open(path) as f:
+                csv_reader = csv.DictReader(f, fieldnames=["query", "positive", "negative"], delimiter="\t")
+                yield from iter_batches(row[name] for row in csv_reader)
+
+        return [TokenizedTexts.cached(cache_dir, path, name, tokenizer, partial(column, name))
+                for name, tokenizer in [("query", self.query_tokenizer), ("positive", self.doc_tokenizer),
+                                        ("negative", self.doc_tokenizer)]]
 
     def _load_triples(self, path, rank, nranks):
         """
@@ -79,7 +103,10 @@ class EagerBatcher():
                 continue
 
             real_line_idx = (self.position + line_idx) % len(self.triples)
-            query, pos, neg = self.triples[real_line_idx]
+            if self.tokenized is None:
+                query, pos, neg = self.triples[real_line_idx]
+            else:
+                query, pos, neg = (texts[self.triples[real_line_idx]] for texts in self.tokenized)
             pas = [ pos, neg ]
             sco = []
 
@@ -12,6 +12,8 @@ from primeqa.ir.dense.colbert_top.colbert.evaluation.loaders import load_collect
 from primeqa.ir.dense.colbert_top.colbert.data.collection import Collection
 from primeqa.ir.dense.colbert_top.colbert.data.queries import Queries
 from primeqa.ir.dense.colbert_top.colbert.data.examples import Examples
+from primeqa.ir.dense.colbert_top.colbert.training.tokenized_cache import TokenizedTexts, iter_batches, \
+    tensorize_tokenized_triples
 
 # from colbert.utils.runs import Run
 
@@ -32,7 +34,19 @@ class LazyBatcher():
 
         self.triples = Examples.cast(triples, nway=self.nway).tolist(rank, nranks)
         self.queries = Queries.cast(queries)
-        self.collection = Collection.cast(collection)
+
+        if config.tokens_cache_dir and type(queries) is str and type(collection) is str:
+            # Queries and passages are looked up as token ids, so the collection is only read to tokenize it once
+            self.tensorize_triples = partial(tensorize_tokenized_triples, self.query_tokenizer, self.doc_tokenizer)
+            query_texts = self.queries
+            self.query_rows = {qid: row for row, qid in enumerate(query_texts.keys())}
+            self.queries = TokenizedTexts.cached(config.tokens_cache_dir, queries, 'queries', self.query_tokenizer,
+                                                 lambda: iter_batches(query_texts.values()))
+            self.collection = TokenizedTexts.cached(config.tokens_cache_dir, collection, 'passages', self.doc_tokenizer,
+                                                    lambda: iter_batches(Collection.cast(collection)))
+        else:
+            self.query_rows = None
+            self.collection = Collection.cast(collection)
 
     def __iter__(self):
         return self
@@ -53,7 +67,7 @@ class LazyBatcher():
             query, *pids = self.triples[position]
             pids = pids[:self.nway]
 
-            query = self.queries[query]
+            query = self.queries[query if self.query_rows is None else self.query_rows[query]]
 
             try:
                 pids, scores = zipstar(pids)
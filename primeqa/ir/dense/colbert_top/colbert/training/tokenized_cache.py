@@ -0,0 +1,239 @@
+import os
+import queue
+import hashlib
+import itertools
+import threading
+import numpy as np
+import torch
+
+from primeqa.ir.dense.colbert_top.colbert.modeling.tokenization.utils import _split_into_batches, _split_into_batches2
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
+
+
+class TokenizedTexts:
+    """
+        The token ids of a sequence of texts, exactly as `tensorize` of a query or doc tokenizer produces them but
+        without padding, stored as a flat, raw int32 array (`<prefix>.tokens`) with an int64 table of offsets into it
+        (`<prefix>.offsets.npy`). Both are memory-mapped, so memory stays bounded regardless of the number of texts.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.offsets = np.load(prefix + '.offsets.npy', mmap_mode='r')
+
+        # np.memmap cannot map empty files
+        if self.offsets[-1] > 0:
+            self.tokens = np.memmap(prefix + '.tokens', dtype='<i4', mode='r')
+        else:
+            self.tokens = np.zeros(0, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        return self.tokens[self.offsets[idx]:self.offsets[idx+1]]
+
+    @classmethod
+    def cached(cls, cache_dir, source_path, name, tokenizer, texts_fn):
+        """
+            Loads the token ids of the texts of `source_path` from `cache_dir`, or tokenizes the batches of texts
+            yielded by `texts_fn()` with `tokenizer` and caches them first. The cache is keyed by the source file
+            (path, size and modification time), `name`, the tokenizer and its maxlen.
+        """
+        prefix = cache_prefix(cache_dir, source_path, name, tokenizer)
+
+        if not os.path.exists(prefix + '.offsets.npy'):
+            print_message(f"#> Tokenizing the {name} of {source_path} into {prefix}.* ...")
+
+            with TokenizedTextsWriter(prefix, tokenizer) as writer:
+                for texts in texts_fn():
+                    writer.write(texts)
+
+        return cls(prefix)
+
+
+class TokenizedTextsWriter:
+    """
+        Tokenizes batches of texts and appends their token ids to the files read by `TokenizedTexts`.
+        The files are only moved in place on close, so an interrupted run leaves no partial cache behind.
+    """
+
+    def __init__(self, prefix, tokenizer):
+        self.prefix = prefix
+        self.tokenizer = tokenizer
+        self.is_query = hasattr(tokenizer, 'query_maxlen')
+
+        os.makedirs(os.path.dirname(os.path.abspath(prefix)), exist_ok=True)
+        self.temp_prefix = f'{prefix}.{os.getpid()}.tmp'
+        self.tokens_file = open(self.temp_prefix + '.tokens', 'wb')
+        self.lengths = [np.zeros(1, dtype=np.int64)]
+
+    def write(self, texts):
+        if len(texts) == 0:
+            return
+
+        ids, mask = self.tokenizer.tensorize(list(texts))
+
+        if self.is_query:
+            # Queries are padded with [MASK] (which may be attended to), so their length is up to the last other token
+            lengths = ids.size(1) - (ids != self.tokenizer.mask_token_id).flip(-1).int().argmax(-1)
+        else:
+            lengths = mask.sum(-1)
+
+        # Row-major selection concatenates the unpadded token ids of the texts, in order
+        unpadded = torch.arange(ids.size(1)).unsqueeze(0) < lengths.unsqueeze(1)
+        self.tokens_file.write(ids[unpadded].numpy().astype('<i4').tobytes())
+        self.lengths.append(lengths.numpy().astype(np.int64))
+
+    def close(self):
+        self.tokens_file.close()
+
+        offsets = np.cumsum(np.concatenate(self.lengths))
+        assert offsets[-1] * 4 == os.path.getsize(self.temp_prefix + '.tokens'), offsets[-1]
+        np.save(self.temp_prefix + '.offsets.npy', offsets)
+
+        # The offsets mark a complete cache, so they are moved in place last.
+        os.replace(self.temp_prefix + '.tokens', self.prefix + '.tokens')
+        os.replace(self.temp_prefix + '.offsets.npy', self.prefix + '.offsets.npy')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.tokens_file.close()
+            os.remove(self.temp_prefix + '.tokens')
+
+
+def iter_batches(iterable, bsize=10_000):
+    iterator = iter(iterable)
+    while True:
+        L = list(itertools.islice(iterator, bsize))
+        if len(L) == 0:
+            return
+        yield L
+
+
+def cache_prefix(cache_dir, source_path, name, tokenizer):
+    stat = os.stat(source_path)
+    source_key = f'{os.path.abspath(source_path)}:{stat.st_size}:{stat.st_mtime_ns}'
+    source_key = hashlib.md5(source_key.encode()).hexdigest()[:12]
+
+    tokenizer_name = tokenizer.tok.name_or_path.strip('/').replace('/', '_')
+    maxlen = tokenizer.query_maxlen if hasattr(tokenizer, 'query_maxlen') else tokenizer.doc_maxlen
+
+    return os.path.join(cache_dir, f'{os.path.basename(source_path)}.{source_key}.{name}.{tokenizer_name}.{maxlen}')
+
+
+def collate_queries(query_tokenizer, token_ids):
+    """
+        Pads the token ids of queries as `QueryTokenizer.tensorize` does, i.e., with [MASK] up to query_maxlen.
+    """
+    ids = torch.full((len(token_ids), query_tokenizer.query_maxlen), query_tokenizer.mask_token_id, dtype=torch.long)
+    mask = torch.zeros_like(ids)
+
+    for idx, query_ids in enumerate(token_ids):
+        ids[idx, :len(query_ids)] = torch.from_numpy(query_ids.astype(np.int64))
+        mask[idx, :len(query_ids)] = 1
+
+    if getattr(query_tokenizer, 'attend_to_mask_tokens', False):
+        mask[ids == query_tokenizer.mask_token_id] = 1
+
+    return ids, mask
+
+
+def collate_docs(doc_tokenizer, token_ids):
+    """
+        Pads the token ids of passages as `DocTokenizer.tensorize` does, i.e., to the longest passage.
+    """
+    maxlen = max(len(doc_ids) for doc_ids in token_ids)
+    ids = torch.full((len(token_ids), maxlen), doc_tokenizer.tok.pad_token_id, dtype=torch.long)
+    mask = torch.zeros_like(ids)
+
+    for idx, doc_ids in enumerate(token_ids):
+        ids[idx, :len(doc_ids)] = torch.from_numpy(doc_ids.astype(np.int64))
+        mask[idx, :len(doc_ids)] = 1
+
+    return ids, mask
+
+
+def tensorize_tokenized_triples(query_tokenizer, doc_tokenizer, queries, passages, scores, bsize, nway):
+    """
+        Like `tensorize_triples`, for the token ids of queries and passages from `TokenizedTexts`.
+    """
+    Q_ids, Q_mask = collate_queries(query_tokenizer, queries)
+    D_ids, D_mask = collate_docs(doc_tokenizer, passages)
+
+    query_batches = _split_into_batches(Q_ids, Q_mask, bsize)
+    doc_batches = _split_into_batches(D_ids, D_mask, bsize * nway)
+
+    if len(scores):
+        score_batches = _split_into_batches2(scores, bsize * nway)
+    else:
+        score_batches = [[] for _ in doc_batches]
+
+    return [(Q, D, S) for Q, D, S in zip(query_batches, doc_batches, score_batches)]
+
+
+class PrefetchingBatcher:
+    """
+        Wraps a batcher, so that a background thread reads and collates its next `prefetch` batches while the
+        model trains on the current one. `shuffle` reorders the remaining triples, after the batches already
+        prefetched.
+    """
+
+    _END = object()
+
+    def __init__(self, batcher, prefetch):
+        assert prefetch > 0, prefetch
+
+        self.batcher = batcher
+        self.queue = queue.Queue(maxsize=prefetch)
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def __iter__(self):
+        return self
+
+    def __len__(self):
+        return len(self.batcher)
+
+    def __next__(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._prefetch, daemon=True)
+            self.thread.start()
+
+        batch = self.queue.get()
+
+        if batch is PrefetchingBatcher._END:
+            self.queue.put(batch)
+            raise StopIteration
+
+        if isinstance(batch, Exception):
+            raise batch
+
+        return batch
+
+    def _prefetch(self):
+        while True:
+            try:
+                with self.lock:
+                    batch = next(self.batcher)
+            except StopIteration:
+                self.queue.put(PrefetchingBatcher._END)
+                return
+            except Exception as e:
+                self.queue.put(e)
+                return
+
+            self.queue.put(batch)
+
+    def shuffle(self):
+        with self.lock:
+            self.batcher.shuffle()
+
+    def skip_to_batch(self, batch_idx, intended_batch_size):
+        assert self.thread is None, "Skipping batches once prefetching started is not supported."
+        self.batcher.skip_to_batch(batch_idx, intended_batch_size)
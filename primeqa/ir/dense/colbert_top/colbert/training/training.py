@@ -23,6 +23,7 @@ from primeqa.ir.dense.colbert_top.colbert.training.eager_batcher_v2 import Eager
 
 from primeqa.ir.dense.colbert_top.colbert.utils.amp import MixedPrecisionManager
 from primeqa.ir.dense.colbert_top.colbert.training.lazy_batcher import LazyBatcher
+from primeqa.ir.dense.colbert_top.colbert.training.tokenized_cache import PrefetchingBatcher
 from primeqa.ir.dense.colbert_top.colbert.parameters import DEVICE
 
 from primeqa.ir.dense.colbert_top.colbert.modeling.colbert import ColBERT
@@ -117,6 +118,11 @@ def train(config: ColBERTConfig, triples, queries=None, collection=None):
         if config.teacher_checkpoint is not None:
             teacher_reader = EagerBatcher(config, config.teacher_triples, (0 if config.rank == -1 else config.rank), config.nranks)
 
+    if config.prefetch_batches > 0:
+        reader = PrefetchingBatcher(reader, config.prefetch_batches)
+        if config.teacher_checkpoint is not None:
+            teacher_reader = PrefetchingBatcher(teacher_reader, config.prefetch_batches)
+
     if not config.reranker:
         colbert = ColBERT(name=config.model_type, colbert_config=config)
 
@@ -0,0 +1,139 @@
+"""
+Builds the C++/CUDA extensions of ColBERT once, into a cache directory versioned by the platform, the Python, PyTorch
+and CUDA versions and a hash of the sources, and loads them from there. The cache defaults to
+~/.cache/primeqa/colbert_extensions and can be moved with COLBERT_EXTENSIONS_DIR, e.g., to a volume shared by
+containers. To build the extensions ahead of time (with --cuda, the CUDA ones too):
+
+    python -m primeqa.ir.dense.colbert_top.colbert.utils.cpp_extensions [--cuda]
+
+If an extension cannot be built (e.g., no compiler) or COLBERT_DISABLE_TORCH_EXTENSIONS=True, `load_extension`
+returns None and the callers fall back to their pure-PyTorch implementation, which has identical outputs.
+"""
+import hashlib
+import importlib.util
+import os
+import pathlib
+import platform
+import sys
+import traceback
+import torch
+
+from argparse import ArgumentParser
+
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message, print_torch_extension_error_message
+
+COLBERT_ROOT = pathlib.Path(__file__).parent.parent.resolve()
+
+# name: (sources relative to COLBERT_ROOT, name of the function in the module)
+EXTENSIONS = {
+    'segmented_lookup': (['search/segmented_lookup.cpp'], 'segmented_lookup_cpp'),
+    'filter_pids': (['search/filter_pids.cpp'], 'filter_pids_cpp'),
+    'decompress_residuals': (['search/decompress_residuals.cpp'], 'decompress_residuals_cpp'),
+    'segmented_maxsim': (['modeling/segmented_maxsim.cpp'], 'segmented_maxsim_cpp'),
+    'decompress_residuals_cuda': (['indexing/codecs/decompress_residuals.cpp',
+                                   'indexing/codecs/decompress_residuals.cu'], 'decompress_residuals_cpp'),
+    'packbits_cuda': (['indexing/codecs/packbits.cpp', 'indexing/codecs/packbits.cu'], 'packbits_cpp'),
+}
+
+EXTRA_CFLAGS = ['-O3']
+
+_LOADED = {}
+
+
+def extensions_cache_dir():
+    root = os.getenv('COLBERT_EXTENSIONS_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'primeqa',
+                                                           'colbert_extensions'))
+
+    version = f'{platform.system()}-{platform.machine()}-py{sys.version_info.major}.{sys.version_info.minor}' \
+              f'-torch{torch.__version__}' + (f'-cuda{torch.version.cuda}' if torch.version.cuda else '')
+
+    return os.path.join(root, version.replace('+', '_').replace(' ', '_'))
+
+
+def extension_build_dir(name):
+    sources, _ = EXTENSIONS[name]
+
+    sha = hashlib.sha1(' '.join(EXTRA_CFLAGS).encode())
+    for source in sources:
+        sha.update((COLBERT_ROOT / source).read_bytes())
+
+    return os.path.join(extensions_cache_dir(), f'{name}-{sha.hexdigest()[:12]}')
+
+
+def load_extension(name):
+    """
+        Returns the function of the extension `name`, imported from the cache, where it is built first if needed.
+        Returns None if the extension cannot be built or loaded, so that the caller can fall back to PyTorch.
+    """
+    if name in _LOADED:
+        return _LOADED[name]
+
+    if os.getenv('COLBERT_DISABLE_TORCH_EXTENSIONS', 'False') == 'True':
+        _LOADED[name] = None
+        return None
+
+    verbose = os.getenv('COLBERT_LOAD_TORCH_EXTENSION_VERBOSE', 'False') == 'True'
+    sources, function_name = EXTENSIONS[name]
+
+    build_dir = extension_build_dir(name)
+    library_path = os.path.join(build_dir, f'{name}.pyd' if sys.platform == 'win32' else f'{name}.so')
+
+    try:
+        # A lock file means another process is still building the extension, and load() waits for it.
+        if os.path.exists(library_path) and not os.path.exists(os.path.join(build_dir, 'lock')):
+            spec = importlib.util.spec_from_file_location(name, library_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        else:
+            from torch.utils.cpp_extension import load
+
+            print_message(f"Building the {name} extension into {build_dir} "
+                          f"(set COLBERT_LOAD_TORCH_EXTENSION_VERBOSE=True for more info)...")
+
+            os.makedirs(build_dir, exist_ok=True)
+            module = load(name=name, sources=[str(COLBERT_ROOT / source) for source in sources],
+                          extra_cflags=EXTRA_CFLAGS, build_directory=build_dir, verbose=verbose)
+
+        _LOADED[name] = getattr(module, function_name)
+
+    except Exception as e:
+        if verbose:
+            traceback.print_exc()
+            print_torch_extension_error_message()
+
+        print_message(f"#> WARNING: Could not load the {name} extension ({type(e).__name__}: {e}). "
+                      f"Falling back to its PyTorch implementation.")
+        _LOADED[name] = None
+
+    return _LOADED[name]
+
+
+def build_extensions(cuda=torch.cuda.is_available()):
+    """
+        Builds all the CPU extensions (and the CUDA ones with `cuda`) into the cache. Returns the names of those
+        that could not be built.
+    """
+    failed = []
+
+    for name, (sources, _) in EXTENSIONS.items():
+        if any(source.endswith('.cu') for source in sources) and not cuda:
+            continue
+
+        if load_extension(name) is None:
+            failed.append(name)
+
+    return failed
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Build the ColBERT C++/CUDA extensions into their cache directory.')
+    parser.add_argument('--cuda', dest='cuda', default=False, action='store_true')
+
+    args = parser.parse_args()
+
+    failed = build_extensions(cuda=args.cuda)
+    print_message(f"#> Extensions cache: {extensions_cache_dir()}")
+
+    if failed:
+        print_message(f"#> Failed to build: {', '.join(failed)}")
+        sys.exit(1)
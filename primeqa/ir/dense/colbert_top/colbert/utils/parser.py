@@ -55,6 +55,9 @@ class Arguments():
 
         # adding shuffle option
         self.add_argument('--shuffle_every_epoch', dest='shuffle_every_epoch', default=False, action='store_true')
+        # tokenize the triples once into a memory-mapped cache, and collate batches ahead in a background thread
+        self.add_argument('--tokens_cache_dir', dest='tokens_cache_dir', default=None, type=str)
+        self.add_argument('--prefetch_batches', dest='prefetch_batches', default=0, type=int)
         # support checkpoint
         self.add_argument('--save_every', dest='save_every', default=None, type=int)
         # TODO: deprecate save_steps and save_epochs
@@ -119,7 +122,13 @@ class Arguments():
     def add_compressed_index_input(self):
         self.add_argument('--nbits', dest='nbits', choices=[1, 2, 4], type=int, default=1)
         self.add_argument('--kmeans_niters', type=int, default=4)
+        self.add_argument('--kmeans_mode', dest='kmeans_mode', choices=['faiss', 'streaming'], default='faiss')
+        self.add_argument('--kmeans_memory_budget_mb', dest='kmeans_memory_budget_mb', type=int, default=1024)
+        self.add_argument('--kmeans_sample_factor', dest='kmeans_sample_factor', type=float, default=16.0)
         self.add_argument('--num_partitions_max', type=int, default=10000000)
+        self.add_argument('--index_format', dest='index_format', choices=['torch', 'mmap'], default='torch')
+        self.add_argument('--index_tokenizer_threads', dest='index_tokenizer_threads', type=int, default=2)
+        self.add_argument('--compress_ivf', dest='compress_ivf', default=False, action='store_true')
 
     def add_index_use_input(self):
         self.add_argument('--index_root', dest='index_root', default=None)
@@ -48,6 +48,33 @@ class ANNIndex:
             return self.index.d
 
 
+def search_shards(indexes, query_vectors: np.ndarray, k: int, executor=None):
+    """
+    search each shard for its top k and merge them into the overall top k
+    :param indexes: the ANNIndex of each shard
+    :param query_vectors: float32 array of shape (num_queries, dim)
+    :param k: number of results per query
+    :param executor: if given (e.g. a ThreadPoolExecutor), the shards are searched concurrently; faiss releases the GIL
+    :return: scores, shard numbers and indexes within the shard, each of shape (num_queries, k), best first
+    """
+    if executor is not None:
+        results = list(executor.map(lambda index: index.search(query_vectors, k), indexes))
+    else:
+        results = [index.search(query_vectors, k) for index in indexes]
+    for scores, shard_indexes in results:
+        assert len(scores.shape) == 2
+        assert scores.shape[1] == k
+        assert scores.shape == shard_indexes.shape
+        assert scores.dtype == np.float32
+        assert shard_indexes.dtype == np.int64
+    all_scores = np.concatenate([scores for scores, _ in results], axis=1)
+    all_indexes = np.concatenate([shard_indexes for _, shard_indexes in results], axis=1)
+    # partial top-k over the k * num_shards candidates, then sort only those k
+    kbest = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+    kbest = np.take_along_axis(kbest, np.argsort(-np.take_along_axis(all_scores, kbest, axis=1), axis=1, kind='stable'), axis=1)
+    return np.take_along_axis(all_scores, kbest, axis=1), kbest // k, np.take_along_axis(all_indexes, kbest, axis=1)
+
+
 class IndexOptions():
     def __init__(self):
         self.d = 768
@@ -76,10 +103,9 @@ def build_index(corpus_dir, output_file, opts: IndexOptions):
         max_norm = 0
         num_vectors = 0
         start_time = time.time()
-        for psg in corpus:
-            vector = psg['vector']
-            max_norm = max(max_norm, np.linalg.norm(vector))
-            num_vectors += 1
+        for vectors in corpus.vector_batches(opts.index_batch_size):
+            max_norm = max(max_norm, np.linalg.norm(vectors, axis=1).max())
+            num_vectors += len(vectors)
         print(f'found max norm = {max_norm} over {num_vectors} vectors in {(time.time()-start_time)/60} min.')
         opts.max_norm = max_norm
         opts.num_vectors = num_vectors
@@ -117,9 +143,6 @@ def build_index(corpus_dir, output_file, opts: IndexOptions):
         index.hnsw.efConstruction = opts.ef_construction
         opts.is_trained = True  # doesn't need training
 
-    vectors = np.zeros((opts.index_batch_size, opts.d), dtype=np.float32)
-    vector_ndx = 0
-
     def add_to_index(vectors):
         if opts.is_l2:
             to_index = l2_convert_indexed_vectors(vectors, max_norm_sqrd)
@@ -132,21 +155,15 @@ def build_index(corpus_dir, output_file, opts: IndexOptions):
         index.add(to_index)
 
     report = Reporting()
-    #for psg in corpus:
-    for pndx, psg in enumerate(corpus):
-        if (pndx % 100000) == 0:
-            logger.info(f'processed {pndx} passages')
+    # the vectors are streamed in batches, straight from the memory mapped vectors files if the corpus has them
+    pndx = 0
+    for vectors in corpus.vector_batches(opts.index_batch_size):
         if report.is_time():
             print(report.progress_str(instance_name='vector'))
-        vector = psg['vector']
-        vectors[vector_ndx] = vector
-        vector_ndx += 1
-        if vector_ndx == opts.index_batch_size:
-            logger.info(f'processed {pndx} passages')
-            add_to_index(vectors)
-            vector_ndx = 0
-    if vector_ndx > 0:
-        add_to_index(vectors[:vector_ndx])
+        assert vectors.shape[1] == opts.d
+        pndx += len(vectors)
+        logger.info(f'processed {pndx} passages')
+        add_to_index(vectors)
     logger.info(f'processed {len(corpus)} passages')
     logger.info(f'finished building index, writing index file to {output_file}')
     #print(f'finished building index, writing index file to {output_file}')
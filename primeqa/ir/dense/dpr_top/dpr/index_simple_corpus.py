@@ -6,7 +6,7 @@ from primeqa.ir.dense.dpr_top.util.args_help import fill_from_args
 import torch
 from typing import List
 import numpy as np
-from primeqa.ir.dense.dpr_top.dpr.simple_mmap_dataset import gzip_str
+from primeqa.ir.dense.dpr_top.dpr.simple_mmap_dataset import gzip_str, write_pid_index, VectorsWriter
 from primeqa.ir.dense.dpr_top.dpr.faiss_index import build_index, IndexOptions
 import base64
 from primeqa.ir.dense.dpr_top.util.reporting import Reporting
@@ -28,6 +28,7 @@ class Options(IndexOptions):
         self.corpus = ''
         self.output_dir = ''  # the output_dir will have the passages dataset and the hnsw_index.faiss
         self.batch_size = 16
+        self.separate_vectors = False  # write the vectors to a memory-mappable vectors_*.npy rather than into the records
         self.__required_args__ = ['output_dir']
 
         # for compatibility with run_ir.py
@@ -65,12 +66,15 @@ class DPRIndexer():
         return embeddings.detach().cpu().to(dtype=torch.float16).numpy()
 
 
-    def write(self, cur_offset, offsets, passage_file, doc_batch: List[Passage], embeddings):
+    def write(self, cur_offset, offsets, passage_file, doc_batch: List[Passage], embeddings, vectors_file=None):
         assert len(doc_batch) == embeddings.shape[0]
         assert len(embeddings.shape) == 2
+        if vectors_file is not None:
+            vectors_file.write(embeddings)
         for di, doc in enumerate(doc_batch):
             doc = doc.to_dict()
-            doc['vector'] = base64.b64encode(embeddings[di].astype(np.float16)).decode('ascii')
+            if vectors_file is None:
+                doc['vector'] = base64.b64encode(embeddings[di].astype(np.float16)).decode('ascii')
             jstr_gz = gzip_str(json.dumps(doc))
             offsets.append(cur_offset)
             passage_file.write(jstr_gz)
@@ -80,8 +84,15 @@ class DPRIndexer():
 
     def index(self):
         offsets = []
+        pids = []
         cur_offset = 0
         passages = write_open(os.path.join(self.opts.output_dir, f'passages_{self.embed_num}_of_{self.embed_count}.json.gz.records'), binary=True)
+        vectors = None
+        vectors_path = os.path.join(self.opts.output_dir, f'vectors_{self.embed_num}_of_{self.embed_count}.npy')
+        if self.opts.separate_vectors:
+            vectors = VectorsWriter(vectors_path, self.ctx_encoder.config.hidden_size)
+        elif os.path.exists(vectors_path):
+            os.remove(vectors_path)  # from an earlier run, Corpus would read it instead of the vectors in the records
 
         report = Reporting()
         doc_batch = []
@@ -93,17 +104,22 @@ class DPRIndexer():
             if report.is_time():
                 logger.info(f'on instance {report.check_count}, {report.check_count/report.elapsed_seconds()} instances per second')
             doc_batch.append(passage)
+            pids.append(passage.pid)
             if len(doc_batch) == self.opts.batch_size:
                 embeddings = self.embed(doc_batch, self.ctx_encoder, self.ctx_tokenizer)
-                cur_offset = self.write(cur_offset, offsets, passages, doc_batch, embeddings)
+                cur_offset = self.write(cur_offset, offsets, passages, doc_batch, embeddings, vectors)
                 doc_batch = []
         if len(doc_batch) > 0:
             embeddings = self.embed(doc_batch, self.ctx_encoder, self.ctx_tokenizer)
-            cur_offset = self.write(cur_offset, offsets, passages, doc_batch, embeddings)
+            cur_offset = self.write(cur_offset, offsets, passages, doc_batch, embeddings, vectors)
         offsets.append(cur_offset)  # just the length of the file
         passages.close()
+        if vectors is not None:
+            vectors.close()
         with write_open(os.path.join(self.opts.output_dir, f'offsets_{self.embed_num}_of_{self.embed_count}.npy'), binary=True) as f:
             np.save(f, np.array(offsets, dtype=np.int64), allow_pickle=False)
+        with write_open(os.path.join(self.opts.output_dir, f'pid_index_{self.embed_num}_of_{self.embed_count}.npy'), binary=True) as f:
+            write_pid_index(f, pids)
         logger.info(f'wrote passages_{self.embed_num}_of_{self.embed_count}.json.gz.records in {report.elapsed_time_str()}')
         #print(f'Wrote passages_{self.embed_num}_of_{self.embed_count}.json.gz.records in {report.elapsed_time_str()}')
 
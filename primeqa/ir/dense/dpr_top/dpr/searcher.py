@@ -12,7 +12,8 @@ import logging
 from primeqa.ir.dense.dpr_top.dpr.dpr_util import DPROptions, queries_to_vectors
 from primeqa.ir.dense.dpr_top.util.args_help import fill_from_args
 from primeqa.ir.dense.dpr_top.dpr.simple_mmap_dataset import Corpus
-from primeqa.ir.dense.dpr_top.dpr.faiss_index import ANNIndex
+from primeqa.ir.dense.dpr_top.dpr.faiss_index import ANNIndex, search_shards
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger(__name__)
 
@@ -72,9 +73,9 @@ class DPRSearcher():
         # we either have a single index.faiss or we have an index for each offsets/passages
         if os.path.exists(os.path.join(self.opts.index_location, "index.faiss")):
             self.passages = Corpus(os.path.join(self.opts.index_location))
-            index = ANNIndex(os.path.join(self.opts.index_location, "index.faiss"))
+            self.index = ANNIndex(os.path.join(self.opts.index_location, "index.faiss"))
             self.shards = None
-            self.dim = index.dim()
+            self.dim = self.index.dim()
         else:
             self.shards = []
             # loop over the different index*.faiss
@@ -90,6 +91,8 @@ class DPRSearcher():
             self.dim = self.shards[0][0].dim()
             assert all([self.dim == shard[0].dim() for shard in self.shards])
             logger.info(f'Using sharded faiss with {len(self.shards)} shards.')
+            # the shards are searched concurrently
+            self.shard_executor = ThreadPoolExecutor(max_workers=len(self.shards))
         self.dummy_doc = {'pid': 'N/A', 'title': '', 'text': '', 'vector': np.zeros(self.dim, dtype=np.float32)}
 
 
@@ -115,22 +118,14 @@ class DPRSearcher():
             return docs
 
         def merge_results(query_vectors, k): # from corpus_server_direct.merge_results
-            # CONSIDER: consider ResultHeap (https://github.com/matsui528/faiss_tips)
-            all_scores = np.zeros((query_vectors.shape[0], k * len(self.shards)), dtype=np.float32)
-            all_indices = np.zeros((query_vectors.shape[0], k * len(self.shards)), dtype=np.int64)
+            _, kbest_shards, kbest_indices = search_shards([shard[0] for shard in self.shards], query_vectors, k,
+                                                           executor=self.shard_executor)
+            docs = [[self.shards[si][1][ndx] for si, ndx in zip(sis, ndxs)] for sis, ndxs in zip(kbest_shards, kbest_indices)]
+            doc_vectors = np.zeros((*kbest_shards.shape, self.dim), dtype=np.float32)
             for si, shard in enumerate(self.shards):
-                index_i, passages_i = shard
-                scores, indexes = index_i.search(query_vectors, k)
-                assert len(scores.shape) == 2
-                assert scores.shape[1] == k
-                assert scores.shape == indexes.shape
-                assert scores.dtype == np.float32
-                assert indexes.dtype == np.int64
-                all_scores[:, si * k: (si + 1) * k] = scores
-                all_indices[:, si * k: (si + 1) * k] = indexes
-            kbest = all_scores.argsort()[:, -k:][:, ::-1]
-            docs = [[self.shards[ndx // k][1][all_indices[bi, ndx]] for ndx in ndxs] for bi, ndxs in enumerate(kbest)]
-            return docs
+                in_shard = kbest_shards == si
+                doc_vectors[in_shard] = shard[1].get_vectors(kbest_indices[in_shard])
+            return docs, doc_vectors
 
         # from dpr_apply
         def retrieve(queries):
@@ -145,22 +140,15 @@ class DPRSearcher():
                 if self.shards is None:
                     scores, indexes = self.index.search(query_vectors, self.opts.top_k)
                     docs = [[self.passages[ndx] for ndx in ndxs] for ndxs in indexes]
+                    doc_vectors = self.passages.get_vectors(indexes).astype(np.float32)
                 else:
-                    docs = merge_results(query_vectors, self.opts.top_k)
+                    docs, doc_vectors = merge_results(query_vectors, self.opts.top_k)
 
                 doc_dicts = [{'pid': [dqk['pid'] for dqk in dq],
                               'title': [dqk['title'] for dqk in dq],
                               'text': [dqk['text'] for dqk in dq]} for dq in docs]
 
-                doc_vectors = np.zeros([batch_size, self.opts.top_k, self.dim], dtype=np.float32)
-                for qi, docs_qi in enumerate(docs):
-                    gpids = []
-                    for ki, doc_qi_ki in enumerate(docs_qi):
-                        # if we have gold_pids, set their vector to 100 * the query vector
-                        if ki < len(gpids):
-                            doc_vectors[qi, ki] = 100 * query_vectors[qi]
-                        else:
-                            doc_vectors[qi, ki] = doc_qi_ki['vector']
+                assert doc_vectors.shape == (batch_size, self.opts.top_k, self.dim)
                 # ^ from from corpus_server_direct.retrieve_docs
 
                 # from corpus_client.retrieve
@@ -4,6 +4,7 @@ import numpy as np
 import os
 import mmap
 import codecs
+import hashlib
 import threading
 
 
@@ -17,6 +18,50 @@ def gunzip_str(bytes):
     # return gzip.decompress(bytes).decode('utf-8')
 
 
+def pid_hash(pid):
+    return int.from_bytes(hashlib.blake2b(str(pid).encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def write_pid_index(f, pids):
+    # row 0 is the sorted hashes of the pids, row 1 the index of the corresponding passage in its passages file
+    # this lets Corpus.get_by_pid binary search a memory mapped table, rather than build a pid -> index dict
+    hashes = np.array([pid_hash(pid) for pid in pids], dtype=np.int64)
+    order = np.argsort(hashes, kind='stable')
+    np.save(f, np.stack((hashes[order], order.astype(np.int64))), allow_pickle=False)
+
+
+class VectorsWriter:
+    """
+    write float16 vectors incrementally to a .npy file, which Corpus memory maps
+    the header is written first with a zero row count and rewritten with the final shape on close
+    """
+    def __init__(self, path, dim):
+        self.file = open(path, 'wb')
+        self.dim = dim
+        self.count = 0
+        self.header_length = self._write_header()
+
+    def _write_header(self):
+        self.file.seek(0)
+        header = {'descr': np.lib.format.dtype_to_descr(np.dtype(np.float16)), 'fortran_order': False,
+                  'shape': (self.count, self.dim)}
+        np.lib.format.write_array_header_1_0(self.file, header)
+        return self.file.tell()
+
+    def write(self, vectors: np.ndarray):
+        assert len(vectors.shape) == 2 and vectors.shape[1] == self.dim
+        self.file.write(np.ascontiguousarray(vectors, dtype=np.float16).tobytes())
+        self.count += vectors.shape[0]
+
+    def close(self):
+        end = self.file.tell()
+        # the header is padded to a multiple of 64 bytes, so a larger row count still fits in the same space
+        if self._write_header() != self.header_length:
+            raise ValueError(f'header length changed for {self.file.name}')
+        self.file.seek(end)
+        self.file.close()
+
+
 class Corpus:
     def __init__(self, dir):
         # either pass a dir or a specific passagesX.json.gz.records file
@@ -54,6 +99,22 @@ class Corpus:
             self.offsets[total_passage_count:total_passage_count + passage_count, 2] = file_offsets[1:]
             total_passage_count += passage_count
 
+        # if the indexer wrote a pid_indexX.npy for every passages file, get_by_pid binary searches those
+        self.file_starts = np.cumsum([0] + [len(file_offsets)-1 for file_offsets in per_file_offsets[:-1]])
+        pid_index_fnames = [f'pid_index{file_pair[0][len("passages"):-len(".json.gz.records")]}.npy' for file_pair in files]
+        if all(os.path.exists(os.path.join(dir, fname)) for fname in pid_index_fnames):
+            self.pid_indexes = [np.load(os.path.join(dir, fname), mmap_mode='r') for fname in pid_index_fnames]
+        else:
+            self.pid_indexes = None
+
+        # if the indexer wrote a vectorsX.npy for every passages file, the vectors are not in the records
+        vectors_fnames = [f'vectors{file_pair[0][len("passages"):-len(".json.gz.records")]}.npy' for file_pair in files]
+        if all(os.path.exists(os.path.join(dir, fname)) for fname in vectors_fnames):
+            self.vectors = [np.load(os.path.join(dir, fname), mmap_mode='r') for fname in vectors_fnames]
+            assert all(len(vectors) == len(file_offsets) - 1 for vectors, file_offsets in zip(self.vectors, per_file_offsets))
+        else:
+            self.vectors = None
+
         # self.mms will be list of memory mapped files (self.files)
         self.mms = []
         self.files = []
@@ -72,14 +133,71 @@ class Corpus:
             raise IndexError
         bytes = self.get_raw(index)
         jobj = json.loads(gunzip_str(bytes))
-        jobj['vector'] = np.frombuffer(base64.decodebytes(jobj['vector'].encode('ascii')), dtype=np.float16)
+        if self.vectors is not None:
+            file_ndx = self.offsets[index, 0]
+            jobj['vector'] = self.vectors[file_ndx][index - self.file_starts[file_ndx]]
+        else:
+            jobj['vector'] = np.frombuffer(base64.decodebytes(jobj['vector'].encode('ascii')), dtype=np.float16)
         return jobj
 
+    def get_vectors(self, indices):
+        """
+        gather the vectors of the passages at indices (any shape) without parsing their records, when possible
+        :param indices: array of passage indices
+        :return: float16 array of shape indices.shape + (dim,)
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if self.vectors is None:
+            return np.stack([self[ndx]['vector'] for ndx in indices.reshape(-1)]).reshape(*indices.shape, -1)
+        flat_indices = indices.reshape(-1)
+        file_ndxs = self.offsets[flat_indices, 0]
+        vectors = np.zeros((len(flat_indices), self.vectors[0].shape[1]), dtype=np.float16)
+        for file_ndx in np.unique(file_ndxs):
+            in_file = file_ndxs == file_ndx
+            vectors[in_file] = self.vectors[file_ndx][flat_indices[in_file] - self.file_starts[file_ndx]]
+        return vectors.reshape(*indices.shape, -1)
+
+    def vector_batches(self, batch_size):
+        """
+        iterate over all the vectors in corpus order, in float32 batches of up to batch_size
+        """
+        if self.vectors is not None:
+            # batches span the passages files, as they would when reading the records one by one
+            pending, pending_count = [], 0
+            for vectors in self.vectors:
+                start = 0
+                while start < len(vectors):
+                    end = min(start + batch_size - pending_count, len(vectors))
+                    pending.append(vectors[start:end])
+                    pending_count += end - start
+                    start = end
+                    if pending_count == batch_size:
+                        yield np.concatenate(pending).astype(np.float32)
+                        pending, pending_count = [], 0
+            if pending_count > 0:
+                yield np.concatenate(pending).astype(np.float32)
+            return
+        for start in range(0, len(self), batch_size):
+            yield self.get_vectors(np.arange(start, min(start+batch_size, len(self)))).astype(np.float32)
+
     def get_raw(self, index):
         file_ndx, start_offset, end_offset = self.offsets[index]
         return self.mms[file_ndx][start_offset:end_offset]
 
     def get_by_pid(self, pid):
+        if self.pid_indexes is not None:
+            pid_hashed = np.int64(pid_hash(pid))
+            for file_start, pid_index in zip(self.file_starts, self.pid_indexes):
+                start = np.searchsorted(pid_index[0], pid_hashed, side='left')
+                end = np.searchsorted(pid_index[0], pid_hashed, side='right')
+                # more than one candidate only on a hash collision
+                for ndx in pid_index[1][start:end]:
+                    jobj = self[file_start + int(ndx)]
+                    if jobj['pid'] == pid:
+                        return jobj
+            return None
+
+        # no pid index (corpus written by an older version), so build the pid -> index dict on first use
         with self.lock:
             if len(self.pid2ndx) == 0:
                 for ndx in range(len(self.offsets)):
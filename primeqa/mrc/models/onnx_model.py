@@ -0,0 +1,160 @@
+"""
+Export of `ModelForDownstreamTasks` with an extractive QA head to ONNX, and execution of the exported graph
+with ONNX Runtime.
+
+Export a reader model into a directory which `ExtractiveReader(model=..., backend="onnxruntime")` can load:
+
+    python -m primeqa.mrc.models.onnx_model --model_name_or_path PrimeQA/nq_tydi_sq1-reader-xlmr_large-20221110 \
+        --output_dir /path/to/onnx-reader
+"""
+import argparse
+import logging
+import os
+from typing import List, Optional
+
+import numpy as np
+import torch
+from transformers import AutoConfig, AutoTokenizer, PreTrainedTokenizerBase
+
+from primeqa.mrc.data_models.model_outputs.extractive import ExtractiveQAModelOutput
+from primeqa.mrc.models.heads.extractive import EXTRACTIVE_HEAD
+from primeqa.mrc.models.task_model import ModelForDownstreamTasks
+
+logger = logging.getLogger(__name__)
+
+ONNX_MODEL_FILENAME = "model.onnx"
+ONNX_OUTPUT_NAMES = ["start_logits", "end_logits", "target_type_logits"]
+
+
+class _ExtractiveQAExportWrapper(torch.nn.Module):
+    """
+    Exposes the logits of an extractive QA model as a tuple of tensors, which is what tracing for export expects.
+    """
+
+    def __init__(self, model: ModelForDownstreamTasks, input_names: List[str]):
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *inputs):
+        outputs = self.model(**dict(zip(self.input_names, inputs)), return_dict=True)
+        return outputs.start_logits, outputs.end_logits, outputs.target_type_logits
+
+
+def export_extractive_model_to_onnx(model: ModelForDownstreamTasks,
+                                    tokenizer: PreTrainedTokenizerBase,
+                                    output_path: str,
+                                    opset_version: int = 14) -> str:
+    """
+    Exports the encoder and extractive head of `model` (start/end and target type logits) to ONNX,
+    with dynamic batch and sequence axes.
+
+    Args:
+        model: Model with its extractive QA head set as task head.
+        tokenizer: Tokenizer of the model, which determines the inputs of the graph.
+        output_path: Path of the ONNX file.
+        opset_version: ONNX opset version.
+
+    Returns:
+        Path of the ONNX file.
+    """
+    input_names = [name for name in tokenizer.model_input_names
+                   if name in ('input_ids', 'attention_mask', 'token_type_ids')]
+    dummy_inputs = tokenizer(["Who walked the dog?"] * 2, ["Bob walks the dog", "Alice walks the cat"],
+                             padding=True, return_tensors='pt')
+
+    sequence_axes = {0: 'batch', 1: 'sequence'}
+    dynamic_axes = {name: sequence_axes for name in input_names}
+    dynamic_axes.update(start_logits=sequence_axes, end_logits=sequence_axes, target_type_logits={0: 'batch'})
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    was_training = model.training
+    model.eval()
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                _ExtractiveQAExportWrapper(model, input_names),
+                tuple(dummy_inputs[name].to(model.device) for name in input_names),
+                output_path,
+                input_names=input_names,
+                output_names=ONNX_OUTPUT_NAMES,
+                dynamic_axes=dynamic_axes,
+                opset_version=opset_version,
+                do_constant_folding=True,
+            )
+    finally:
+        model.train(was_training)
+
+    logger.info(f"Exported {model.__class__.__name__} to {output_path}")
+    return output_path
+
+
+class OnnxExtractiveQAModel:
+    """
+    Runs a graph exported by `export_extractive_model_to_onnx` with ONNX Runtime.
+    Called like the PyTorch model it was exported from, it returns an `ExtractiveQAModelOutput` with CPU tensors.
+    """
+
+    def __init__(self, model_path: str, providers: Optional[List[str]] = None, num_threads: Optional[int] = None):
+        """
+        Args:
+            model_path: Path of the ONNX file.
+            providers: ONNX Runtime execution providers. Defaults to the CPU provider.
+            num_threads: Number of threads per operator. Defaults to ONNX Runtime's default.
+        """
+        try:
+            import onnxruntime
+        except ImportError as ex:
+            raise ImportError("The onnxruntime backend requires onnxruntime, "
+                              "install it with `pip install primeqa[onnx]`") from ex
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            session_options.intra_op_num_threads = num_threads
+
+        self._session = onnxruntime.InferenceSession(model_path, sess_options=session_options,
+                                                     providers=providers or ['CPUExecutionProvider'])
+        self.input_names = [graph_input.name for graph_input in self._session.get_inputs()]
+
+    @property
+    def device(self) -> torch.device:
+        return torch.device('cpu')
+
+    def eval(self) -> 'OnnxExtractiveQAModel':
+        return self
+
+    def __call__(self, **inputs) -> ExtractiveQAModelOutput:
+        feed = {name: np.asarray(inputs[name].cpu() if isinstance(inputs[name], torch.Tensor) else inputs[name],
+                                 dtype=np.int64)
+                for name in self.input_names}
+        start_logits, end_logits, target_type_logits = self._session.run(ONNX_OUTPUT_NAMES, feed)
+        return ExtractiveQAModelOutput(start_logits=torch.from_numpy(start_logits),
+                                       end_logits=torch.from_numpy(end_logits),
+                                       target_type_logits=torch.from_numpy(target_type_logits))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export an extractive reader model to ONNX.')
+    parser.add_argument('--model_name_or_path', required=True, type=str,
+                        help='Name or path of the extractive reader model')
+    parser.add_argument('--output_dir', required=True, type=str,
+                        help=f'Directory to write {ONNX_MODEL_FILENAME}, the tokenizer and the config to')
+    parser.add_argument('--opset_version', default=14, type=int, help='ONNX opset version')
+    args = parser.parse_args()
+
+    config = AutoConfig.from_pretrained(args.model_name_or_path)
+    tokenizer = AutoTokenizer.from_pretrained(args.model_name_or_path, config=config)
+    config.sep_token_id = tokenizer.convert_tokens_to_ids(tokenizer.sep_token)
+    model = ModelForDownstreamTasks.from_config(config, args.model_name_or_path, task_heads=EXTRACTIVE_HEAD)
+    model.set_task_head(next(iter(EXTRACTIVE_HEAD)))
+
+    export_extractive_model_to_onnx(model, tokenizer, os.path.join(args.output_dir, ONNX_MODEL_FILENAME),
+                                    opset_version=args.opset_version)
+    tokenizer.save_pretrained(args.output_dir)
+    config.save_pretrained(args.output_dir)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -80,7 +80,6 @@ class ExtractivePostProcessor(AbstractPostProcessor):
                                  f"and feature ({feat_example_idx})")
             example_features = list(example_features)
             example_id = example_features[0]['example_id']
-            contexts = example["context"]
             example_start_logits = all_start_logits[start_idx:start_idx+len(example_features)]
             example_end_logits = all_end_logits[start_idx:start_idx+len(example_features)]
             example_targettype_preds = all_targettype_logits[start_idx:start_idx+len(example_features)]
@@ -95,105 +94,15 @@ class ExtractivePostProcessor(AbstractPostProcessor):
                 example_query_passage_similarity = None
             start_idx += len(example_features)
 
-            min_null_prediction = None
-            prelim_predictions = []
-
-            for i, input_feature in enumerate(example_features):
+            for input_feature in example_features:
                 if input_feature['example_id'] != example_id:
                     raise ValueError(f"Example id mismatch between example ({example_id}) "
                                  f"and feature ({input_feature['example_id']})")
-                start_logits = example_start_logits[i].tolist()
-                end_logits = example_end_logits[i].tolist()
-                target_type_logits = example_targettype_preds[i].tolist()
-
-                if example_start_stdev is not None and example_end_stdev is not None \
-                        and example_query_passage_similarity is not None:
-                    start_stdev = example_start_stdev[i].tolist()
-                    end_stdev = example_end_stdev[i].tolist()
-                    query_passage_similarity = float(example_query_passage_similarity[i])
-                else:
-                    start_stdev = [0.0] * len(start_logits)
-                    end_stdev = [0.0] * len(end_logits)
-                    query_passage_similarity = 0.0
-                offset_mapping = input_feature["offset_mapping"]
-
-                token_is_max_context = input_feature.get("token_is_max_context", None)
-                # Update minimum null prediction.
-                feature_null_score = start_logits[0] + end_logits[0]
-                if min_null_prediction is None or min_null_prediction["score"] > feature_null_score:
-                    min_null_prediction = {
-                        "offsets": (0, 0),
-                        "score": feature_null_score,
-                        "start_logit": start_logits[0],
-                        "end_logit": end_logits[0],
-                    }
-
-                start_indexes = np.argsort(start_logits[:len(offset_mapping)])[-1 : -self._n_best_size - 1 : -1].tolist()
-                end_indexes = np.argsort(end_logits[:len(offset_mapping)])[-1 : -self._n_best_size - 1 : -1].tolist()
-                for start_index in start_indexes:
-                    for end_index in end_indexes:
-                    # Don't consider out-of-scope answers, either because the indices are out of bounds or correspond
-                    # to part of the input_ids that are not in the context.
-                        if (
-                            start_index >= len(offset_mapping)
-                            or end_index >= len(offset_mapping)
-                            or offset_mapping[start_index] is None
-                            or len(offset_mapping[start_index]) < 2
-                            or offset_mapping[end_index] is None
-                            or len(offset_mapping[end_index]) < 2
-                        ):
-                            continue
-                        # Don't consider answers with a length that is either < 0 or > max_answer_length.
-                        if end_index < start_index or end_index - start_index + 1 > self._max_answer_length:
-                            continue
-                        # Don't consider answer that don't have the maximum context available (if such information is
-                        # provided).
-                        if token_is_max_context is not None and not token_is_max_context.get(str(start_index), False):
-                            continue
-
-                        start_position = offset_mapping[start_index][0]
-                        end_position = offset_mapping[end_index][1]
-
-                        if self._single_context_multiple_passages:
-                            passage_candidates = example['passage_candidates']
-                            for context_idx in range(len(passage_candidates['start_positions'])):
-                                passage_start_position = passage_candidates['start_positions'][context_idx]
-                                passage_end_position = passage_candidates['end_positions'][context_idx]
-                                if passage_start_position <= start_position <= end_position <= passage_end_position:
-                                    break
-                            else:
-                                context_idx = -1
-                            passage_text = contexts[0]
-                        else:
-                            context_idx = input_feature['context_idx']
-                            passage_text = contexts[context_idx]
-
-                        span_answer_text = passage_text[offset_mapping[start_index][0]:offset_mapping[end_index][1]]
-                        span_answer_score = self._score_calculator(start_logits[start_index] + end_logits[end_index],
-                                                feature_null_score, target_type_logits)
-                        prelim_predictions.append(
-                        {
-                            'example_id': input_feature['example_id'],
-                            'cls_score': feature_null_score,
-                            'start_logit': start_logits[start_index],
-                            'end_logit': end_logits[end_index],
-                            'span_answer': {
-                                "start_position": start_position,
-                                "end_position": end_position,
-                            },
-                            'span_answer_score' : span_answer_score,
-                            'start_index': start_index,
-                            'end_index':   end_index,
-                            'passage_index' : context_idx,
-                            'target_type_logits': target_type_logits,
-                            'span_answer_text': span_answer_text,
-                            'yes_no_answer': int(TargetType.NO_ANSWER),
-                            'start_stdev': start_stdev[start_index],
-                            'end_stdev': end_stdev[end_index],
-                            'query_passage_similarity': query_passage_similarity
-                        }
-                    )
-            example_predictions = sorted(prelim_predictions, key=itemgetter('span_answer_score'), reverse=True)[:self._k]
+
+            example_predictions = self._top_k_span_predictions(example, example_features,
+                                                               example_start_logits, example_end_logits,
+                                                               example_targettype_preds, example_start_stdev,
+                                                               example_end_stdev, example_query_passage_similarity)
             all_predictions[example_id] = example_predictions
 
             # In the very rare edge case we have not a single non-null prediction, we create a fake prediction to avoid
@@ -239,7 +148,147 @@ class ExtractivePostProcessor(AbstractPostProcessor):
                     example_predictions[i]["confidence_score"] = example_predictions[i]["normalized_span_answer_score"]
 
         return all_predictions
-        
+
+    def _top_k_span_predictions(self, example, example_features: List[Dict[str, Any]],
+                                start_logits: np.ndarray, end_logits: np.ndarray, target_type_logits: np.ndarray,
+                                start_stdev: np.ndarray = None, end_stdev: np.ndarray = None,
+                                query_passage_similarity: np.ndarray = None) -> List[Dict[str, Any]]:
+        """
+        Decodes the top-k span answers of an example from the stacked logits of all its features.
+
+        The n-best start and end indexes of every feature are paired by broadcasting, invalid pairs (outside the
+        context, reversed, longer than max answer length or without max context) are masked out, and prediction
+        dicts are only built for the final k answers. The answers and their order are the same as when scoring
+        every pair of n-best indexes of every feature one by one, up to ties between logits.
+
+        Args:
+            example: The example.
+            example_features: Its features.
+            start_logits: Start logits of the features, shape (num_features, seq_len).
+            end_logits: End logits of the features, shape (num_features, seq_len).
+            target_type_logits: Target type logits of the features, shape (num_features, num_target_types).
+            start_stdev: Optional standard deviations of the start logits, shape (num_features, seq_len).
+            end_stdev: Optional standard deviations of the end logits, shape (num_features, seq_len).
+            query_passage_similarity: Optional query passage similarities, shape (num_features,).
+
+        Returns:
+            Top-k predictions, best first.
+        """
+        num_features, seq_len = start_logits.shape
+        # Scores are computed in float64 to match the Python float arithmetic on logits converted with `tolist()`
+        start_logits = start_logits.astype(np.float64)
+        end_logits = end_logits.astype(np.float64)
+        feature_target_type_logits = [np.asarray(logits, dtype=np.float64).tolist() for logits in target_type_logits]
+        num_target_types = min(len(logits) for logits in feature_target_type_logits)
+        target_type_logits = np.array([logits[:num_target_types] for logits in feature_target_type_logits])
+
+        in_context = np.arange(seq_len) < np.array([len(feature["offset_mapping"]) for feature in example_features])[:, None]
+        start_indexes = self._n_best_indexes(np.where(in_context, start_logits, -np.inf))
+        end_indexes = self._n_best_indexes(np.where(in_context, end_logits, -np.inf))
+
+        # Only the n-best indexes are looked up in the offset mappings and max context maps
+        valid_starts = np.zeros(start_indexes.shape, dtype=bool)
+        valid_ends = np.zeros(end_indexes.shape, dtype=bool)
+        for i, feature in enumerate(example_features):
+            offset_mapping = feature["offset_mapping"]
+            has_offsets = [index < len(offset_mapping) and offset_mapping[index] is not None
+                           and len(offset_mapping[index]) >= 2
+                           for index in np.concatenate((start_indexes[i], end_indexes[i])).tolist()]
+            valid_starts[i] = has_offsets[:start_indexes.shape[1]]
+            valid_ends[i] = has_offsets[start_indexes.shape[1]:]
+
+            token_is_max_context = feature.get("token_is_max_context", None)
+            if token_is_max_context is not None:
+                valid_starts[i] &= [bool(token_is_max_context.get(str(start_index), False))
+                                    for start_index in start_indexes[i].tolist()]
+
+        # (num_features, n_best, n_best) masks and scores of all start/end pairs
+        lengths = end_indexes[:, None, :] - start_indexes[:, :, None] + 1
+        valid = valid_starts[:, :, None] & valid_ends[:, None, :] & (lengths >= 1) & (lengths <= self._max_answer_length)
+
+        cls_scores = start_logits[:, 0] + end_logits[:, 0]
+        span_scores = np.take_along_axis(start_logits, start_indexes, axis=1)[:, :, None] \
+            + np.take_along_axis(end_logits, end_indexes, axis=1)[:, None, :]
+        # The scorers index the target type logits by target type, so that axis goes first to broadcast over features
+        scores = self._score_calculator(span_scores, cls_scores[:, None, None], target_type_logits.T[:, :, None, None])
+        scores = np.broadcast_to(scores, valid.shape)
+
+        candidates = np.flatnonzero(valid)
+        candidates = candidates[self._top_k_indexes(scores.reshape(-1)[candidates], self._k)]
+
+        contexts = example["context"]
+        predictions = []
+        for feature_idx, start_rank, end_rank in zip(*np.unravel_index(candidates, valid.shape)):
+            input_feature = example_features[feature_idx]
+            offset_mapping = input_feature["offset_mapping"]
+            start_index = int(start_indexes[feature_idx, start_rank])
+            end_index = int(end_indexes[feature_idx, end_rank])
+            start_position = offset_mapping[start_index][0]
+            end_position = offset_mapping[end_index][1]
+
+            if self._single_context_multiple_passages:
+                passage_candidates = example['passage_candidates']
+                for context_idx in range(len(passage_candidates['start_positions'])):
+                    passage_start_position = passage_candidates['start_positions'][context_idx]
+                    passage_end_position = passage_candidates['end_positions'][context_idx]
+                    if passage_start_position <= start_position <= end_position <= passage_end_position:
+                        break
+                else:
+                    context_idx = -1
+                passage_text = contexts[0]
+            else:
+                context_idx = input_feature['context_idx']
+                passage_text = contexts[context_idx]
+
+            predictions.append(
+                {
+                    'example_id': input_feature['example_id'],
+                    'cls_score': float(cls_scores[feature_idx]),
+                    'start_logit': float(start_logits[feature_idx, start_index]),
+                    'end_logit': float(end_logits[feature_idx, end_index]),
+                    'span_answer': {
+                        "start_position": start_position,
+                        "end_position": end_position,
+                    },
+                    'span_answer_score': float(scores[feature_idx, start_rank, end_rank]),
+                    'start_index': start_index,
+                    'end_index': end_index,
+                    'passage_index': context_idx,
+                    'target_type_logits': feature_target_type_logits[feature_idx],
+                    'span_answer_text': passage_text[start_position:end_position],
+                    'yes_no_answer': int(TargetType.NO_ANSWER),
+                    'start_stdev': float(start_stdev[feature_idx, start_index]) if start_stdev is not None else 0.0,
+                    'end_stdev': float(end_stdev[feature_idx, end_index]) if end_stdev is not None else 0.0,
+                    'query_passage_similarity': float(query_passage_similarity[feature_idx])
+                    if query_passage_similarity is not None else 0.0
+                }
+            )
+
+        return predictions
+
+    def _n_best_indexes(self, logits: np.ndarray) -> np.ndarray:
+        """
+        Indexes of the `n_best_size` largest logits of each row, largest first (the later index first on ties).
+        """
+        n_best_size = min(self._n_best_size, logits.shape[1])
+        indexes = np.argpartition(-logits, n_best_size - 1, axis=1)[:, :n_best_size]
+        order = np.lexsort((-indexes, -np.take_along_axis(logits, indexes, axis=1)), axis=1)
+        return np.take_along_axis(indexes, order, axis=1)
+
+    @staticmethod
+    def _top_k_indexes(scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        Indexes of the `k` largest scores, largest first (the earlier index first on ties, like a stable sort).
+        """
+        if len(scores) > k:
+            threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+            above = np.flatnonzero(scores > threshold)
+            ties = np.flatnonzero(scores == threshold)[:k - len(above)]
+            selected = np.sort(np.concatenate((above, ties)))
+        else:
+            selected = np.arange(len(scores))
+        return selected[np.argsort(-scores[selected], kind='stable')]
+
     def prepare_examples_as_references(self, examples: Dataset) -> List[Dict[str, Any]]:
         references = []
         for example_idx in range(examples.num_rows):
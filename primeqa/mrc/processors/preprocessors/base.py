@@ -77,6 +77,35 @@ class BasePreProcessor(AbstractPreProcessor):
     def process_eval(self, examples: Dataset) -> Tuple[Dataset, Dataset]:
         return self._process(examples, is_train=False)
 
+    def process_eval_in_memory(self, examples: Dict[str, list]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Same as `process_eval` for examples already in the schema expected after `adapt_dataset`, but without
+        building `Dataset`s (no Arrow serialization, fingerprinting or cache files), for small batches of
+        examples at serving time.
+
+        Args:
+            examples: Examples as columns: 'question', 'context' and, optionally, 'example_id'.
+
+        Returns:
+            Tuple of examples and features, as lists of dicts.
+        """
+        examples = dict(examples)
+        n_examples = len(examples['question'])
+        if n_examples == 0:
+            raise ValueError("No examples to process")
+        if 'example_id' not in examples:
+            examples = self._insert_example_ids(examples)
+        if 'language' not in examples:
+            examples['language'] = ['UNKNOWN'] * n_examples
+
+        tokenized_examples = self._process_batch(examples, list(range(n_examples)), is_train=False)
+
+        columns = list(tokenized_examples.keys())
+        n_features = len(tokenized_examples['input_ids'])
+        features = [{column: tokenized_examples[column][i] for column in columns} for i in range(n_features)]
+        examples = [{column: values[i] for column, values in examples.items()} for i in range(n_examples)]
+        return examples, features
+
     def _process(self, examples: Dataset, is_train: bool) -> Tuple[Dataset, Dataset]:
         """
         Provides implementation for public processing methods.
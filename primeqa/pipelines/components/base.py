@@ -1,6 +1,15 @@
-from typing import Union, List, Dict
+from typing import Any, Callable, Union, List, Dict
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
+import logging
+import os
+import threading
+import time
+
+from primeqa.pipelines.components.cache import LRUCache
+
+# Guards the lazy creation of retriever caches
+_CACHE_LOCK = threading.Lock()
 
 
 @dataclass(init=False, repr=False, eq=False)
@@ -54,7 +63,16 @@ class IndexerComponent(Component):
     @abstractmethod
     def index(self, collection: Union[List[dict], str], *args, **kwargs):
         pass
-    
+
+    def get_num_indexed_documents(self) -> Union[int, None]:
+        """
+        Number of documents already added to the index while `index` is running, used to report progress.
+
+        Returns:
+            Union[int, None]: number of documents, or None if this indexer cannot tell
+        """
+        return None
+
     @abstractmethod    
     def get_engine_type() -> str:
         """
@@ -87,6 +105,25 @@ class RetrieverComponent(Component):
             "name": "The corpus file split in paragraphs",
         },
     )
+    cache_size: int = field(
+        default=1024,
+        metadata={
+            "name": "Cache size",
+            "description": "Maximum number of cached queries (0 disables caching)",
+            "exclude_from_hash": True,
+        },
+    )
+    cache_ttl: float = field(
+        default=None,
+        metadata={
+            "name": "Cache time-to-live",
+            "description": "Seconds after which cached queries expire (None never expires)",
+            "exclude_from_hash": True,
+        },
+    )
+
+    # Minimum number of seconds between two checks of the index version
+    INDEX_VERSION_CHECK_INTERVAL = 1.0
 
     @abstractmethod
     def __hash__(self) -> int:
@@ -104,7 +141,183 @@ class RetrieverComponent(Component):
     @abstractmethod
     def retrieve(self, input_texts: List[str], *args, **kwargs):
         pass
-    
+
+    def set_caches(self, query_cache=None, result_cache=None):
+        """
+        Plug in the caches used by this retriever. Each defaults to an `LRUCache` bounded by
+        `cache_size` and `cache_ttl`.
+
+        Args:
+            query_cache (optional): Cache of normalized query text to query encoding.
+            result_cache (optional): Cache of (normalized query text, k, search parameters, index version)
+                to ranked (document id, score) pairs.
+        """
+        self._query_cache = (
+            query_cache
+            if query_cache is not None
+            else LRUCache(self.cache_size, self.cache_ttl)
+        )
+        self._result_cache = (
+            result_cache
+            if result_cache is not None
+            else LRUCache(self.cache_size, self.cache_ttl)
+        )
+        self._index_version = self.get_index_version()
+        self._index_version_checked_at = time.monotonic()
+        self._index_reload_lock = threading.Lock()
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Hit and miss counters of the query encoding and result caches.
+
+        Returns:
+            Dict[str, Dict[str, int]]: "hits", "misses" and "size" of the "queries" and "results" caches
+        """
+        self._get_caches()
+        return {
+            "queries": self._query_cache.stats(),
+            "results": self._result_cache.stats(),
+        }
+
+    def clear_cache(self):
+        self._get_caches()
+        self._query_cache.clear()
+        self._result_cache.clear()
+
+    def normalize_query(self, text: str) -> str:
+        """
+        Normalizes query text into a cache key, so that near-identical queries share cache entries.
+        Defaults to collapsing whitespace.
+        """
+        return " ".join(str(text).split())
+
+    def get_index_version(self):
+        """
+        Version of the index on disk. When it changes, the index is reloaded (see `reload_index`) and
+        the cached results are cleared. Defaults to the latest modification time of the index directory
+        and its entries.
+
+        Returns:
+            Hashable: index version, or None if the index directory is not accessible
+        """
+        index_path = os.path.join(self.index_root, self.index_name)
+        try:
+            with os.scandir(index_path) as entries:
+                return max(
+                    [os.stat(index_path).st_mtime_ns]
+                    + [entry.stat().st_mtime_ns for entry in entries]
+                )
+        except OSError:
+            return None
+
+    def reload_index(self):
+        """
+        Reloads the index after it changed on disk. Defaults to loading the retriever again.
+        """
+        self.load()
+
+    def _get_caches(self):
+        with _CACHE_LOCK:
+            if getattr(self, "_result_cache", None) is None:
+                self.set_caches()
+
+            now = time.monotonic()
+            is_check_due = (
+                now - self._index_version_checked_at
+                >= self.INDEX_VERSION_CHECK_INTERVAL
+            )
+            if is_check_due:
+                self._index_version_checked_at = now
+
+        if is_check_due:
+            index_version = self.get_index_version()
+            if index_version != self._index_version:
+                self._update_index_version(index_version)
+
+        return self._query_cache, self._result_cache
+
+    def _update_index_version(self, index_version):
+        # Results keep being cached under the old version until the new index is loaded. Query encodings do
+        # not depend on the index, so they are kept.
+        with self._index_reload_lock:
+            if index_version == self._index_version:
+                return
+
+            try:
+                self.reload_index()
+            except Exception:
+                # E.g., the index is being rebuilt: keep serving the loaded one and retry on the next check
+                logging.getLogger(self.__class__.__name__).warning(
+                    "Failed to reload index %s", self.index_name, exc_info=True
+                )
+                return
+
+            self._index_version = index_version
+            self._result_cache.clear()
+
+    def _cached_retrieve(
+        self,
+        input_texts: List[str],
+        k: int,
+        retrieve_fn: Callable[[List[str]], List[Any]],
+    ) -> List[Any]:
+        """
+        Serves `input_texts` from the result cache, calling `retrieve_fn` once for the (distinct) queries
+        that miss and caching their results.
+        """
+        _, result_cache = self._get_caches()
+
+        keys = [
+            (self.normalize_query(text), k, hash(self), self._index_version)
+            for text in input_texts
+        ]
+        results = [result_cache.get(key) for key in keys]
+
+        missing = {}
+        for key, text, result in zip(keys, input_texts, results):
+            if result is None:
+                missing.setdefault(key, text)
+
+        if missing:
+            for key, result in zip(missing, retrieve_fn(list(missing.values()))):
+                result_cache.put(key, result)
+                missing[key] = result
+
+            results = [
+                result if result is not None else missing[key]
+                for key, result in zip(keys, results)
+            ]
+
+        return [list(result) for result in results]
+
+    def _cached_query_encodings(
+        self, input_texts: List[str], encode_fn: Callable[[List[str]], List[Any]]
+    ) -> List[Any]:
+        """
+        Serves query encodings from the query cache, calling `encode_fn` once for the (distinct) queries that miss.
+        """
+        query_cache, _ = self._get_caches()
+
+        keys = [self.normalize_query(text) for text in input_texts]
+        encodings = [query_cache.get(key) for key in keys]
+
+        missing = {}
+        for key, text, encoding in zip(keys, input_texts, encodings):
+            if encoding is None:
+                missing.setdefault(key, text)
+
+        if missing:
+            for key, encoding in zip(missing, encode_fn(list(missing.values()))):
+                query_cache.put(key, encoding)
+                missing[key] = encoding
+
+            encodings = [
+                encoding if encoding is not None else missing[key]
+                for key, encoding in zip(keys, encodings)
+            ]
+
+        return encodings
+
     @abstractmethod
     def get_engine_type() -> str:
         """
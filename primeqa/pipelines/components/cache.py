@@ -0,0 +1,100 @@
+from typing import Any, Callable, Dict, Hashable, Optional
+from collections import OrderedDict
+import threading
+import time
+import weakref
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache with an optional time-to-live, which counts its hits and misses.
+
+    Any object with the same `get`, `put`, `clear` and `stats` methods can be plugged in its place
+    (see `RetrieverComponent.set_caches`).
+
+    Args:
+        maxsize (int): Maximum number of entries. 0 disables the cache.
+        ttl (float, optional): Seconds after which an entry expires. Defaults to None (never expires).
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value, expires_at = self._entries.get(key, (self._MISSING, None))
+
+            if value is self._MISSING or (
+                expires_at is not None and expires_at < time.monotonic()
+            ):
+                if value is not self._MISSING:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SharedResources:
+    """
+    Thread-safe registry of resources shared between component instances, e.g., model weights used by readers that
+    only differ in post-processing parameters.
+
+    Resources are weakly referenced: one is released once no instance holds it anymore. Concurrent requests for
+    the same missing resource load it once.
+    """
+
+    def __init__(self):
+        self._resources = weakref.WeakValueDictionary()
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, load_fn: Callable[[], Any]) -> Any:
+        """
+        Returns the resource for `key`, calling `load_fn` to load it if no instance holds it.
+        The resource must support weak references (e.g., not a tuple or a dict).
+        """
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            resource = self._resources.get(key)
+            if resource is None:
+                resource = load_fn()
+                self._resources[key] = resource
+
+        return resource
+
+    def __len__(self) -> int:
+        return len(self._resources)
@@ -1,6 +1,8 @@
 from typing import Union, List
 from dataclasses import dataclass, field
+import glob
 import json
+import os
 
 from primeqa.pipelines.components.base import IndexerComponent
 from primeqa.ir.dense.colbert_top.colbert.infra.config import ColBERTConfig
@@ -25,6 +27,8 @@ class ColBERTIndexer(IndexerComponent):
         nbits (int, optional): Number of bits. Defaults to 1.
         kmeans_niters (int, optional): Number of iterations (kmeans). Defaults to 4.
         num_partitions_max (int, optional): Maximum partions size. Defaults to 10000000.
+        index_format (str, optional): "torch" or "mmap" (flat arrays memory-mapped by searchers). Defaults to "torch".
+        compress_ivf (bool, optional): If set to "True", stores the posting lists delta + varint encoded. Defaults to False.
 
     Important:
     1. Each field has metadata property which can carry additional information for other downstream usages.
@@ -100,6 +104,14 @@ class ColBERTIndexer(IndexerComponent):
             "api_support": True,
         },
     )
+    index_format: str = field(
+        default="torch",
+        metadata={"name": "Index format", "options": ["torch", "mmap"]},
+    )
+    compress_ivf: bool = field(
+        default=False,
+        metadata={"name": "Compress posting lists"},
+    )
 
     def __post_init__(self):
         self._config = ColBERTConfig(
@@ -116,6 +128,8 @@ class ColBERTIndexer(IndexerComponent):
             nbits=self.nbits,
             kmeans_niters=self.kmeans_niters,
             num_partitions_max=self.num_partitions_max,
+            index_format=self.index_format,
+            compress_ivf=self.compress_ivf,
         )
 
         # Placeholder variables
@@ -140,5 +154,20 @@ class ColBERTIndexer(IndexerComponent):
             overwrite="overwrite" in kwargs and kwargs["overwrite"],
         )
     
+    def get_num_indexed_documents(self) -> Union[int, None]:
+        # Each encoded chunk is saved with a `<chunk_idx>.metadata.json` file holding its number of passages
+        num_documents = 0
+        for metadata_path in glob.glob(
+            os.path.join(self._config.index_path_, "*.metadata.json")
+        ):
+            try:
+                with open(metadata_path, "r") as metadata_file:
+                    num_documents += json.load(metadata_file)["num_passages"]
+            except (OSError, ValueError, KeyError):
+                # Chunk metadata still being written
+                continue
+
+        return num_documents
+
     def get_engine_type(self):
         return "ColBERT"
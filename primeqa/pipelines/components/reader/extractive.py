@@ -1,17 +1,43 @@
-from typing import List, Dict
+from typing import List, Dict, Tuple, Union
 from dataclasses import dataclass, field
+import copy
 import json
+import os
 
-from transformers import AutoConfig, AutoTokenizer, DataCollatorWithPadding
-from datasets import Dataset
+import numpy as np
+import torch
+from transformers import AutoConfig, AutoTokenizer
 
 from primeqa.pipelines.components.base import ReaderComponent
+from primeqa.pipelines.components.cache import SharedResources
 from primeqa.mrc.models.heads.extractive import EXTRACTIVE_HEAD
 from primeqa.mrc.models.task_model import ModelForDownstreamTasks
+from primeqa.mrc.models.onnx_model import ONNX_MODEL_FILENAME, OnnxExtractiveQAModel
 from primeqa.mrc.processors.preprocessors.base import BasePreProcessor
 from primeqa.mrc.processors.postprocessors.extractive import ExtractivePostProcessor
 from primeqa.mrc.processors.postprocessors.scorers import SupportedSpanScorers
-from primeqa.mrc.trainers.mrc import MRCTrainer
+from primeqa.util.transformers_utils.quantization import quantize_dynamic_int8, output_similarity
+
+
+# Model weights, shared by readers that only differ in pre/post-processing parameters. Each reader copies the
+# tokenizer, since fast tokenizers keep the truncation and stride of the last call in their (shared) backend.
+_SHARED_WEIGHTS = SharedResources()
+
+# Questions and contexts on which a quantized model is checked against the fp32 one
+QUANTIZATION_CHECK_EXAMPLES = {
+    "Who walked the dog?": "Bob walked the dog in the park after dinner, while Alice stayed home with the cat.",
+    "When did the first world war end?": "The First World War ended with the armistice of 11 November 1918.",
+    "What is the capital of France?": "Paris is the capital and most populous city of France.",
+    "How many moons does Jupiter have?": "Jupiter has 95 moons with confirmed orbits as of 2023.",
+}
+QUANTIZATION_MIN_SIMILARITY = 0.95
+
+
+@dataclass
+class _ReaderWeights:
+    config: AutoConfig
+    tokenizer: AutoTokenizer
+    model: Union[ModelForDownstreamTasks, OnnxExtractiveQAModel]
 
 
 @dataclass
@@ -28,6 +54,11 @@ class ExtractiveReader(ReaderComponent):
         max_answer_length (int, optional): Maximum answer length. Defaults to 32.
         scorer_type (str, optional): Scoring algorithm. Defaults to "weighted_sum_target_type_and_score_diff".
         min_score_threshold: (float, optional): Minimum score threshold. Defaults to None.
+        batch_size (int, optional): Maximum number of features (question and context windows) per forward pass. Defaults to 8.
+        backend (str, optional): "pytorch" or "onnxruntime", which runs the ONNX graph in the `model` directory
+            exported with `python -m primeqa.mrc.models.onnx_model`. Defaults to "pytorch".
+        quantize (bool, optional): If set to "True", runs the Linear layers of the model in int8 on CPU (pytorch backend only),
+            unless its logits on sample inputs differ too much from the fp32 ones. Defaults to False.
 
     Important:
         1. Each field has metadata property which can carry additional information for other downstream usages.
@@ -112,14 +143,38 @@ class ExtractiveReader(ReaderComponent):
             "exclude_from_hash": True,
         },
     )
+    batch_size: int = field(
+        default=8,
+        metadata={
+            "name": "Batch size",
+            "description": "Maximum number of features (question and context windows) per forward pass",
+            "range": [1, 64, 1],
+        },
+    )
+    backend: str = field(
+        default="pytorch",
+        metadata={
+            "name": "Inference backend",
+            "description": 'With "onnxruntime", model must be a directory exported with primeqa.mrc.models.onnx_model',
+            "options": ["pytorch", "onnxruntime"],
+        },
+    )
+    quantize: bool = field(
+        default=False,
+        metadata={
+            "name": "Quantize to int8",
+            "description": "Run the Linear layers of the model in int8 on CPU (pytorch backend only)",
+            "options": [True, False],
+        },
+    )
 
     def __post_init__(self):
         # Placeholder variables
+        self._weights = None
         self._loaded_model = None
         self._tokenizer = None
         self._preprocessor = None
         self._scorer_type_as_enum = None
-        self._data_collector = None
 
     def __hash__(self) -> int:
         # Step 1: Identify all fields to be included in the hash
@@ -135,27 +190,54 @@ class ExtractiveReader(ReaderComponent):
             f"{self.__class__.__name__}::{json.dumps({k: v for k, v in vars(self).items() if k in hashable_fields }, sort_keys=True)}"
         )
 
-    def load(self, *args, **kwargs):
+    def _load_weights(self) -> _ReaderWeights:
         task_heads = EXTRACTIVE_HEAD
         # Load configuration for model
         config = AutoConfig.from_pretrained(self.model)
 
         # Initialize tokenizer
-        self._tokenizer = AutoTokenizer.from_pretrained(
+        tokenizer = AutoTokenizer.from_pretrained(
             self.model,
             use_fast=self.use_fast,
             config=config,
         )
 
-        config.sep_token_id = self._tokenizer.convert_tokens_to_ids(
-            self._tokenizer.sep_token
-        )
-        self._loaded_model = ModelForDownstreamTasks.from_config(
-            config,
-            self.model,
-            task_heads=task_heads,
+        config.sep_token_id = tokenizer.convert_tokens_to_ids(tokenizer.sep_token)
+        if self.quantize and self.backend != "pytorch":
+            raise ValueError(f"Quantization is not supported with the {self.backend} backend")
+
+        if self.backend == "onnxruntime":
+            model = OnnxExtractiveQAModel(os.path.join(self.model, ONNX_MODEL_FILENAME))
+        elif self.backend == "pytorch":
+            model = ModelForDownstreamTasks.from_config(
+                config,
+                self.model,
+                task_heads=task_heads,
+            )
+            model.set_task_head(next(iter(task_heads)))
+            # int8 Linear layers only run on CPU
+            model.to("cuda" if torch.cuda.is_available() and not self.quantize else "cpu")
+            model.eval()
+            if self.quantize:
+                model = quantize_dynamic_int8(
+                    model,
+                    accuracy_check=lambda fp32_model, int8_model: self._logits_similarity(
+                        tokenizer, fp32_model, int8_model
+                    ),
+                    min_score=QUANTIZATION_MIN_SIMILARITY,
+                )
+        else:
+            raise ValueError(f"Unsupported backend: {self.backend}")
+
+        return _ReaderWeights(config=config, tokenizer=tokenizer, model=model)
+
+    def load(self, *args, **kwargs):
+        # Share model weights with other readers using the same model
+        self._weights = _SHARED_WEIGHTS.get(
+            (self.model, self.use_fast, self.backend, self.quantize), self._load_weights
         )
-        self._loaded_model.set_task_head(next(iter(task_heads)))
+        self._tokenizer = copy.deepcopy(self._weights.tokenizer)
+        self._loaded_model = self._weights.model
 
         # Initialize preprocessor
         self._preprocessor = BasePreProcessor(
@@ -185,8 +267,78 @@ class ExtractiveReader(ReaderComponent):
         else:
             raise ValueError(f"Unsupported scorer type: {self.scorer_type}")
 
-        # Configure data collector
-        self._data_collector = DataCollatorWithPadding(self._tokenizer)
+    @staticmethod
+    def _logits_similarity(tokenizer, fp32_model, int8_model) -> float:
+        """
+        Mean cosine similarity between the start and end logits of the fp32 and int8 models on sample inputs.
+        """
+        inputs = tokenizer(
+            list(QUANTIZATION_CHECK_EXAMPLES.keys()),
+            list(QUANTIZATION_CHECK_EXAMPLES.values()),
+            padding=True,
+            return_tensors="pt",
+        )
+        fp32_outputs, int8_outputs = fp32_model(**inputs), int8_model(**inputs)
+        return min(
+            output_similarity(fp32_outputs.start_logits, int8_outputs.start_logits),
+            output_similarity(fp32_outputs.end_logits, int8_outputs.end_logits),
+        )
+
+    def _run_model(
+        self, features: List[Dict]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Runs the model over features in batches of features of similar lengths, to limit padding.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: start, end and target type logits, in the order of `features`.
+                Start and end logits past the length of a feature are set to -100, as in `Trainer` predictions.
+        """
+        model_input_names = [
+            name for name in self._tokenizer.model_input_names if name in features[0]
+        ]
+        lengths = np.array([len(feature["input_ids"]) for feature in features])
+        order = np.argsort(-lengths, kind="stable")
+        device = self._loaded_model.device
+
+        start_logits = np.full((len(features), lengths.max()), -100, dtype=np.float32)
+        end_logits = np.full((len(features), lengths.max()), -100, dtype=np.float32)
+        target_type_logits = None
+        with torch.inference_mode():
+            for batch_start in range(0, len(features), self.batch_size):
+                batch_indexes = order[batch_start : batch_start + self.batch_size]
+                batch = self._tokenizer.pad(
+                    [
+                        {name: features[idx][name] for name in model_input_names}
+                        for idx in batch_indexes
+                    ],
+                    return_tensors="pt",
+                )
+                outputs = self._loaded_model(
+                    **{name: tensor.to(device) for name, tensor in batch.items()}
+                )
+
+                batch_start_logits = outputs.start_logits.float().cpu().numpy()
+                batch_end_logits = outputs.end_logits.float().cpu().numpy()
+                batch_target_type_logits = (
+                    outputs.target_type_logits.float().cpu().numpy()
+                )
+                if target_type_logits is None:
+                    target_type_logits = np.empty(
+                        (len(features), batch_target_type_logits.shape[-1]),
+                        dtype=np.float32,
+                    )
+
+                for batch_idx, idx in enumerate(batch_indexes):
+                    start_logits[idx, : lengths[idx]] = batch_start_logits[
+                        batch_idx, : lengths[idx]
+                    ]
+                    end_logits[idx, : lengths[idx]] = batch_end_logits[
+                        batch_idx, : lengths[idx]
+                    ]
+                    target_type_logits[idx] = batch_target_type_logits[batch_idx]
+
+        return start_logits, end_logits, target_type_logits
 
     def predict(
         self,
@@ -223,15 +375,7 @@ class ExtractiveReader(ReaderComponent):
             scorer_type=self._scorer_type_as_enum,
         )
 
-        # Step 3: Load trainer
-        trainer = MRCTrainer(
-            model=self._loaded_model,
-            tokenizer=self._tokenizer,
-            data_collator=self._data_collector,
-            post_process_function=postprocessor.process,
-        )
-
-        # Step 4: Prepare dataset from input texts and contexts
+        # Step 3: Prepare examples and features from input texts and contexts
         assert len(questions) == len(contexts)
 
         if example_ids is None:
@@ -239,23 +383,27 @@ class ExtractiveReader(ReaderComponent):
 
         assert len(example_ids) == len(questions)
 
-        examples_dict = dict(
-            question=questions, context=contexts, example_id=example_ids
+        # Step 3.a: Questions without contexts have no features, and no predictions
+        predictions = {example_id: [] for example_id in example_ids}
+        readable = [idx for idx, context in enumerate(contexts) if context]
+        if not readable:
+            return predictions
+
+        examples, features = self._preprocessor.process_eval_in_memory(
+            dict(
+                question=[questions[idx] for idx in readable],
+                context=[contexts[idx] for idx in readable],
+                example_id=[example_ids[idx] for idx in readable],
+            )
         )
 
-        eval_examples = Dataset.from_dict(examples_dict)
-
-        eval_examples = Dataset.from_dict(examples_dict)
-
-        eval_examples = Dataset.from_dict(examples_dict)
-
-        eval_examples, eval_dataset = self._preprocessor.process_eval(eval_examples)
+        # Step 4: Run model and post-process its logits
+        raw_predictions_per_example = postprocessor.process(
+            examples, features, self._run_model(features)
+        )
 
-        # Step 5: Run predict
-        predictions = {}
-        for example_id, raw_predictions in trainer.predict(
-            eval_dataset=eval_dataset, eval_examples=eval_examples
-        ).items():
+        # Step 5: Filter and format predictions
+        for example_id, raw_predictions in raw_predictions_per_example.items():
             predictions[example_id] = []
             for raw_prediction in raw_predictions:
                 if (
@@ -1,11 +1,18 @@
 from typing import List
 from dataclasses import dataclass, field
+import copy
 import json
 
+import torch
+
 from primeqa.pipelines.components.base import RetrieverComponent
+from primeqa.pipelines.components.cache import SharedResources
 from primeqa.ir.dense.colbert_top.colbert.infra.config import ColBERTConfig
 from primeqa.ir.dense.colbert_top.colbert.searcher import Searcher
 
+# Searchers (model and index), shared by retrievers that only differ in search parameters, per index version
+_SHARED_SEARCHERS = SharedResources()
+
 
 @dataclass
 class ColBERTRetriever(RetrieverComponent):
@@ -20,6 +27,8 @@ class ColBERTRetriever(RetrieverComponent):
         ncells (int, optional): Number of cells. Defaults to None.
         centroid_score_threshold (float, optional): Centroid score threshold. Defaults to None.
         ndocs (int, optional): Number of documents in PLAID Stage 1. Defaults to None.
+        cache_size (int, optional): Maximum number of cached query encodings and rankings (0 disables caching). Defaults to 1024.
+        cache_ttl (float, optional): Seconds after which cached entries expire. Defaults to None (never).
 
     Important:
     1. Each field has metadata property which can carry additional information for other downstream usages.
@@ -87,6 +96,7 @@ class ColBERTRetriever(RetrieverComponent):
 
         # Placeholder variables
         self._searcher = None
+        self._shared_searcher = None
 
     def __hash__(self) -> int:
         # Step 1: Identify all fields to be included in the hash
@@ -102,14 +112,39 @@ class ColBERTRetriever(RetrieverComponent):
             f"{self.__class__.__name__}::{json.dumps({k: v for k, v in vars(self).items() if k in hashable_fields}, sort_keys=True)}"
         )
 
-    def load(self, *args, **kwargs):
-        self._searcher = Searcher(
+    def _load_searcher(self) -> Searcher:
+        return Searcher(
             self.index_name,
             checkpoint=self.checkpoint,
             collection=self.collection,
-            config=self._config,
+            config=ColBERTConfig(
+                index_root=self.index_root,
+                index_name=self.index_name,
+                index_path=f"{self.index_root}/{self.index_name}",
+            ),
         )
 
+    def load(self, *args, **kwargs):
+        # Retrievers loaded after the index changed on disk get a new searcher
+        searcher = _SHARED_SEARCHERS.get(
+            (
+                self.index_root,
+                self.index_name,
+                self.checkpoint,
+                self.collection,
+                self.get_index_version(),
+            ),
+            self._load_searcher,
+        )
+
+        # Search with this retriever's parameters, sharing the model and index of the searcher
+        self._searcher = copy.copy(searcher)
+        self._searcher.config = ColBERTConfig.from_existing(
+            searcher.config, self._config
+        )
+        # Keep the shared searcher registered for as long as this retriever is alive
+        self._shared_searcher = searcher
+
     def retrieve(self, input_texts: List[str], *args, **kwargs):
         # Step 1: Locally update object variable values, if provided
         max_num_documents = (
@@ -119,14 +154,34 @@ class ColBERTRetriever(RetrieverComponent):
         )
 
         # TODO: Add kwarg defining return format (List[List[Tuple(pids, score)]], List[List[<document>]])
-        ranking_results = self._searcher.search_all(
-            {idx: str(input_text) for idx, input_text in enumerate(input_texts)},
-            k=max_num_documents,
+        return self._cached_retrieve(
+            input_texts,
+            max_num_documents,
+            lambda texts: self._retrieve(texts, max_num_documents),
+        )
+
+    def _retrieve(self, input_texts: List[str], max_num_documents: int):
+        Q = torch.stack(
+            self._cached_query_encodings(
+                input_texts,
+                lambda texts: [
+                    Q.clone()
+                    for Q in self._searcher.encode([str(text) for text in texts])
+                ],
+            )
         )
+
+        ranking_results = []
+        for offset in range(0, Q.size(0), 128):
+            ranking_results.extend(
+                self._searcher.dense_search_batch(
+                    Q[offset : offset + 128], k=max_num_documents
+                )
+            )
+
         return [
-            [(result[0], result[-1]) for result in results_per_query]
-            for results_per_query in ranking_results.data.values()
+            list(zip(pids, scores)) for pids, _, scores in ranking_results
         ]
-        
+
     def get_engine_type(self):
         return "ColBERT"
@@ -14,6 +14,8 @@ class BM25Retriever(RetrieverComponent):
         index_root: str
         index_name: str
         max_num_documents (int, optional): Maximum number of document. Defaults to 5.
+        cache_size (int, optional): Maximum number of cached rankings (0 disables caching). Defaults to 1024.
+        cache_ttl (float, optional): Seconds after which cached rankings expire. Defaults to None (never).
 
     Important:
     1. Each field has metadata property which can carry additional information for other downstream usages.
@@ -74,11 +76,16 @@ class BM25Retriever(RetrieverComponent):
         self._searcher = PyseriniRetriever(self._index_path)
 
     def retrieve(self, input_texts: List[str], *args, **kwargs):
+        return self._cached_retrieve(
+            input_texts, self.max_num_documents, self._retrieve
+        )
+
+    def _retrieve(self, input_texts: List[str]):
         qids = [str(idx) for  idx, query in enumerate(input_texts) ]
         hits = self._searcher.batch_retrieve(input_texts, qids, topK=self.max_num_documents, threads=self.num_workers)
         return [
-            [(result['doc_id'], result['score']) for result in results_per_query]
-            for results_per_query in hits.values()
+            [(result['doc_id'], result['score']) for result in hits[qid]]
+            for qid in qids
         ]
     
     def get_engine_type(self):
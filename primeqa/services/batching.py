@@ -0,0 +1,287 @@
+import json
+import logging
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from primeqa.pipelines.components.base import ReaderComponent, RetrieverComponent
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests into batches.
+
+    Requests are queued and a worker thread runs them together as soon as the batch holds `max_batch_size` items
+    or the first request in it has waited `max_latency_ms`, whichever comes first. Each request gets back the
+    results for its own items, in order. If a batch of several requests fails, its requests are re-run one by one,
+    so that an invalid request does not fail the others.
+
+    The worker thread is started by the first request and exits once no request came for `idle_timeout_s`.
+
+    Args:
+        process_batch (Callable[[List], List]): Processes a list of items into a list with one result per item.
+        max_batch_size (int): Maximum number of items in a batch. A larger request is run as a batch on its own.
+        max_latency_ms (float): Maximum time (in milliseconds) a request waits for others to join its batch.
+        name (str, optional): Name of the worker thread. Defaults to "MicroBatcher".
+        idle_timeout_s (float, optional): Time (in seconds) after which an idle worker thread exits. Defaults to 60.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List], List],
+        max_batch_size: int,
+        max_latency_ms: float,
+        name: str = "MicroBatcher",
+        idle_timeout_s: float = 60.0,
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency_ms = max_latency_ms
+        self.idle_timeout_s = idle_timeout_s
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._overflow = None
+        self._logger = logging.getLogger(name)
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def submit(self, items: List) -> Future:
+        """
+        Queues `items` for the next batch.
+
+        Returns:
+            Future: resolves to the list of results for `items`
+        """
+        future = Future()
+        if not items:
+            future.set_result([])
+            return future
+
+        with self._worker_lock:
+            self._queue.put((list(items), future))
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+        return future
+
+    def _wait_for_request(self):
+        """
+        Returns the next request, or None once the worker has been idle for `idle_timeout_s` and is stopped.
+        """
+        while True:
+            try:
+                return self._queue.get(timeout=self.idle_timeout_s)
+            except queue.Empty:
+                with self._worker_lock:
+                    # Requests are queued under the lock, so none can be left behind once the worker is unset
+                    if self._queue.empty():
+                        self._worker = None
+                        return None
+
+    def __call__(self, items: List) -> List:
+        return self.submit(items).result()
+
+    def _next_batch(self) -> Optional[List[Tuple[List, Future]]]:
+        if self._overflow is not None:
+            requests, self._overflow = [self._overflow], None
+        else:
+            request = self._wait_for_request()
+            if request is None:
+                return None
+            requests = [request]
+
+        batch_size = len(requests[0][0])
+        deadline = time.monotonic() + self.max_latency_ms / 1000
+        while batch_size < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+
+            # Keep the request that does not fit for the next batch
+            if batch_size + len(request[0]) > self.max_batch_size:
+                self._overflow = request
+                break
+
+            requests.append(request)
+            batch_size += len(request[0])
+
+        return requests
+
+    def _process(self, requests: List[Tuple[List, Future]]):
+        items = [item for request_items, _ in requests for item in request_items]
+        try:
+            results = self.process_batch(items)
+            if len(results) != len(items):
+                raise RuntimeError(
+                    f"Batch of {len(items)} items returned {len(results)} results"
+                )
+        except Exception as err:
+            if len(requests) == 1:
+                requests[0][1].set_exception(err)
+            else:
+                for request in requests:
+                    self._process([request])
+            return
+
+        offset = 0
+        for request_items, future in requests:
+            future.set_result(results[offset : offset + len(request_items)])
+            offset += len(request_items)
+
+    def _run(self):
+        while True:
+            requests = self._next_batch()
+            if requests is None:
+                return
+
+            self._logger.debug(
+                "Running batch of %d requests with %d items",
+                len(requests),
+                sum(len(request_items) for request_items, _ in requests),
+            )
+            self._process(requests)
+
+
+class _Scheduler:
+    """
+    Keeps one `MicroBatcher` per component instance. Each item carries the keyword arguments of its request, and
+    a batch calls the instance once per distinct set of arguments in it.
+
+    Batchers only hold a weak reference to their instance, and are dropped once the instance is garbage collected
+    (e.g., evicted from the instance cache and done with its last request).
+    """
+
+    def __init__(self, max_batch_size: int, max_latency_ms: float):
+        self.max_batch_size = max_batch_size
+        self.max_latency_ms = max_latency_ms
+        self._batchers = {}
+        self._lock = threading.Lock()
+
+    def _process_batch(self, instance, kwargs: dict, items: List) -> List:
+        raise NotImplementedError
+
+    def _run(self, instance, items: List, kwargs: dict) -> List:
+        key = json.dumps(kwargs, sort_keys=True, default=str)
+        return self._get_batcher(instance)([(key, kwargs, item) for item in items])
+
+    def _get_batcher(self, instance) -> MicroBatcher:
+        key = id(instance)
+        with self._lock:
+            batcher = self._batchers.get(key)
+            if batcher is None:
+                instance_ref = weakref.ref(instance)
+                batcher = MicroBatcher(
+                    lambda items: self._process_items(instance_ref(), items),
+                    max_batch_size=self.max_batch_size,
+                    max_latency_ms=self.max_latency_ms,
+                    name=f"{instance.__class__.__name__}Batcher",
+                )
+                self._batchers[key] = batcher
+                # Not under the lock: the finalizer may run while the lock is held (by garbage collection)
+                weakref.finalize(instance, self._batchers.pop, key, None)
+            return batcher
+
+    def _process_items(self, instance, items: List[Tuple[str, dict, Any]]) -> List:
+        # The instance is still alive: the requests in the batch are waiting on it
+        groups = {}
+        for idx, (key, kwargs, _) in enumerate(items):
+            groups.setdefault(key, (kwargs, []))[1].append(idx)
+
+        results = [None] * len(items)
+        for kwargs, idxs in groups.values():
+            group_results = self._process_batch(instance, kwargs, [items[idx][2] for idx in idxs])
+            if len(group_results) != len(idxs):
+                raise RuntimeError(
+                    f"Batch of {len(idxs)} items returned {len(group_results)} results"
+                )
+            for idx, result in zip(idxs, group_results):
+                results[idx] = result
+
+        return results
+
+
+class ReaderScheduler(_Scheduler):
+    """
+    Runs `ReaderComponent.predict` calls from concurrent requests as shared batches.
+
+    Args:
+        max_batch_size (int): Maximum number of (question, contexts) examples per `predict` call. 1 disables batching.
+        max_latency_ms (float): Maximum time (in milliseconds) a request waits for others to join its batch.
+    """
+
+    def predict(
+        self,
+        instance: ReaderComponent,
+        questions: List[str],
+        contexts: List[List[str]],
+        **kwargs,
+    ) -> Dict[str, List[Dict]]:
+        """
+        Same as `instance.predict(questions=questions, contexts=contexts, **kwargs)`.
+
+        Returns:
+            Dict[str, List[Dict]]: predictions per example id ("0", "1", ...)
+        """
+        if self.max_batch_size <= 1:
+            return instance.predict(questions=questions, contexts=contexts, **kwargs)
+
+        example_ids = [str(idx) for idx in range(len(questions))]
+        return dict(
+            zip(
+                example_ids,
+                self._run(instance, list(zip(questions, contexts, example_ids)), kwargs),
+            )
+        )
+
+    def _process_batch(
+        self, instance: ReaderComponent, kwargs: dict, items: List[Tuple[str, List[str], str]]
+    ) -> List[List[Dict]]:
+        predictions = instance.predict(
+            questions=[question for question, _, _ in items],
+            contexts=[item_contexts for _, item_contexts, _ in items],
+            example_ids=[str(idx) for idx in range(len(items))],
+            **kwargs,
+        )
+        # Map predictions back to the example ids of the request they came from
+        return [
+            [
+                {**prediction, "example_id": example_id}
+                for prediction in predictions.get(str(idx), [])
+            ]
+            for idx, (_, _, example_id) in enumerate(items)
+        ]
+
+
+class RetrieverScheduler(_Scheduler):
+    """
+    Runs `RetrieverComponent.retrieve` calls from concurrent requests as shared batches.
+
+    Args:
+        max_batch_size (int): Maximum number of queries per `retrieve` call. 1 disables batching.
+        max_latency_ms (float): Maximum time (in milliseconds) a request waits for others to join its batch.
+    """
+
+    def retrieve(
+        self, instance: RetrieverComponent, input_texts: List[str], **kwargs
+    ) -> List[Any]:
+        """
+        Same as `instance.retrieve(input_texts=input_texts, **kwargs)`.
+        """
+        if self.max_batch_size <= 1:
+            return instance.retrieve(input_texts=input_texts, **kwargs)
+
+        return self._run(instance, list(input_texts), kwargs)
+
+    def _process_batch(
+        self, instance: RetrieverComponent, kwargs: dict, items: List[str]
+    ) -> List[Any]:
+        return instance.retrieve(input_texts=items, **kwargs)
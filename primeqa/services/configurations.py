@@ -58,6 +58,18 @@ def float_type_between_zero_and_one(value):
     return fvalue
 
 
+def non_negative_float_type(value):
+    try:
+        fvalue = float(value)
+    except ValueError as ex:
+        raise ArgumentTypeError(f"{value} is an invalid float value: {ex}") from ex
+
+    if fvalue < 0.0:
+        raise ArgumentTypeError(f"{value} is an invalid non-negative float value")
+
+    return fvalue
+
+
 def config_value(
     property_type: Union[Callable, Type] = str,
     default: Optional[Any] = None,
@@ -217,6 +229,78 @@ class Settings(object):
     def num_rest_server_workers(self):
         pass
 
+    @config_value(property_type=bool)
+    def rest_async_handlers(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def rest_reader_threads(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def rest_retriever_threads(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def rest_indexer_threads(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def rest_max_queued_requests(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def max_loaded_readers(self):
+        pass
+
+    @config_value(property_type=non_negative_float_type)
+    def max_loaded_readers_memory_mb(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def max_loaded_retrievers(self):
+        pass
+
+    @config_value(property_type=non_negative_float_type)
+    def max_loaded_retrievers_memory_mb(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def max_loaded_indexers(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def reader_max_batch_size(self):
+        pass
+
+    @config_value(property_type=non_negative_float_type)
+    def reader_max_batch_latency_ms(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def retriever_max_batch_size(self):
+        pass
+
+    @config_value(property_type=non_negative_float_type)
+    def retriever_max_batch_latency_ms(self):
+        pass
+
+    @config_value(property_type=bool)
+    def background_indexing(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def max_concurrent_indexing_jobs(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def index_documents_batch_size(self):
+        pass
+
+    @config_value(property_type=non_negative_float_type)
+    def index_progress_interval_secs(self):
+        pass
+
     def _get_config_dict(self):
         config_dict = {}
         for property_name in dir(self):
@@ -3,6 +3,9 @@ from enum import Enum
 ATTR_INDEX_ID = "index_id"
 ATTR_STATUS = "status"
 ATTR_ENGINE_TYPE  ="engine_type"
+ATTR_NUM_DOCUMENTS = "num_documents"
+ATTR_NUM_DOCUMENTS_PROCESSED = "num_documents_processed"
+ATTR_INDEXING_STARTED_AT = "indexing_started_at"
 
 
 class IndexStatus(str, Enum):
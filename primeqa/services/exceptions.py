@@ -11,6 +11,7 @@ class Error(Exception):
 class ErrorMessages(str, Enum):
     # REQUEST
     INVALID_REQUEST = "E1001: Missing mandatory field: {} from request"
+    SERVER_BUSY = "E1002: Too many pending {} requests. Please try again in a short while."
 
     # PARAMETER
     INVALID_PARAMETER_DEFINITION = (
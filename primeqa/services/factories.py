@@ -1,4 +1,5 @@
 import logging
+import threading
 import time
 import json
 
@@ -17,6 +18,9 @@ from primeqa.pipelines.components.retriever.sparse import BM25Retriever
 from primeqa.pipelines.components.indexer.dense import ColBERTIndexer
 from primeqa.pipelines.components.indexer.sparse import BM25Indexer
 
+from primeqa.services.configurations import Settings
+from primeqa.services.instance_cache import InstanceCache
+
 READERS_REGISTRY = {
     ExtractiveReader.__name__: ExtractiveReader,
 }
@@ -32,6 +36,10 @@ INDEXERS_REGISTRY = {
 }
 
 
+# Guards the lazy creation of the factories' instance caches
+_FACTORY_LOCK = threading.Lock()
+
+
 def validate(fields: dict):
     missing_fields = [
         field_name
@@ -43,10 +51,21 @@ def validate(fields: dict):
 
 
 class ReaderFactory:
-    _instances = {}
-    _loading = []
+    _instances = None
     _logger = logging.getLogger("ReaderFactory")
 
+    @classmethod
+    def get_instances(cls) -> InstanceCache:
+        with _FACTORY_LOCK:
+            if cls._instances is None:
+                config = Settings()
+                cls._instances = InstanceCache(
+                    max_instances=config.max_loaded_readers,
+                    max_memory_mb=config.max_loaded_readers_memory_mb,
+                    name=cls.__name__,
+                )
+        return cls._instances
+
     @classmethod
     def get(
         cls, reader: ReaderComponent, reader_kwargs: dict, *load_args, **load_kwargs
@@ -71,18 +90,8 @@ class ReaderFactory:
         # Step 3: Create hash based unique instance id
         instance_id = hash(instance)
 
-        # Step 4: Load and persist instance
-        if instance_id not in cls._instances:
-            # Step 4.a: Check if class is currently loading
-            if instance_id in cls._loading:
-                raise ValueError(
-                    f"{reader.__name__} is currently being loading. Please try again in a short while."
-                )
-
-            # Step 4.b: Add to loading
-            cls._loading.append(instance_id)
-
-            # Step 4.d: Start loading
+        # Step 4: Load instance
+        def load():
             try:
                 cls._logger.info(
                     "Loading '%s' reader with parameters = %s",
@@ -97,35 +106,38 @@ class ReaderFactory:
                     time.time() - start_t,
                 )
             except OSError as err:
-                # Step 3.d.i: Log exception
+                # Step 4.a: Log exception
                 cls._logger.warning(
                     "Failed to load %s with arguments: %s",
                     reader.__name__,
                     reader_kwargs,
                 )
 
-                # Step 3.d.ii: Remove reader from loading
-                cls._loading.remove(instance_id)
-
-                # Step 3.d.iii: Raise exception
+                # Step 4.b: Raise exception
                 raise ValueError(err.args[0]) from err
 
-            # Step 4.e: Remove from loading and add to available instances
-            cls._instances[instance_id] = instance
-            cls._loading.remove(instance_id)
-
-        else:
-            # Step 4.a: Instance with same instance_id already exists, clean up newly created instance
-            del instance
+            return instance
 
-        return cls._instances[instance_id]
+        # Step 5: Return cached instance with same instance_id, waiting if it is currently loading, or load it
+        return cls.get_instances().get(instance_id, load)
 
 
 class RetrieverFactory:
-    _instances = {}
-    _loading = []
+    _instances = None
     _logger = logging.getLogger("RetrieverFactory")
 
+    @classmethod
+    def get_instances(cls) -> InstanceCache:
+        with _FACTORY_LOCK:
+            if cls._instances is None:
+                config = Settings()
+                cls._instances = InstanceCache(
+                    max_instances=config.max_loaded_retrievers,
+                    max_memory_mb=config.max_loaded_retrievers_memory_mb,
+                    name=cls.__name__,
+                )
+        return cls._instances
+
     @classmethod
     def get(
         cls,
@@ -154,18 +166,8 @@ class RetrieverFactory:
         # Step 3: Create hash based unique instance id
         instance_id = hash(instance)
 
-        # Step 4: Load and persist instance
-        if instance_id not in cls._instances:
-            # Step 4.a: Check if class is currently loading
-            if instance_id in cls._loading:
-                raise ValueError(
-                    f"{retriever.__name__} is currently being loading. Please try again in a short while."
-                )
-
-            # Step 4.b: Add to loading
-            cls._loading.append(instance_id)
-
-            # Step 4.d: Start loading
+        # Step 4: Load instance
+        def load():
             try:
                 cls._logger.info(
                     "Loading '%s' retriever with parameters = %s",
@@ -180,35 +182,36 @@ class RetrieverFactory:
                     time.time() - start_t,
                 )
             except OSError as err:
-                # Step 3.d.i: Log exception
+                # Step 4.a: Log exception
                 cls._logger.warning(
                     "Failed to load %s with arguments: %s",
                     retriever.__name__,
                     retriever_kwargs,
                 )
 
-                # Step 3.d.ii: Remove reader from loading
-                cls._loading.remove(instance_id)
-
-                # Step 3.d.iii: Raise exception
+                # Step 4.b: Raise exception
                 raise ValueError(err.args[0]) from err
 
-            # Step 4.e: Remove from loading and add to available instances
-            cls._instances[instance_id] = instance
-            cls._loading.remove(instance_id)
+            return instance
 
-        else:
-            # Step 4.a: Instance with same instance_id already exists, clean up newly created instance
-            del instance
-
-        return cls._instances[instance_id]
+        # Step 5: Return cached instance with same instance_id, waiting if it is currently loading, or load it
+        return cls.get_instances().get(instance_id, load)
 
 
 class IndexerFactory:
-    _instances = {}
-    _loading = []
+    _instances = None
     _logger = logging.getLogger("IndexerFactory")
 
+    @classmethod
+    def get_instances(cls) -> InstanceCache:
+        with _FACTORY_LOCK:
+            if cls._instances is None:
+                cls._instances = InstanceCache(
+                    max_instances=Settings().max_loaded_indexers,
+                    name=cls.__name__,
+                )
+        return cls._instances
+
     @classmethod
     def get(
         cls,
@@ -225,37 +228,25 @@ class IndexerFactory:
             f"{indexer.__name__}::{json.dumps(indexer_kwargs, sort_keys=True)}"
         )
 
-        if instance_id not in cls._instances:
-            # Step 3.a: Check if class is currently loading
-            if instance_id in cls._loading:
-                raise ValueError(
-                    f"{indexer.__name__} is currently being loading. Please try again in a short while."
-                )
-
-            # Step 3.b: Add to loading
-            cls._loading.append(instance_id)
-
-            # Step 3.c: Initialize instance
+        def load():
+            # Step 3.a: Initialize instance
             cls._logger.info(
                 "%s - initializing with arguments: %s", indexer.__name__, indexer_kwargs
             )
             try:
                 instance = indexer(**indexer_kwargs)
             except TypeError as err:
-                # Step 3.c.i: Log exception
+                # Step 3.a.i: Log exception
                 cls._logger.warning(
                     "Failed to intialize %s with arguments: %s",
                     indexer.__name__,
                     indexer_kwargs,
                 )
 
-                # Step 3.c.ii: Remove reader from loading
-                cls._loading.remove(instance_id)
-
-                # Step 3.c.iii: Raise exception
+                # Step 3.a.ii: Raise exception
                 raise err
 
-            # Step 3.d: Load instance
+            # Step 3.b: Load instance
             try:
                 start_t = time.time()
                 instance.load(load_args, load_kwargs)
@@ -265,21 +256,17 @@ class IndexerFactory:
                     time.time() - start_t,
                 )
             except OSError as err:
-                # Step 3.d.i: Log exception
+                # Step 3.b.i: Log exception
                 cls._logger.warning(
                     "Failed to load %s with arguments: %s",
                     indexer.__name__,
                     indexer_kwargs,
                 )
 
-                # Step 3.d.ii: Remove reader from loading
-                cls._loading.remove(instance_id)
-
-                # Step 3.d.iii: Raise exception
+                # Step 3.b.ii: Raise exception
                 raise ValueError(err.args[0]) from err
 
-            # Step 3.d: Remove from loading and add to available instances
-            cls._instances[instance_id] = instance
-            cls._loading.remove(instance_id)
+            return instance
 
-        return cls._instances[instance_id]
+        # Step 4: Return cached instance with same instance_id, waiting if it is currently loading, or load it
+        return cls.get_instances().get(instance_id, load)
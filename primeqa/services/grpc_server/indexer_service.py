@@ -1,4 +1,5 @@
 import logging
+import time
 from typing import Union
 
 from grpc import ServicerContext, StatusCode
@@ -6,7 +7,15 @@ from google.protobuf.json_format import MessageToDict
 
 from primeqa.services.exceptions import ErrorMessages
 from primeqa.services.configurations import Settings
-from primeqa.services.constants import ATTR_INDEX_ID, ATTR_STATUS, IndexStatus, ATTR_ENGINE_TYPE
+from primeqa.services.constants import (
+    ATTR_INDEX_ID,
+    ATTR_STATUS,
+    IndexStatus,
+    ATTR_ENGINE_TYPE,
+    ATTR_NUM_DOCUMENTS,
+    ATTR_NUM_DOCUMENTS_PROCESSED,
+)
+from primeqa.services.indexing import IndexingJobs, get_index_progress
 from primeqa.services.store import DIR_NAME_INDEX, StoreFactory
 from primeqa.services.grpc_server.utils import (
     parse_parameter_value,
@@ -45,6 +54,11 @@ class IndexerService(IndexerServicer):
             self._logger = logger
         self._config = config
         self._store = StoreFactory.get_store()
+        self._indexing_jobs = IndexingJobs(
+            self._store,
+            max_workers=config.max_concurrent_indexing_jobs,
+            progress_interval_secs=config.index_progress_interval_secs,
+        )
         self._logger.info("%s is successfully initialized.", self.__class__.__name__)
 
     def GetIndexers(
@@ -76,118 +90,139 @@ class IndexerService(IndexerServicer):
         index_information = {
             ATTR_INDEX_ID: self._store.generate_index_uuid(),
             ATTR_STATUS: IndexStatus.INDEXING.value,
+            ATTR_NUM_DOCUMENTS: 0,
         }
 
-        # Step 2: Iterate over all index requests to collect documents
-        documents_to_index = list()
+        # Step 2: Iterate over all index requests to save documents as they arrive
         instance = None
-        for request_idx, request in enumerate(request_iterator):
-            if request_idx == 0:
-                # Step 2.a: Verify requested indexer
-                try:
-                    indexer = INDEXERS_REGISTRY[request.indexer.indexer_id]
-                except KeyError:
-                    context.set_code(StatusCode.INVALID_ARGUMENT)
-                    context.set_details(
-                        ErrorMessages.INVALID_INDEXER.value.format(
-                            request.indexer.indexer_id,
-                            ", ".join(INDEXERS_REGISTRY.keys()),
-                        )
-                    )
-                    return GenerateIndexResponse()
-
-                # Step 2.b: Remove existing index if index_id is provide in the request
-                if request.index_id:
-                    self._store.delete_index(request.index_id)
-                    index_information[ATTR_INDEX_ID] = request.index_id
-
-                # Step 2.c: Load default retriever keyword arguments
-                indexer_kwargs = {
-                    k: v.default for k, v in indexer.__dataclass_fields__.items()
-                }
-
-                # Step 2.d: If parameters are provided in request then update keyword arguments used to instantiate indexer instance
-                if request.indexer.parameters:
-                    for parameter in request.indexer.parameters:
-                        if parameter.parameter_id not in indexer_kwargs:
-                            context.set_code(StatusCode.INVALID_ARGUMENT)
-                            context.set_details(
-                                ErrorMessages.INVALID_PARAMETER.value.format(
-                                    "indexer", parameter.parameter_id
-                                )
+        documents_writer = None
+        try:
+            for request_idx, request in enumerate(request_iterator):
+                if request_idx == 0:
+                    # Step 2.a: Verify requested indexer
+                    try:
+                        indexer = INDEXERS_REGISTRY[request.indexer.indexer_id]
+                    except KeyError:
+                        context.set_code(StatusCode.INVALID_ARGUMENT)
+                        context.set_details(
+                            ErrorMessages.INVALID_INDEXER.value.format(
+                                request.indexer.indexer_id,
+                                ", ".join(INDEXERS_REGISTRY.keys()),
                             )
-                            return GenerateIndexResponse()
-
-                        indexer_kwargs[parameter.parameter_id] = parse_parameter_value(
-                            parameter,
-                            get_parameter_type(
-                                component=indexer,
-                                parameter_id=parameter.parameter_id,
-                            ),
                         )
-                        # Re-map checkpoint kwarg to point to checkpoint file path in the service's store
-                        if parameter.parameter_id == "checkpoint":
+                        return GenerateIndexResponse()
+
+                    # Step 2.b: Remove existing index if index_id is provide in the request
+                    if request.index_id:
+                        self._store.delete_index(request.index_id)
+                        index_information[ATTR_INDEX_ID] = request.index_id
+
+                    # Step 2.c: Load default retriever keyword arguments
+                    indexer_kwargs = {
+                        k: v.default for k, v in indexer.__dataclass_fields__.items()
+                    }
+
+                    # Step 2.d: If parameters are provided in request then update keyword arguments used to instantiate indexer instance
+                    if request.indexer.parameters:
+                        for parameter in request.indexer.parameters:
+                            if parameter.parameter_id not in indexer_kwargs:
+                                context.set_code(StatusCode.INVALID_ARGUMENT)
+                                context.set_details(
+                                    ErrorMessages.INVALID_PARAMETER.value.format(
+                                        "indexer", parameter.parameter_id
+                                    )
+                                )
+                                return GenerateIndexResponse()
+
                             indexer_kwargs[
-                                "checkpoint"
-                            ] = self._store.get_checkpoint_path(
-                                indexer_kwargs["checkpoint"]
+                                parameter.parameter_id
+                            ] = parse_parameter_value(
+                                parameter,
+                                get_parameter_type(
+                                    component=indexer,
+                                    parameter_id=parameter.parameter_id,
+                                ),
                             )
+                            # Re-map checkpoint kwarg to point to checkpoint file path in the service's store
+                            if parameter.parameter_id == "checkpoint":
+                                indexer_kwargs[
+                                    "checkpoint"
+                                ] = self._store.get_checkpoint_path(
+                                    indexer_kwargs["checkpoint"]
+                                )
 
-                # Step 2.e: Update index specific arguments
-                indexer_kwargs["index_root"] = self._store.get_index_directory_path(
-                    index_information[ATTR_INDEX_ID]
-                )
-                indexer_kwargs["index_name"] = DIR_NAME_INDEX
-
-                # Step 2.e: Create indexer instance
-                try:
-                    instance = IndexerFactory.get(indexer, indexer_kwargs)
-                except (ValueError, TypeError) as err:
-                    context.set_code(StatusCode.INVALID_ARGUMENT)
-                    context.set_details(err.args[0])
-                    return GenerateIndexResponse()
-
-            # Append documents from each index request
-            documents_to_index.extend(
-                MessageToDict(request, preserving_proto_field_name=True)["documents"]
-            )
+                    # Step 2.e: Update index specific arguments
+                    indexer_kwargs[
+                        "index_root"
+                    ] = self._store.get_index_directory_path(
+                        index_information[ATTR_INDEX_ID]
+                    )
+                    indexer_kwargs["index_name"] = DIR_NAME_INDEX
 
-        # Step 3: Save index information
-        index_information[ATTR_ENGINE_TYPE] = instance.get_engine_type()
-        self._store.save_index_information(
-            index_id=index_information[ATTR_INDEX_ID],
-            information=index_information,
-        )
+                    # Step 2.f: Create indexer instance
+                    try:
+                        instance = IndexerFactory.get(indexer, indexer_kwargs)
+                    except (ValueError, TypeError) as err:
+                        context.set_code(StatusCode.INVALID_ARGUMENT)
+                        context.set_details(err.args[0])
+                        return GenerateIndexResponse()
 
-        # Step 4: Save documents used in index
-        self._store.save_index_documents(
-            index_id=index_information[ATTR_INDEX_ID], documents=documents_to_index
-        )
+                    # Step 2.g: Save index information and start saving documents used in index
+                    index_information[ATTR_ENGINE_TYPE] = instance.get_engine_type()
+                    self._store.save_index_information(
+                        index_id=index_information[ATTR_INDEX_ID],
+                        information=index_information,
+                    )
+                    documents_writer = self._store.open_index_documents_writer(
+                        index_id=index_information[ATTR_INDEX_ID],
+                        batch_size=self._config.index_documents_batch_size,
+                    )
+                    last_saved_at = time.monotonic()
 
-        # Step 5: Kick-off async index generation
-        try:
-            instance.index(
-                self._store.get_index_documents_file_path(
-                    index_id=index_information[ATTR_INDEX_ID]
-                ),
-            )
+                # Step 2.h: Append documents from each index request
+                documents_writer.write(
+                    MessageToDict(document, preserving_proto_field_name=True)
+                    for document in request.documents
+                )
 
-            # Step 5.b: Set index status to "READY" once indexing is complete
-            index_information[ATTR_STATUS] = IndexStatus.READY.value
-        except (TypeError, RuntimeError) as err:
-            index_information[ATTR_STATUS] = IndexStatus.CORRUPT.value
-            logging.exception(
-                "Generation failed for index with id=%s. Resultant index may be corrupted.",
-                index_information[ATTR_INDEX_ID],
-            )
-            logging.exception(err.args[0])
+                # Step 2.i: Periodically record number of documents received so far
+                if (
+                    time.monotonic() - last_saved_at
+                    >= self._config.index_progress_interval_secs
+                ):
+                    index_information[ATTR_NUM_DOCUMENTS] = documents_writer.num_documents
+                    self._store.save_index_information(
+                        index_information[ATTR_INDEX_ID], information=index_information
+                    )
+                    last_saved_at = time.monotonic()
+
+            if documents_writer is not None:
+                documents_writer.close()
+        except Exception:
+            # Stream was interrupted, e.g., cancelled by the client
+            if instance is not None:
+                if documents_writer is not None:
+                    documents_writer.close()
+                index_information[ATTR_STATUS] = IndexStatus.CORRUPT.value
+                self._store.save_index_information(
+                    index_information[ATTR_INDEX_ID], information=index_information
+                )
+            raise
 
+        if instance is None:
+            context.set_code(StatusCode.INVALID_ARGUMENT)
+            context.set_details(ErrorMessages.INVALID_REQUEST.value.format("indexer"))
+            return GenerateIndexResponse()
 
-        self._store.save_index_information(
-            index_information[ATTR_INDEX_ID], information=index_information
-        )
+        index_information[ATTR_NUM_DOCUMENTS] = documents_writer.num_documents
 
-        # Step 6: Return
+        # Step 3: Kick-off index generation, in the background unless configured otherwise
+        if self._config.background_indexing:
+            self._indexing_jobs.submit(instance, index_information)
+        else:
+            self._indexing_jobs.run(instance, index_information)
+
+        # Step 4: Return
         return GenerateIndexResponse(
             index_id=index_information[ATTR_INDEX_ID],
             status=READY
@@ -206,12 +241,21 @@ class IndexerService(IndexerServicer):
             index_information = self._store.get_index_information(
                 index_id=request.index_id
             )
+            progress = get_index_progress(index_information)
+            response = IndexStatusResponse(
+                num_documents=progress[ATTR_NUM_DOCUMENTS],
+                num_documents_processed=progress[ATTR_NUM_DOCUMENTS_PROCESSED],
+            )
+            if progress["eta_secs"] is not None:
+                response.eta_secs = progress["eta_secs"]
+
             if index_information[ATTR_STATUS] == IndexStatus.READY.value:
-                return IndexStatusResponse(status=READY)
+                response.status = READY
             elif index_information[ATTR_STATUS] == IndexStatus.INDEXING.value:
-                return IndexStatusResponse(status=INDEXING)
+                response.status = INDEXING
             else:
-                return IndexStatusResponse(status=IndexStatus.CORRUPT.value)
+                response.status = CORRUPT
+            return response
         except KeyError:
             return IndexStatusResponse(status=CORRUPT)
         except FileNotFoundError:
@@ -5,6 +5,7 @@ from grpc import ServicerContext, StatusCode
 
 from primeqa.services.exceptions import Error, ErrorMessages
 from primeqa.services.configurations import Settings
+from primeqa.services.batching import ReaderScheduler
 from primeqa.services.grpc_server.utils import (
     parse_parameter_value,
     generate_parameters,
@@ -35,6 +36,10 @@ class ReaderService(ReaderServicer):
             self._logger = logger
         self._config = config
         self.loaded_readers = {}
+        self._scheduler = ReaderScheduler(
+            max_batch_size=config.reader_max_batch_size,
+            max_latency_ms=config.reader_max_batch_latency_ms,
+        )
         self._logger.info("%s is successfully initialized.", self.__class__.__name__)
 
     def GetReaders(
@@ -145,7 +150,8 @@ class ReaderService(ReaderServicer):
                     request.contexts[idx].texts,
                 )
                 try:
-                    predictions = instance.predict(
+                    predictions = self._scheduler.predict(
+                        instance,
                         questions=[query] * len(request.contexts[idx].texts),
                         contexts=[[text] for text in request.contexts[idx].texts],
                         **reader_kwargs,
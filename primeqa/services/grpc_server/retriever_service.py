@@ -4,6 +4,7 @@ from typing import Union
 from grpc import ServicerContext, StatusCode
 
 from primeqa.services.configurations import Settings
+from primeqa.services.batching import RetrieverScheduler
 from primeqa.services.parameters import get_parameter_type
 from primeqa.services.constants import ATTR_STATUS, IndexStatus
 from primeqa.services.factories import RETRIEVERS_REGISTRY, RetrieverFactory
@@ -36,6 +37,10 @@ class RetrieverService(RetrieverServicer):
             self._logger = logger
         self._config = config
         self._store = StoreFactory.get_store()
+        self._scheduler = RetrieverScheduler(
+            max_batch_size=config.retriever_max_batch_size,
+            max_latency_ms=config.retriever_max_batch_latency_ms,
+        )
         self._logger.info("%s is successfully initialized.", self.__class__.__name__)
 
     def GetRetrievers(
@@ -182,7 +187,9 @@ class RetrieverService(RetrieverServicer):
             request.queries,
         )
         try:
-            results = instance.retrieve(input_texts=request.queries, **retriever_kwargs)
+            results = self._scheduler.retrieve(
+                instance, input_texts=request.queries, **retriever_kwargs
+            )
             self._logger.info(
                 "Applying '%s' retriever for queries = %s returns results = %s",
                 instance.__class__.__name__,
@@ -198,31 +205,39 @@ class RetrieverService(RetrieverServicer):
             )
             return RetrieveResponse()
 
+        # Step 7: Fetch documents for all hits at once
+        try:
+            documents = self._store.get_index_documents(
+                index_id=request.index_id,
+                document_ids=[
+                    hit[0] for result_per_query in results for hit in result_per_query
+                ],
+            )
+        except FileNotFoundError:
+            documents = {}
+
         hits = []
         for result_per_query in results:
             hits_per_query = []
             for hit in result_per_query:
                 try:
-                    document = self._store.get_index_document(
-                        index_id=request.index_id, document_idx=hit[0]
-                    )
-                    hits_per_query.append(
-                        Hit(
-                            document=Document(
-                                text=document["text"],
-                                document_id=document["document_id"]
-                                if "document_id" in document
-                                else None,
-                                title=document["title"]
-                                if "title" in document
-                                else None,
-                            ),
-                            score=hit[1],
-                        )
-                    )
-                except (FileNotFoundError, KeyError):
+                    document = documents[str(hit[0])]
+                except KeyError:
                     continue
 
+                hits_per_query.append(
+                    Hit(
+                        document=Document(
+                            text=document["text"],
+                            document_id=document["document_id"]
+                            if "document_id" in document
+                            else None,
+                            title=document["title"] if "title" in document else None,
+                        ),
+                        score=hit[1],
+                    )
+                )
+
             hits.append(HitPerQuery(hits=hits_per_query))
 
         return RetrieveResponse(hits=hits)
@@ -0,0 +1,180 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Union
+
+from primeqa.pipelines.components.base import IndexerComponent
+from primeqa.services.constants import (
+    ATTR_INDEX_ID,
+    ATTR_INDEXING_STARTED_AT,
+    ATTR_NUM_DOCUMENTS,
+    ATTR_NUM_DOCUMENTS_PROCESSED,
+    ATTR_STATUS,
+    IndexStatus,
+)
+from primeqa.services.store import Store
+
+
+def get_index_progress(index_information: dict) -> Dict[str, Union[int, float, None]]:
+    """
+    Computes the progress of an index from its information.
+
+    Args:
+        index_information (dict): Index information, as saved by `IndexingJobs`.
+
+    Returns:
+        Dict[str, Union[int, float, None]]: "num_documents" in the index, "num_documents_processed" so far and
+            "eta_secs", the estimated number of seconds until the index is ready (None if it cannot be estimated yet)
+    """
+    num_documents = index_information.get(ATTR_NUM_DOCUMENTS, 0)
+    if index_information.get(ATTR_STATUS) == IndexStatus.READY.value:
+        return {
+            ATTR_NUM_DOCUMENTS: num_documents,
+            ATTR_NUM_DOCUMENTS_PROCESSED: num_documents,
+            "eta_secs": 0.0,
+        }
+
+    num_documents_processed = index_information.get(ATTR_NUM_DOCUMENTS_PROCESSED, 0)
+    started_at = index_information.get(ATTR_INDEXING_STARTED_AT)
+
+    eta_secs = None
+    if (
+        index_information.get(ATTR_STATUS) == IndexStatus.INDEXING.value
+        and started_at is not None
+        and num_documents_processed > 0
+    ):
+        elapsed_secs = max(time.time() - started_at, 0.0)
+        eta_secs = (
+            elapsed_secs
+            * (num_documents - num_documents_processed)
+            / num_documents_processed
+        )
+
+    return {
+        ATTR_NUM_DOCUMENTS: num_documents,
+        ATTR_NUM_DOCUMENTS_PROCESSED: num_documents_processed,
+        "eta_secs": eta_secs,
+    }
+
+
+class IndexingJobs:
+    """
+    Generates indexes from the documents saved in the store, in the background on a bounded thread pool.
+
+    While an index is generated, the number of documents already indexed (see
+    `IndexerComponent.get_num_indexed_documents`) is saved with the index information every
+    `progress_interval_secs`, from which `get_index_progress` estimates the remaining time.
+
+    Args:
+        store (Store): Store holding the documents and information of the indexes.
+        max_workers (int): Maximum number of indexes generated at once.
+        progress_interval_secs (float, optional): Interval (in seconds) between progress updates. 0 disables them.
+            Defaults to 5.
+    """
+
+    def __init__(
+        self, store: Store, max_workers: int, progress_interval_secs: float = 5.0
+    ):
+        self.progress_interval_secs = progress_interval_secs
+
+        self._store = store
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="indexing-job"
+        )
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    def submit(self, instance: IndexerComponent, index_information: dict) -> Future:
+        """
+        Queues the generation of an index.
+
+        Returns:
+            Future: resolves to the final index information
+        """
+        return self._executor.submit(self.run, instance, index_information)
+
+    def run(self, instance: IndexerComponent, index_information: dict) -> dict:
+        """
+        Generates an index from the documents saved for it, in the calling thread.
+
+        Args:
+            instance (IndexerComponent): Indexer to generate the index with.
+            index_information (dict): Index information, with the number of documents to index.
+
+        Returns:
+            dict: final index information, with "READY" or "CORRUPT" status
+        """
+        index_id = index_information[ATTR_INDEX_ID]
+
+        # Step 1: Record start of index generation
+        index_information[ATTR_STATUS] = IndexStatus.INDEXING.value
+        index_information[ATTR_NUM_DOCUMENTS_PROCESSED] = 0
+        index_information[ATTR_INDEXING_STARTED_AT] = time.time()
+        self._store.save_index_information(index_id, information=index_information)
+
+        # Step 2: Record progress while generating index
+        done = threading.Event()
+        monitor = threading.Thread(
+            target=self._monitor,
+            args=(instance, index_information, done),
+            name=f"indexing-job-monitor-{index_id}",
+            daemon=True,
+        )
+        if self.progress_interval_secs > 0:
+            monitor.start()
+
+        try:
+            instance.index(self._store.get_index_documents_file_path(index_id=index_id))
+
+            # Step 2.b: Set index status to "READY" once indexing is complete
+            index_information[ATTR_STATUS] = IndexStatus.READY.value
+        except Exception as err:
+            index_information[ATTR_STATUS] = IndexStatus.CORRUPT.value
+            self._logger.exception(
+                "Generation failed for index with id=%s. Resultant index may be corrupted: %s",
+                index_id,
+                err,
+            )
+        finally:
+            done.set()
+            if monitor.is_alive():
+                monitor.join()
+
+        # Step 3: Save final index information
+        if index_information[ATTR_STATUS] == IndexStatus.READY.value:
+            index_information[ATTR_NUM_DOCUMENTS_PROCESSED] = index_information.get(
+                ATTR_NUM_DOCUMENTS, 0
+            )
+        self._store.save_index_information(index_id, information=index_information)
+
+        return index_information
+
+    def _monitor(
+        self,
+        instance: IndexerComponent,
+        index_information: dict,
+        done: threading.Event,
+    ):
+        while not done.wait(self.progress_interval_secs):
+            try:
+                num_documents_processed = instance.get_num_indexed_documents()
+            except Exception:
+                self._logger.debug("Failed to get indexing progress", exc_info=True)
+                continue
+
+            if (
+                num_documents_processed is None
+                or num_documents_processed
+                == index_information[ATTR_NUM_DOCUMENTS_PROCESSED]
+            ):
+                continue
+
+            index_information[ATTR_NUM_DOCUMENTS_PROCESSED] = min(
+                num_documents_processed, index_information.get(ATTR_NUM_DOCUMENTS, 0)
+            )
+            self._store.save_index_information(
+                index_information[ATTR_INDEX_ID], information=dict(index_information)
+            )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
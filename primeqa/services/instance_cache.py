@@ -0,0 +1,160 @@
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Iterable
+
+import numpy as np
+import torch
+
+
+def estimate_memory(instances: Iterable[Any], max_depth: int = 6) -> int:
+    """
+    Estimates the memory (in bytes) held by `instances` from the tensors and arrays they reference.
+    Tensors shared between instances (e.g., shared model weights) are counted once, memory-mapped arrays are
+    not counted.
+
+    Args:
+        instances (Iterable[Any]): Objects to inspect.
+        max_depth (int, optional): Maximum depth of attributes and containers to follow. Defaults to 6.
+
+    Returns:
+        int: estimated number of bytes
+    """
+    seen_objects = set()
+    seen_storages = set()
+    total = 0
+
+    def add_tensor(tensor: torch.Tensor):
+        nonlocal total
+        storage = tensor.untyped_storage() if hasattr(tensor, "untyped_storage") else tensor.storage()
+        key = (tensor.device.type, storage.data_ptr())
+        if key not in seen_storages:
+            seen_storages.add(key)
+            total += storage.nbytes()
+
+    def visit(obj: Any, depth: int):
+        nonlocal total
+        if depth > max_depth or id(obj) in seen_objects:
+            return
+        seen_objects.add(id(obj))
+
+        if isinstance(obj, torch.Tensor):
+            add_tensor(obj)
+        elif isinstance(obj, torch.nn.Module):
+            for tensor in list(obj.parameters()) + list(obj.buffers()):
+                add_tensor(tensor)
+        elif isinstance(obj, np.ndarray):
+            if not isinstance(obj, np.memmap) and obj.base is None:
+                total += obj.nbytes
+        elif isinstance(obj, dict):
+            for value in obj.values():
+                visit(value, depth + 1)
+        elif isinstance(obj, (list, tuple, set)):
+            for value in obj:
+                visit(value, depth + 1)
+        elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+            for value in vars(obj).values():
+                visit(value, depth + 1)
+
+    for instance in instances:
+        visit(instance, 0)
+
+    return total
+
+
+class InstanceCache:
+    """
+    Thread-safe least-recently-used cache of loaded component instances, bounded by number of instances and
+    by their estimated memory (see `estimate_memory`). The most recently used instance is always kept.
+
+    The memory of each instance is estimated once, when it is loaded. Tensors shared between instances are
+    counted for each of them, so the total is an upper bound.
+
+    Concurrent requests for an instance that is being loaded wait for that load instead of starting another one.
+
+    Args:
+        max_instances (int): Maximum number of loaded instances.
+        max_memory_mb (float, optional): Maximum estimated memory (in MB) of the loaded instances. 0 disables
+            the memory bound. Defaults to 0.
+        name (str, optional): Logger name. Defaults to "InstanceCache".
+    """
+
+    def __init__(self, max_instances: int, max_memory_mb: float = 0, name: str = "InstanceCache"):
+        self.max_instances = max_instances
+        self.max_memory_mb = max_memory_mb
+
+        self._instances = OrderedDict()
+        self._footprints = {}
+        self._memory = 0
+        self._loading = {}
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger(name)
+
+    def get(self, key: Hashable, load_fn: Callable[[], Any]) -> Any:
+        """
+        Returns the instance for `key`, calling `load_fn` to load it on a miss.
+        Exceptions raised by `load_fn` are raised to every caller waiting for that load.
+        """
+        with self._lock:
+            if key in self._instances:
+                self._instances.move_to_end(key)
+                return self._instances[key]
+
+            future = self._loading.get(key)
+            is_loader = future is None
+            if is_loader:
+                future = self._loading[key] = Future()
+
+        if not is_loader:
+            return future.result()
+
+        try:
+            instance = load_fn()
+            footprint = estimate_memory([instance])
+        except BaseException as err:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(err)
+            raise
+
+        with self._lock:
+            del self._loading[key]
+            self._instances[key] = instance
+            self._footprints[key] = footprint
+            self._memory += footprint
+            self._evict()
+        future.set_result(instance)
+
+        return instance
+
+    def _evict(self):
+        while len(self._instances) > max(self.max_instances, 1):
+            self._pop_least_recently_used()
+
+        if self.max_memory_mb > 0:
+            while len(self._instances) > 1 and self._memory > self.max_memory_mb * 2**20:
+                self._pop_least_recently_used()
+
+    def _pop_least_recently_used(self):
+        key, instance = self._instances.popitem(last=False)
+        self._memory -= self._footprints.pop(key)
+        self._logger.info("Unloading %s", instance.__class__.__name__)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns:
+            Dict[str, float]: number of loaded and loading instances, and estimated memory (in MB) of the loaded ones
+        """
+        with self._lock:
+            return {
+                "instances": len(self._instances),
+                "loading": len(self._loading),
+                "memory_mb": self._memory / 2**20,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._instances.clear()
+            self._footprints.clear()
+            self._memory = 0
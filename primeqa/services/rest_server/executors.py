@@ -0,0 +1,94 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from primeqa.services.exceptions import Error, ErrorMessages
+
+
+class ComponentExecutor:
+    """
+    Bounded thread pool that runs the blocking work of one component type (reader, retriever or indexer)
+    for `async` request handlers, so that it neither blocks the event loop nor starves other endpoints.
+
+    Admission control: once `max_workers` calls are running and `max_queued` more are waiting, further calls are
+    rejected right away instead of piling up.
+
+    Args:
+        name (str): Component type, used in thread names and error messages.
+        max_workers (int): Maximum number of calls running at once.
+        max_queued (int): Maximum number of calls waiting for a worker.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queued: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"{name}-executor"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Runs `fn(*args, **kwargs)` on a worker thread.
+
+        Raises:
+            Error: if the executor is saturated
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queued:
+                self._rejected += 1
+                raise Error(ErrorMessages.SERVER_BUSY.value.format(self.name))
+            self._pending += 1
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, functools.partial(self._call, fn, *args, **kwargs)
+            )
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _call(self, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            self._running += 1
+
+        failed = True
+        try:
+            result = fn(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            with self._lock:
+                self._running -= 1
+                if failed:
+                    self._failed += 1
+                else:
+                    self._completed += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: number of "running" and "queued" calls, limits and counts of finished calls
+        """
+        with self._lock:
+            return {
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "max_workers": self.max_workers,
+                "max_queued": self.max_queued,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -1,6 +1,7 @@
+import functools
 import logging
 import time
-from typing import List
+from typing import Callable, Dict, List
 
 
 import uvicorn
@@ -8,6 +9,7 @@ from fastapi import FastAPI, status, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
 from primeqa.services.configurations import Settings
+from primeqa.services.batching import ReaderScheduler, RetrieverScheduler
 from primeqa.services.constants import ATTR_STATUS, ATTR_INDEX_ID, IndexStatus, ATTR_ENGINE_TYPE
 from primeqa.services.factories import (
     READERS_REGISTRY,
@@ -31,6 +33,7 @@ from primeqa.services.rest_server.data_models import (
     Hit,
 )
 from primeqa.services.rest_server.utils import generate_parameters
+from primeqa.services.rest_server.executors import ComponentExecutor
 
 
 class RestServer:
@@ -48,13 +51,100 @@ class RestServer:
                 self._config = config
 
             self._store = StoreFactory.get_store()
+            self._reader_scheduler = ReaderScheduler(
+                max_batch_size=self._config.reader_max_batch_size,
+                max_latency_ms=self._config.reader_max_batch_latency_ms,
+            )
+            self._retriever_scheduler = RetrieverScheduler(
+                max_batch_size=self._config.retriever_max_batch_size,
+                max_latency_ms=self._config.retriever_max_batch_latency_ms,
+            )
+
+            # Bounded executors for the blocking work of async handlers, per component type
+            self._executors = {}
+            if self._config.rest_async_handlers:
+                self._executors = {
+                    "reader": ComponentExecutor(
+                        "reader",
+                        max_workers=self._config.rest_reader_threads,
+                        max_queued=self._config.rest_max_queued_requests,
+                    ),
+                    "retriever": ComponentExecutor(
+                        "retriever",
+                        max_workers=self._config.rest_retriever_threads,
+                        max_queued=self._config.rest_max_queued_requests,
+                    ),
+                    "indexer": ComponentExecutor(
+                        "indexer",
+                        max_workers=self._config.rest_indexer_threads,
+                        max_queued=self._config.rest_max_queued_requests,
+                    ),
+                }
         except Exception as ex:
             self._logger.exception("Error configuring server: %s", ex)
             raise
 
-    def run(self) -> None:
-        start_t = time.time()
+    def _route(
+        self,
+        route: Callable,
+        path: str,
+        executor: ComponentExecutor = None,
+        **route_kwargs,
+    ) -> Callable:
+        """
+        Decorator registering a handler with a FastAPI route decorator (e.g., `app.get`).
+
+        If `rest_async_handlers` is enabled, the handler is served by an `async` endpoint: handlers with an
+        `executor` run on it (requests it rejects get a 503 response), the other (cheap) handlers run on the
+        event loop, so that they stay responsive while the executors are busy.
+
+        Args:
+            route (Callable): FastAPI route decorator.
+            path (str): Route path.
+            executor (ComponentExecutor, optional): Executor for the blocking work of the handler. Defaults to None.
+            **route_kwargs: Keyword arguments for the route decorator.
+        """
+
+        def decorator(handler: Callable) -> Callable:
+            if not self._config.rest_async_handlers:
+                return route(path, **route_kwargs)(handler)
+
+            @functools.wraps(handler)
+            async def async_handler(*args, **kwargs):
+                if executor is None:
+                    return handler(*args, **kwargs)
 
+                try:
+                    return await executor.run(handler, *args, **kwargs)
+                except Error as err:
+                    mobj = PATTERN_ERROR_MESSAGE.match(err.args[0])
+                    raise HTTPException(
+                        status_code=503,
+                        detail={
+                            "code": mobj.group(1).strip(),
+                            "message": mobj.group(2).strip(),
+                        },
+                        headers={"Retry-After": "1"},
+                    ) from None
+
+            return route(path, **route_kwargs)(async_handler)
+
+        return decorator
+
+    def shutdown(self) -> None:
+        """
+        Shuts down the executors of the async handlers, once the server stops.
+        """
+        for executor in self._executors.values():
+            executor.shutdown()
+
+    def create_app(self) -> FastAPI:
+        """
+        Creates the FastAPI application with all the routes of the service.
+
+        Returns:
+            FastAPI: application
+        """
         ############################################################################################
         #                                   API SERVER
         ############################################################################################
@@ -78,11 +168,13 @@ class RestServer:
             allow_methods=["*"],
             allow_headers=["*"],
         )
+        app.add_event_handler("shutdown", self.shutdown)
 
         ############################################################################################
         #                           Reader API
         ############################################################################################
-        @app.get(
+        @self._route(
+            app.get,
             "/readers",
             status_code=status.HTTP_200_OK,
             response_model=List[Reader],
@@ -110,8 +202,10 @@ class RestServer:
                     detail={"code": error_code, "message": error_message},
                 ) from None
 
-        @app.post(
+        @self._route(
+            app.post,
             "/answers",
+            executor=self._executors.get("reader"),
             status_code=status.HTTP_201_CREATED,
             response_model=List[List[Answer]],
             tags=["Reader"],
@@ -177,12 +271,13 @@ class RestServer:
                                 for k, v in reader_kwargs.items()
                             },
                             query,
-                            request.contexts[idx].texts,
+                            request.contexts[idx],
                         )
                         try:
-                            predictions = instance.apply(
-                                input_texts=[query] * len(request.contexts[idx]),
-                                context=[[text] for text in request.contexts[idx]],
+                            predictions = self._reader_scheduler.predict(
+                                instance,
+                                questions=[query] * len(request.contexts[idx]),
+                                contexts=[[text] for text in request.contexts[idx]],
                                 **reader_kwargs,
                             )
                             self._logger.info(
@@ -195,25 +290,19 @@ class RestServer:
                             # Step 5.b: Add answers for current query into response object
                             answers_response.append(
                                 [
-                                    [
-                                        {
-                                            "text": prediction["span_answer_text"],
-                                            "start_char_offset": prediction[
-                                                "span_answer"
-                                            ]["start_position"],
-                                            "end_char_offset": prediction[
-                                                "span_answer"
-                                            ]["end_position"],
-                                            "confidence_score": prediction[
-                                                "confidence_score"
-                                            ],
-                                            "passage_index": int(
-                                                prediction["example_id"]
-                                            ),
-                                        }
-                                        for prediction in predictions_for_context
-                                    ]
-                                    for predictions_for_context in predictions
+                                    {
+                                        "text": prediction["span_answer_text"],
+                                        "start_char_offset": prediction["span_answer"][
+                                            "start_position"
+                                        ],
+                                        "end_char_offset": prediction["span_answer"][
+                                            "end_position"
+                                        ],
+                                        "confidence_score": prediction["confidence_score"],
+                                        "context_index": int(prediction["example_id"]),
+                                    }
+                                    for predictions_for_context in predictions.values()
+                                    for prediction in predictions_for_context
                                 ]
                             )
 
@@ -230,24 +319,9 @@ class RestServer:
                             len(request.contexts), len(request.queries)
                         )
                     ) from err
-                # Step 5: Return
-                return [
-                    [
-                        {
-                            "text": prediction["span_answer_text"],
-                            "start_char_offset": prediction["span_answer"][
-                                "start_position"
-                            ],
-                            "end_char_offset": prediction["span_answer"][
-                                "end_position"
-                            ],
-                            "confidence_score": prediction["confidence_score"],
-                            "context_index": int(prediction["example_id"]),
-                        }
-                        for prediction in predictions_for_passage
-                    ]
-                    for predictions_for_passage in predictions
-                ]
+
+                # Step 6: Return
+                return answers_response
 
             except Error as err:
                 error_message = err.args[0]
@@ -268,7 +342,8 @@ class RestServer:
         ############################################################################################
         #                           Indexer API
         ############################################################################################
-        @app.get(
+        @self._route(
+            app.get,
             "/indexers",
             status_code=status.HTTP_200_OK,
             response_model=List[Indexer],
@@ -280,8 +355,10 @@ class RestServer:
                 for indexer_id, indexer in INDEXERS_REGISTRY.items()
             ]
 
-        @app.post(
+        @self._route(
+            app.post,
             "/indexes",
+            executor=self._executors.get("indexer"),
             status_code=status.HTTP_201_CREATED,
             response_model=IndexInformation,
             tags=["Indexer"],
@@ -401,7 +478,8 @@ class RestServer:
                     detail={"code": error_code, "message": error_message},
                 ) from None
 
-        @app.get(
+        @self._route(
+            app.get,
             "/index/{index_id}/status",
             status_code=status.HTTP_200_OK,
             response_model=dict,
@@ -437,7 +515,8 @@ class RestServer:
         ############################################################################################
         #                           Retriever API
         ############################################################################################
-        @app.get(
+        @self._route(
+            app.get,
             "/retrievers",
             status_code=status.HTTP_200_OK,
             response_model=List[Retriever],
@@ -452,8 +531,10 @@ class RestServer:
                 for retriever_id, retriever in RETRIEVERS_REGISTRY.items()
             ]
 
-        @app.post(
+        @self._route(
+            app.post,
             "/documents",
+            executor=self._executors.get("retriever"),
             status_code=status.HTTP_201_CREATED,
             response_model=List[List[Hit]],
             tags=["Retriever"],
@@ -541,8 +622,8 @@ class RestServer:
                     request.queries,
                 )
                 try:
-                    results = instance.retrieve(
-                        input_texts=request.queries, **retriever_kwargs
+                    results = self._retriever_scheduler.retrieve(
+                        instance, input_texts=request.queries, **retriever_kwargs
                     )
                     self._logger.info(
                         "Applying '%s' retriever for queries = %s returns results = %s",
@@ -557,32 +638,44 @@ class RestServer:
                         )
                     ) from err
 
-                # Step 7: Return
+                # Step 7: Fetch documents for all hits at once
+                try:
+                    documents = self._store.get_index_documents(
+                        index_id=request.index_id,
+                        document_ids=[
+                            hit[0]
+                            for result_per_query in results
+                            for hit in result_per_query
+                        ],
+                    )
+                except FileNotFoundError:
+                    documents = {}
+
+                # Step 8: Return
                 hits = []
                 for result_per_query in results:
                     hits_per_query = []
                     for hit in result_per_query:
                         try:
-                            document = self._store.get_index_document(
-                                index_id=request.index_id, document_idx=hit[0]
-                            )
-                            hits_per_query.append(
-                                {
-                                    "document": {
-                                        "text": document["text"],
-                                        "document_id": document["document_id"]
-                                        if "document_id" in document
-                                        else None,
-                                        "title": document["title"]
-                                        if "title" in document
-                                        else None,
-                                    },
-                                    "score": hit[1],
-                                }
-                            )
-                        except (FileNotFoundError, KeyError):
+                            document = documents[str(hit[0])]
+                        except KeyError:
                             continue
 
+                        hits_per_query.append(
+                            {
+                                "document": {
+                                    "text": document["text"],
+                                    "document_id": document["document_id"]
+                                    if "document_id" in document
+                                    else None,
+                                    "title": document["title"]
+                                    if "title" in document
+                                    else None,
+                                },
+                                "score": hit[1],
+                            }
+                        )
+
                     hits.append(hits_per_query)
 
                 return hits
@@ -603,6 +696,26 @@ class RestServer:
                     detail={"code": error_code, "message": error_message},
                 ) from None
 
+        ############################################################################################
+        #                           Service API
+        ############################################################################################
+        @self._route(
+            app.get,
+            "/metrics",
+            status_code=status.HTTP_200_OK,
+            response_model=Dict[str, Dict[str, int]],
+            tags=["Service"],
+        )
+        def get_metrics():
+            # Queue depth and call counts of the executors of each component type (empty without async handlers)
+            return {name: executor.stats() for name, executor in self._executors.items()}
+
+        return app
+
+    def run(self) -> None:
+        start_t = time.time()
+        app = self.create_app()
+
         ############################################################################################
         #                                   API SERVER CONFIGURATION
         ############################################################################################
@@ -1,12 +1,17 @@
-from typing import List
+from typing import Any, Callable, Dict, Iterable, List, Union
 import os
+import json
+import pickle
 import shutil
+import sqlite3
+import threading
 from pathlib import Path
 import glob
 
 from cachetools.func import ttl_cache
 from sqlitedict import SqliteDict
 
+from primeqa.pipelines.components.cache import LRUCache
 from primeqa.services.utils import generate_id, load_json, save_json
 
 
@@ -23,6 +28,8 @@ EXTN_JSON = ".json"
 EXTN_TSV = ".tsv"
 EXTN_TXT = ".txt"
 EXTN_SQL_LITE = ".sqlite"
+TABLENAME_DOCUMENTS = "documents"
+MAX_CACHED_DOCUMENTS = 10000
 
 #############################################################################################
 # indexes/
@@ -37,8 +44,26 @@ EXTN_SQL_LITE = ".sqlite"
 #        <model-id>/
 #               *.dnn|*.model
 #############################################################################################
+def encode_document(document: dict) -> str:
+    """
+    Encode a document as compact JSON to be stored in `documents.sqlite`.
+    """
+    return json.dumps(document, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_document(value: Any) -> dict:
+    """
+    Decode a document stored in `documents.sqlite`. Stores created before documents were encoded as JSON hold
+    pickled documents, which are still decoded.
+    """
+    if isinstance(value, str):
+        return json.loads(value)
+
+    return pickle.loads(bytes(value))
+
+
 class Store:
-    def __init__(self):
+    def __init__(self, max_cached_documents: int = MAX_CACHED_DOCUMENTS):
         self.root_dir = os.getenv(
             "STORE_DIR", os.path.join(Path(__file__).parent.parent.parent, "store")
         )
@@ -57,6 +82,9 @@ class Store:
         if not os.path.exists(os.path.join(self.root_dir, DIR_NAME_MODELS)):
             os.makedirs(os.path.join(self.root_dir, DIR_NAME_MODELS))
 
+        # Most recently fetched documents, keyed by (index id, document id)
+        self._documents_cache = LRUCache(maxsize=max_cached_documents)
+
     def exists(self, path: str):
         return os.path.exists(path)
 
@@ -80,67 +108,92 @@ class Store:
         )
 
     @ttl_cache(maxsize=10, ttl=10 * 60)
-    def get_index_documents_database(self, index_id: str):
-        return SqliteDict(
-            self.get_index_documents_file_path(index_id, extension=EXTN_SQL_LITE),
-            tablename="documents",
+    def get_index_documents_database(self, index_id: str) -> "IndexDocumentsReader":
+        return IndexDocumentsReader(
+            self.get_index_documents_file_path(index_id, extension=EXTN_SQL_LITE)
         )
 
     def get_index_document(self, index_id: str, document_idx: int):
-        database = self.get_index_documents_database(index_id=index_id)
-        return database[str(document_idx)]
+        return self.get_index_documents(index_id=index_id, document_ids=[document_idx])[
+            str(document_idx)
+        ]
 
-    def save_index_documents(self, index_id: str, documents: List[dict]):
-        # Step 1: Create `documents.tsv` in index directory
-        documents_tsv_file_path = self.get_index_documents_file_path(
-            index_id, extension=EXTN_TSV
-        )
-        os.makedirs(os.path.dirname(documents_tsv_file_path), exist_ok=True)
+    def get_index_documents(
+        self, index_id: str, document_ids: Iterable[Union[int, str]]
+    ) -> Dict[str, dict]:
+        """
+        Get documents of an index in bulk.
 
-        # Step 2: Create `documents.sqlite` in index directory
-        documents_sqlite_file_path = self.get_index_documents_file_path(
-            index_id, extension=EXTN_SQL_LITE
-        )
-        os.makedirs(os.path.dirname(documents_sqlite_file_path), exist_ok=True)
+        Parameters
+        ----------
+        index_id: str
+            unique identifier for the index.
+        document_ids: Iterable[Union[int, str]]
+            ids of the documents, as returned by retrievers.
 
-    def get_index_document(self, index_id: str, document_idx: int):
-        database = self.get_index_documents_database(index_id=index_id)
-        return database[str(document_idx)]
+        Returns
+        -------
+        Dict[str, dict]:
+            documents by id (as str). Ids without a document are left out.
 
-    def save_index_documents(self, index_id: str, documents: List[dict]):
-        # Step 1: Create `documents.tsv` in index directory
-        documents_tsv_file_path = self.get_index_documents_file_path(
-            index_id, extension=EXTN_TSV
-        )
-        os.makedirs(os.path.dirname(documents_tsv_file_path), exist_ok=True)
+        """
+        documents = {}
+        missing_document_ids = []
+        for document_id in map(str, document_ids):
+            if document_id in documents:
+                continue
+
+            document = self._documents_cache.get((index_id, document_id))
+            if document is None:
+                missing_document_ids.append(document_id)
+            else:
+                documents[document_id] = document
+
+        if missing_document_ids:
+            database = self.get_index_documents_database(index_id=index_id)
+            for document_id, document in database.get(missing_document_ids).items():
+                self._documents_cache.put((index_id, document_id), document)
+                documents[document_id] = document
+
+        return documents
+
+    def _clear_index_documents_caches(self):
+        self.get_index_documents_database.cache_clear()
+        self._documents_cache.clear()
 
-        # Step 2: Create `documents.sqlite` in index directory
-        documents_sqlite_file_path = self.get_index_documents_file_path(
-            index_id, extension=EXTN_SQL_LITE
+    def open_index_documents_writer(
+        self, index_id: str, batch_size: int = 1000
+    ) -> "IndexDocumentsWriter":
+        """
+        Open a writer which appends documents to `documents.tsv` and `documents.sqlite` in index directory.
+
+        Parameters
+        ----------
+        index_id: str
+            unique identifier for the index.
+        batch_size: int
+            number of documents inserted into `documents.sqlite` per transaction (default: 1000)
+
+        Returns
+        -------
+        IndexDocumentsWriter:
+            writer to be closed once all documents are written.
+
+        """
+        return IndexDocumentsWriter(
+            documents_tsv_file_path=self.get_index_documents_file_path(
+                index_id, extension=EXTN_TSV
+            ),
+            documents_sqlite_file_path=self.get_index_documents_file_path(
+                index_id, extension=EXTN_SQL_LITE
+            ),
+            batch_size=batch_size,
+            on_close=self._clear_index_documents_caches,
         )
-        os.makedirs(os.path.dirname(documents_sqlite_file_path), exist_ok=True)
 
-        # Step 3: Iterate over documents in the request to save to `documents.tsv` and `documents.sqlite`
-        with open(
-            documents_tsv_file_path, "w", encoding="utf-8"
-        ) as documents_file, SqliteDict(
-            documents_sqlite_file_path, tablename="documents"
-        ) as documents_db:
-            # Step 3.a: Add heading row to `documents.tsv`
-            documents_file.write("id\ttext\ttitle\n")
-
-            # Step 3.b: Iterate over documents to add rows to `documents.tsv` and entries in documents_db
-            for document_idx, document in enumerate(documents):
-                documents_file.write(
-                    f"{str(document_idx + 1)}\t{document['text']}\t{document['title'] if 'title' in document else ''}\n"
-                )
-                documents_db[str(document_idx + 1)] = document
-
-            # Step 3.c: Commit to save documents_db
-            documents_db.commit()
-
-        # Step 4: Clear cache
-        self.get_index_documents_database.cache_clear()
+    def save_index_documents(self, index_id: str, documents: Iterable[dict]):
+        with self.open_index_documents_writer(index_id) as writer:
+            writer.write(documents)
 
     #############################################################################################
     #                       Indexes
@@ -228,6 +281,8 @@ class Store:
         if os.path.exists(index_dir_to_be_deleted):
             shutil.rmtree(index_dir_to_be_deleted)
 
+        self._clear_index_documents_caches()
+
     def get_index_information(self, index_id: str) -> dict:
         """
         Get index information.
@@ -277,6 +332,140 @@ class Store:
         )
 
 
+class IndexDocumentsReader:
+    """
+    Reads documents from `documents.sqlite` in bulk: the documents for a list of ids are fetched with one
+    `SELECT ... WHERE key IN (...)` query per `chunk_size` ids, instead of one query per document.
+
+    The connection is shared by all threads.
+    """
+
+    def __init__(self, documents_sqlite_file_path: str, chunk_size: int = 500):
+        if not os.path.exists(documents_sqlite_file_path):
+            raise FileNotFoundError(documents_sqlite_file_path)
+
+        self.chunk_size = chunk_size
+        self._connection = sqlite3.connect(
+            documents_sqlite_file_path, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+
+    def get(self, document_ids: List[str]) -> Dict[str, dict]:
+        """
+        Get documents by id. Ids without a document are left out.
+        """
+        documents = {}
+        with self._lock:
+            for start in range(0, len(document_ids), self.chunk_size):
+                chunk = document_ids[start : start + self.chunk_size]
+                rows = self._connection.execute(
+                    f'SELECT key, value FROM "{TABLENAME_DOCUMENTS}" WHERE key IN ({", ".join("?" * len(chunk))})',
+                    chunk,
+                ).fetchall()
+                for key, value in rows:
+                    documents[key] = decode_document(value)
+
+        return documents
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class IndexDocumentsWriter:
+    """
+    Appends documents to `documents.tsv` and `documents.sqlite` as they arrive, so that the documents of an index
+    never have to be held in memory all at once. Rows are written through a buffered file and inserted into the
+    database in batches of `batch_size` documents per transaction.
+
+    Documents are numbered from 1 in the order they are written.
+    """
+
+    def __init__(
+        self,
+        documents_tsv_file_path: str,
+        documents_sqlite_file_path: str,
+        batch_size: int = 1000,
+        buffer_size: int = 2**20,
+        on_close: Union[Callable[[], None], None] = None,
+    ):
+        self.batch_size = max(batch_size, 1)
+        self.num_documents = 0
+        self._on_close = on_close
+        self._batch = {}
+
+        # Step 1: Create `documents.tsv` in index directory and add heading row
+        os.makedirs(os.path.dirname(documents_tsv_file_path), exist_ok=True)
+        self._documents_file = open(
+            documents_tsv_file_path, "w", encoding="utf-8", buffering=buffer_size
+        )
+        self._documents_file.write("id\ttext\ttitle\n")
+
+        # Step 2: Create `documents.sqlite` in index directory
+        os.makedirs(os.path.dirname(documents_sqlite_file_path), exist_ok=True)
+        self._documents_db = SqliteDict(
+            documents_sqlite_file_path,
+            tablename=TABLENAME_DOCUMENTS,
+            flag="w",
+            encode=encode_document,
+            decode=decode_document,
+        )
+
+    def write(self, documents: Iterable[dict]) -> int:
+        """
+        Append documents.
+
+        Parameters
+        ----------
+        documents: Iterable[dict]
+            documents with "text" and, optionally, "title" and "document_id".
+
+        Returns
+        -------
+        int:
+            number of documents written so far.
+
+        """
+        for document in documents:
+            self.num_documents += 1
+            self._documents_file.write(
+                f"{str(self.num_documents)}\t{document['text']}\t{document['title'] if 'title' in document else ''}\n"
+            )
+            self._batch[str(self.num_documents)] = document
+            if len(self._batch) >= self.batch_size:
+                self.flush()
+
+        return self.num_documents
+
+    def flush(self):
+        """
+        Insert pending documents into `documents.sqlite` in one transaction.
+        """
+        if self._batch:
+            self._documents_db.update(self._batch)
+            self._documents_db.commit()
+            self._batch = {}
+
+    def close(self):
+        if self._documents_db is None:
+            return
+
+        try:
+            self.flush()
+            self._documents_file.close()
+            self._documents_db.close()
+        finally:
+            self._documents_db = None
+            if self._on_close is not None:
+                self._on_close()
+
+    def __enter__(self) -> "IndexDocumentsWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
 class StoreFactory:
     _instance = None
 
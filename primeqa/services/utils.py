@@ -56,5 +56,8 @@ def save_json(item, file_path: str, encoding: str = "utf-8"):
 
     """
     os.makedirs(os.path.dirname(file_path), exist_ok=True)
-    with open(file_path, "w", encoding=encoding) as file:
+    # Write to a temporary file first, so that concurrent readers never see a partially written file
+    temp_file_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_file_path, "w", encoding=encoding) as file:
         json.dump(item, file, indent=4)
+    os.replace(temp_file_path, file_path)
@@ -0,0 +1,47 @@
+import copy
+import logging
+from typing import Callable, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def quantize_dynamic_int8(model: torch.nn.Module,
+                          accuracy_check: Optional[Callable[[torch.nn.Module, torch.nn.Module], float]] = None,
+                          min_score: float = 0.0) -> torch.nn.Module:
+    """
+    Returns a copy of the model whose Linear layers run in int8 on CPU: their weights are quantized once,
+    their activations are quantized on the fly, so no calibration data is needed to quantize.
+    The model itself is left untouched.
+
+    :param model: model on CPU, in eval mode
+    :param accuracy_check: called with the original and the quantized model, returns a score where higher means
+                           the quantized model is closer to the original one (e.g. from `output_similarity`)
+    :param min_score: if the score of accuracy_check is below this, the original model is returned instead
+    :return: the quantized model, or the original model if it failed the accuracy check
+    """
+    quantized = torch.ao.quantization.quantize_dynamic(copy.deepcopy(model), {torch.nn.Linear}, dtype=torch.qint8)
+    quantized.eval()
+
+    if accuracy_check is not None:
+        with torch.no_grad():
+            score = accuracy_check(model, quantized)
+        if score < min_score:
+            logger.warning(f'Keeping the fp32 {model.__class__.__name__}: accuracy check score of the '
+                           f'int8 model {score:.4f} < {min_score}')
+            return model
+        logger.info(f'Quantized {model.__class__.__name__} to int8, accuracy check score {score:.4f}')
+
+    return quantized
+
+
+def output_similarity(reference: torch.Tensor, quantized: torch.Tensor, mask: Optional[torch.Tensor] = None) -> float:
+    """
+    Mean cosine similarity between the vectors (along the last dimension) of the outputs of a model and
+    of its quantized version, over the positions where mask is true.
+    """
+    similarities = torch.nn.functional.cosine_similarity(reference.float(), quantized.float(), dim=-1)
+    if mask is not None:
+        similarities = similarities[mask.bool()]
+    return similarities.mean().item()
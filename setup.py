@@ -97,9 +97,10 @@ _deps = {
     "uvicorn~=0.18.0": ["install", "gpu"],
     "cachetools~=5.2.0": ["install", "gpu"],
     "sqlitedict~=2.0.0": ["install", "gpu"],
+    "onnxruntime~=1.13.1": ["onnx", "tests"],
 }
 
-extras_names = ["docs", "dev", "install", "notebooks", "tests", "gpu"]
+extras_names = ["docs", "dev", "install", "notebooks", "tests", "gpu", "onnx"]
 extras = {extra_name: [] for extra_name in extras_names}
 for dep_package_name, dep_package_required_by in _deps.items():
     if not dep_package_required_by:
@@ -0,0 +1,111 @@
+from tests.primeqa.mrc.common.base import UnitTest
+import pytest
+import torch
+
+from primeqa.ir.dense.colbert_top.colbert.infra.config import ColBERTConfig
+from primeqa.ir.dense.colbert_top.colbert.indexing.codecs import residual
+from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual import ResidualCodec
+from primeqa.ir.dense.colbert_top.colbert.modeling.colbert import segmented_maxsim
+from primeqa.ir.dense.colbert_top.colbert.search.index_storage import filter_pids, decompress_residuals
+from primeqa.ir.dense.colbert_top.colbert.search.strided_tensor import segmented_lookup
+from primeqa.ir.dense.colbert_top.colbert.utils.cpp_extensions import load_extension
+
+
+def extension_or_skip(name):
+    extension = load_extension(name)
+    if extension is None:
+        pytest.skip(f"The {name} extension cannot be built here.")
+    return extension
+
+
+def random_segments(num_segments, max_length, generator):
+    lengths = torch.randint(0, max_length + 1, (num_segments,), generator=generator)
+    offsets = torch.cumsum(lengths, dim=0) - lengths
+    return lengths, offsets
+
+
+class TestExtensions(UnitTest):
+    """
+        The PyTorch implementations of the C++ extensions must return the same outputs, bit for bit.
+    """
+
+    def test_segmented_lookup(self):
+        extension = extension_or_skip('segmented_lookup')
+        generator = torch.Generator().manual_seed(0)
+
+        lengths, offsets = random_segments(100, 12, generator)
+        pids = torch.randperm(100, generator=generator)[:40]
+
+        for dtype in [torch.uint8, torch.int32, torch.int64, torch.float32, torch.float16]:
+            for inner_dims in [(), (16,)]:
+                input = torch.randint(0, 100, (int(lengths.sum()), *inner_dims), generator=generator).to(dtype)
+                expected = extension(input, pids, lengths[pids], offsets[pids])
+
+                assert torch.equal(segmented_lookup(input, pids, lengths[pids], offsets[pids]), expected)
+
+    def test_segmented_maxsim(self):
+        extension = extension_or_skip('segmented_maxsim')
+        generator = torch.Generator().manual_seed(0)
+
+        lengths, _ = random_segments(50, 30, generator)
+        scores = torch.rand(int(lengths.sum()), 32, generator=generator) * 2 - 1
+
+        assert torch.equal(segmented_maxsim(scores, lengths), extension(scores, lengths))
+
+    def test_filter_pids(self):
+        extension = extension_or_skip('filter_pids')
+        generator = torch.Generator().manual_seed(0)
+
+        doclens, offsets = random_segments(2000, 40, generator)
+        doclens[doclens == 0] = 1
+        offsets = torch.cumsum(doclens, dim=0) - doclens
+        codes = torch.randint(0, 256, (int(doclens.sum()),), generator=generator).to(torch.int32)
+
+        # Rounded scores, so that ties between passages have to be broken as the extension does
+        centroid_scores = (torch.rand(256, 32, generator=generator) * 10).round() / 10
+        idx = centroid_scores.max(-1).values >= 0.9
+        pids = torch.randperm(2000, generator=generator)[:1500].to(torch.int32)
+
+        for ndocs in [256, 1024]:
+            expected = extension(pids, centroid_scores, codes, doclens, offsets, idx, ndocs)
+            assert torch.equal(filter_pids(pids, centroid_scores, codes, doclens, offsets, idx, ndocs), expected)
+
+    def test_decompress_residuals(self):
+        extension = extension_or_skip('decompress_residuals')
+        generator = torch.Generator().manual_seed(0)
+
+        for nbits in [1, 2, 4]:
+            config = ColBERTConfig(dim=64, nbits=nbits)
+            codec = ResidualCodec(config, centroids=torch.randn(128, 64, generator=generator),
+                                  bucket_cutoffs=torch.linspace(-0.1, 0.1, 2 ** nbits - 1),
+                                  bucket_weights=torch.linspace(-0.2, 0.2, 2 ** nbits))
+
+            doclens, offsets = random_segments(300, 20, generator)
+            codes = torch.randint(0, 128, (int(doclens.sum()),), generator=generator).to(torch.int32)
+            residuals = torch.randint(0, 256, (int(doclens.sum()), 64 * nbits // 8), generator=generator)
+            residuals = residuals.to(torch.uint8)
+            pids = torch.randperm(300, generator=generator)[:100].to(torch.int32)
+
+            args = (pids, doclens, offsets, codec.bucket_weights, codec.reversed_bit_map,
+                    codec.decompression_lookup_table, residuals, codes, codec.centroids, 64, nbits)
+            assert torch.equal(decompress_residuals(*args), extension(*args))
+
+    def test_packbits(self):
+        generator = torch.Generator().manual_seed(0)
+        bits = torch.randint(0, 2, (1024,), generator=generator).to(torch.uint8)
+
+        import numpy as np
+        assert torch.equal(residual.packbits(bits), torch.from_numpy(np.packbits(bits.numpy())))
+
+        if torch.cuda.is_available():
+            extension = extension_or_skip('packbits_cuda')
+            assert torch.equal(residual.packbits(bits.cuda()), extension(bits.cuda()))
+
+
+if __name__ == '__main__':
+    test = TestExtensions()
+    test.test_segmented_lookup()
+    test.test_segmented_maxsim()
+    test.test_filter_pids()
+    test.test_decompress_residuals()
+    test.test_packbits()
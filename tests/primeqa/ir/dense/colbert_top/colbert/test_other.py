@@ -2,11 +2,37 @@ from tests.primeqa.mrc.common.base import UnitTest
 import pytest
 import os
 import tempfile
+import torch
 
 from argparse import ArgumentParser
 from primeqa.ir.dense.colbert_top.colbert.utils.parser import Arguments
 from primeqa.ir.dense.colbert_top.utility.preprocess.docs2passages import main as docs2passages_main
+from primeqa.ir.dense.colbert_top.colbert.data.collection import Collection
+from primeqa.ir.dense.colbert_top.colbert.modeling.tokenization.utils import _sort_by_length, \
+    _split_into_length_bucketed_batches
+from primeqa.ir.dense.colbert_top.colbert.modeling.tokenization import QueryTokenizer, DocTokenizer
+from primeqa.ir.dense.colbert_top.colbert.training.tokenized_cache import PrefetchingBatcher, TokenizedTexts,     TokenizedTextsWriter, collate_queries, collate_docs
+from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual import argmax_inner_product
+from primeqa.ir.dense.colbert_top.colbert.indexing.utils import unique_postings
+from primeqa.ir.dense.colbert_top.colbert.indexing.loaders import save_flat_tensor, load_flat_tensor, open_flat_file
+from primeqa.ir.dense.colbert_top.colbert.indexing.index_saver import IndexSaver
+from primeqa.ir.dense.colbert_top.colbert.indexing.collection_indexer import compute_streaming_kmeans
+from primeqa.ir.dense.colbert_top.colbert.search.strided_tensor import encode_delta_varint, decode_delta_varint
 import argparse
+import json
+import shutil
+import threading
+
+
+def write_bert_tokenizer(dir):
+    # a small uncased BERT vocabulary, laid out like bert-base-uncased's for the special tokens
+    vocab = ['[PAD]'] + [f'[unused{i}]' for i in range(99)] + ['[UNK]', '[CLS]', '[SEP]', '[MASK]', '.'] + \
+        'what is a the of colbert late interaction retrieval model passage query with bert tokens'.split()
+    with open(os.path.join(dir, 'vocab.txt'), 'w') as f:
+        f.write('\n'.join(vocab) + '\n')
+    with open(os.path.join(dir, 'tokenizer_config.json'), 'w') as f:
+        json.dump({'tokenizer_class': 'BertTokenizer', 'do_lower_case': True, 'model_max_length': 512}, f)
+
 
 class TestOther(UnitTest):
 
@@ -58,6 +84,191 @@ class TestOther(UnitTest):
 
         docs2passages_main(args)
 
+    def test_lazy_collection(self):
+        test_files_location = 'tests/resources/ir_dense'
+        collection_fn = os.path.join(test_files_location, "xorqa.train_ir_001pct_at_0_pct_collection_fornum.tsv")
+
+        with tempfile.TemporaryDirectory() as working_dir:
+            lazy_collection_fn = shutil.copy(collection_fn, working_dir)
+
+            collection = Collection(path=collection_fn)
+            lazy_collection = Collection(path=lazy_collection_fn, lazy=True)
+            assert os.path.exists(lazy_collection_fn + '.offsets.npy')
+
+            assert len(lazy_collection) == len(collection)
+            assert list(lazy_collection) == list(collection)
+            assert [lazy_collection[pid] for pid in reversed(range(len(collection)))] == list(reversed(collection.data))
+
+            batches = list(lazy_collection.enumerate_batches(rank=0, chunksize=7))
+            assert batches == list(collection.enumerate_batches(rank=0, chunksize=7))
+
+            # the cached offsets are reused
+            assert len(Collection(path=lazy_collection_fn, lazy=True)) == len(collection)
+
+    def test_length_bucketed_batches(self):
+        lengths = [7, 3, 12, 5, 12, 4, 9, 2, 3]
+        mask = (torch.arange(12).unsqueeze(0) < torch.tensor(lengths).unsqueeze(1)).long()
+        ids = (torch.arange(len(lengths)).unsqueeze(1) + 1) * mask
+
+        sorted_ids, sorted_mask, reverse_indices = _sort_by_length(ids, mask, bsize=4, max_batch_tokens=20)
+        batches = _split_into_length_bucketed_batches(sorted_ids, sorted_mask, bsize=4, max_batch_tokens=20)
+
+        for batch_ids, batch_mask in batches:
+            assert batch_ids.size(0) <= 4
+            assert batch_ids.size(0) == 1 or batch_ids.numel() <= 20
+            assert batch_mask[:, -1].any()  # only padded to the longest sequence of the batch
+
+        unpadded = [row[row > 0].tolist() for batch_ids, _ in batches for row in batch_ids]
+        assert [unpadded[idx] for idx in reverse_indices.tolist()] == [row[row > 0].tolist() for row in ids]
+
+    def test_prefetching_batcher(self):
+        class Batcher:
+            def __init__(self):
+                self.position = 0
+
+            def __len__(self):
+                return 10
+
+            def __next__(self):
+                if self.position == 10:
+                    raise StopIteration
+                self.position += 1
+                return self.position - 1
+
+            def skip_to_batch(self, batch_idx, intended_batch_size):
+                self.position = batch_idx
+
+        batcher = PrefetchingBatcher(Batcher(), prefetch=3)
+        batcher.skip_to_batch(2, 1)
+        assert len(batcher) == 10
+        assert list(batcher) == list(range(2, 10))
+        assert list(batcher) == []
+
+    def test_tokenized_cache(self):
+        texts = ['what is colbert', 'colbert', 'the late interaction of a bert model with query and passage tokens',
+                 'a passage', 'retrieval with late interaction', '']
+
+        with tempfile.TemporaryDirectory() as working_dir:
+            write_bert_tokenizer(working_dir)
+            tokenizers = [QueryTokenizer(8, working_dir, attend_to_mask_tokens=False),
+                          QueryTokenizer(8, working_dir, attend_to_mask_tokens=True),
+                          DocTokenizer(10, working_dir)]
+
+            for idx, tokenizer in enumerate(tokenizers):
+                # batches written with different padding lengths, collated in other groupings
+                prefix = os.path.join(working_dir, 'cache', str(idx))
+                with TokenizedTextsWriter(prefix, tokenizer) as writer:
+                    writer.write(texts[:2])
+                    writer.write(texts[2:5])
+                    writer.write(texts[5:])
+                tokenized = TokenizedTexts(prefix)
+                assert len(tokenized) == len(texts)
+
+                collate = collate_docs if isinstance(tokenizer, DocTokenizer) else collate_queries
+                for positions in [range(len(texts)), [3, 1], [2], [5, 0, 4]]:
+                    ids, mask = collate(tokenizer, [tokenized[position] for position in positions])
+                    expected_ids, expected_mask = tokenizer.tensorize([texts[position] for position in positions])
+                    assert torch.equal(ids, expected_ids)
+                    assert torch.equal(mask, expected_mask)
+
+    def test_argmax_inner_product(self):
+        torch.manual_seed(0)
+        centroids = torch.nn.functional.normalize(torch.randn(1000, 16), dim=-1)
+        embs = torch.nn.functional.normalize(torch.randn(300, 16), dim=-1)
+        centroids[700] = centroids[3]  # ties go to the first centroid
+        embs[0] = centroids[3]
+
+        codes = argmax_inner_product(centroids, embs, centroids_bsize=128)
+        assert codes.tolist() == (centroids @ embs.T).max(dim=0).indices.tolist()
+        assert codes[0].item() == 3
+
+    def test_delta_varint_postings(self):
+        centroids = torch.tensor([2, 0, 2, 2, 0, 3])
+        pids = torch.tensor([9, 1, 2**31 - 1, 9, 0, 300])
+
+        ivf, ivf_lengths = unique_postings(centroids, pids, num_partitions=4)
+        assert ivf.tolist() == [0, 1, 9, 2**31 - 1, 300]
+        assert ivf_lengths.tolist() == [2, 0, 2, 1]
+
+        encoded, encoded_lengths = encode_delta_varint(ivf, ivf_lengths)
+        assert encoded.dtype == torch.uint8
+        assert encoded_lengths.tolist() == [2, 0, 6, 2]
+        assert torch.equal(decode_delta_varint(encoded, ivf_lengths), ivf)
+        assert torch.equal(decode_delta_varint(encoded[8:], ivf_lengths[3:]), ivf[4:])
+
+    def test_streaming_kmeans(self):
+        torch.manual_seed(0)
+        centers = torch.nn.functional.normalize(torch.randn(4, 16), dim=-1)
+        sample = torch.nn.functional.normalize(centers.repeat(500, 1) + 0.05 * torch.randn(2000, 16), dim=-1)
+        is_heldout = torch.zeros(2000, dtype=torch.bool)
+        is_heldout[::10] = True
+
+        with tempfile.TemporaryDirectory() as working_dir:
+            # the shards of three ranks, one of which sampled no passages
+            shards = []
+            for rank, shard in enumerate([sample[:1200], sample[:0], sample[1200:]]):
+                path = os.path.join(working_dir, f'sample.{rank}.bin')
+                with open(path, 'wb') as f:
+                    save_flat_tensor(f, shard.half())
+                shards.append(load_flat_tensor(path, torch.float16, inner_dims=(16,)))
+            assert shards[1].shape == (0, 16)
+
+            centroids = compute_streaming_kmeans(shards, num_partitions=4, kmeans_niters=5, memory_budget_mb=1,
+                                                 is_heldout=is_heldout, batch_size=100)
+            assert centroids.shape == (4, 16)
+            assert (centers @ centroids.T).max(dim=1).values.min() > 0.99
+
+    def test_open_flat_file(self):
+        with tempfile.TemporaryDirectory() as working_dir:
+            path = os.path.join(working_dir, 'codes.bin')
+            with open_flat_file(path) as f:
+                save_flat_tensor(f, torch.arange(1000, dtype=torch.int32))
+
+            # a reader that mapped the file keeps seeing it after it is rewritten
+            mapped = load_flat_tensor(path, torch.int32)
+            with open_flat_file(path) as f:
+                save_flat_tensor(f, torch.zeros(10, dtype=torch.int32))
+
+            assert torch.equal(mapped, torch.arange(1000, dtype=torch.int32))
+            assert load_flat_tensor(path, torch.int32).tolist() == [0] * 10
+
+            # a failed write leaves the file as it was
+            with pytest.raises(RuntimeError):
+                with open_flat_file(path) as f:
+                    save_flat_tensor(f, torch.ones(5, dtype=torch.int32))
+                    raise RuntimeError()
+
+            assert load_flat_tensor(path, torch.int32).tolist() == [0] * 10
+            assert os.listdir(working_dir) == ['codes.bin']
+
+    def test_index_saver_failing_codec(self):
+        class FailingCodec:
+            def compress(self, embs):
+                raise ValueError("cannot compress")
+
+        class FailingSaver(IndexSaver):
+            def load_codec(self):
+                return FailingCodec()
+
+        saver = FailingSaver(config=None)
+        errors = []
+
+        def index():
+            try:
+                with saver.thread():
+                    for chunk_idx in range(10):
+                        saver.save_chunk(chunk_idx, 0, torch.zeros(4, 8), [4])
+            except ValueError as e:
+                errors.append(e)
+
+        # indexing fails instead of blocking on the queues
+        thread = threading.Thread(target=index, daemon=True)
+        thread.start()
+        thread.join(timeout=60)
+
+        assert not thread.is_alive()
+        assert [str(e) for e in errors] == ["cannot compress"]
+
 if __name__ == '__main__':
     test = TestOther()
     test.test_utility()
@@ -4,6 +4,7 @@ import os
 import tempfile
 import json
 from typing import Tuple
+from unittest.mock import patch
 
 from primeqa.ir.dense.colbert_top.colbert.utils.utils import create_directory, print_message
 from primeqa.ir.dense.colbert_top.colbert.infra import Run, RunConfig
@@ -14,7 +15,11 @@ from primeqa.ir.dense.colbert_top.colbert.trainer import Trainer
 from primeqa.ir.dense.colbert_top.colbert.utils.parser import Arguments
 from primeqa.ir.dense.colbert_top.colbert.training.training import train
 from primeqa.ir.dense.colbert_top.colbert.indexing.collection_indexer import encode
+from primeqa.ir.dense.colbert_top.colbert.indexing.utils import save_mmap_index
 from primeqa.ir.dense.colbert_top.colbert.searcher import Searcher
+from primeqa.ir.dense.colbert_top.colbert.search import index_storage
+from primeqa.ir.dense.colbert_top.colbert.data import Queries, Collection
+from primeqa.ir.dense.colbert_top.colbert.indexer import Indexer
 
 class TestTraining(UnitTest):
     def test_batchers(self):
@@ -115,6 +120,37 @@ class TestTraining(UnitTest):
                 out_fn = args_dict['ranks_fn']
                 rankings.save(out_fn)
 
+                # the batched path used by search_all agrees with searching one query at a time
+                Q = searcher.encode(list(Queries.cast(args_dict['queries']).values()))
+                for query_idx, (pids, _, _) in enumerate(searcher.dense_search_batch(Q, k=args_dict['topK'])):
+                    assert pids == searcher.dense_search(Q[query_idx:query_idx+1], k=args_dict['topK'])[0]
+
+                # also when the queries are ranked in blocks of one, to bound the memory of their centroid scores
+                with patch.object(index_storage, 'MAX_CENTROID_SCORES_BYTES', 1):
+                    assert searcher.search_all(args_dict['queries'], args_dict['topK']).todict() == rankings.todict()
+
+                # the memory-mapped index format returns the same rankings
+                save_mmap_index(args_dict['index_location'])
+                mmap_searcher = Searcher(args_dict['index_name'], checkpoint=args_dict['checkpoint'], collection=args_dict['collection'], config=colBERTConfig)
+                assert mmap_searcher.ranker.is_mmap
+                assert mmap_searcher.search_all(args_dict['queries'], args_dict['topK']).todict() == rankings.todict()
+
+                # passages can be added to and deleted from the index without rebuilding it
+                indexer = Indexer(args_dict['checkpoint'], config=ColBERTConfig(index_path=args_dict['index_location']))
+                indexer.delete([])  # saves tombstones with none set, which must cover the passages added next
+                new_pids = indexer.add(['an extra passage appended to the existing index'])
+                assert list(new_pids) == [len(Collection.cast(collection_fn))]
+                searcher = Searcher(args_dict['index_name'], checkpoint=args_dict['checkpoint'], collection=args_dict['collection'], config=colBERTConfig)
+                assert searcher.ranker.tombstones.size(0) == len(searcher.ranker.doclens) == new_pids[-1] + 1
+                searcher.search('an extra passage', k=args_dict['topK'])
+
+                deleted_pids = [pids[0][0] for pids in rankings.todict().values()]
+                indexer.delete(deleted_pids)
+                searcher = Searcher(args_dict['index_name'], checkpoint=args_dict['checkpoint'], collection=args_dict['collection'], config=colBERTConfig)
+                assert searcher.ranker.is_mmap and len(searcher.ranker.doclens) == new_pids[-1] + 1
+                for pids in searcher.search_all(args_dict['queries'], args_dict['topK']).todict().values():
+                    assert not set(pid for pid, *_ in pids) & set(deleted_pids)
+
             print("SEARCH DONE")
 
         print("ALL DONE")
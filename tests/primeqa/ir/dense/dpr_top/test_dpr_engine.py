@@ -138,4 +138,34 @@ class TestDprEngine(UnitTest):
             searcher.search()
             searcher.search(query_batch = ['Who maintained the throne for the longest time in China?'], mode = 'query_list')
 
+        print("===== DPR INDEXING AND SEARCH, --separate_vectors")
+
+        separate_vectors_dir = os.path.join(output_dir, "separate_vectors")
+        test_args = [
+            "prog",
+            "--dpr_ctx_encoder_model_name", "facebook/dpr-ctx_encoder-multiset-base",
+            "--dpr_ctx_encoder_path", os.path.join(output_dir, "ctx_encoder"),
+            "--embed", "1of1",
+            "--batch_size", "2",
+            "--separate_vectors",
+            "--corpus", os.path.join(test_files_location,"xorqa.train_ir_001pct_at_0_pct_collection_fornum.tsv"),
+            "--output_dir", separate_vectors_dir]
+
+        with patch.object(sys, 'argv', test_args):
+            indexer = DPRIndexer()
+            indexer.index()
+
+        test_args = [
+            "prog",
+            "--model_name_or_path", os.path.join(output_dir, "qry_encoder"),
+            "--qry_tokenizer_path", "facebook/dpr-question_encoder-multiset-base",
+            "--index_location", separate_vectors_dir,
+            "--output_dir", os.path.join(separate_vectors_dir, "search_output"),
+            "--top_k", "1"]
+
+        with patch.object(sys, 'argv', test_args):
+            searcher = DPRSearcher()
+            assert searcher.passages.vectors is not None
+            searcher.search(query_batch = ['Who maintained the throne for the longest time in China?'], mode = 'query_list')
+
         print("===== DPR ALL DONE")
\ No newline at end of file
@@ -0,0 +1,77 @@
+from tests.primeqa.mrc.common.base import UnitTest
+import os
+import base64
+import tempfile
+import ujson as json
+import numpy as np
+
+from unittest.mock import patch
+
+from primeqa.ir.dense.dpr_top.dpr import simple_mmap_dataset
+from primeqa.ir.dense.dpr_top.dpr.simple_mmap_dataset import Corpus, gzip_str, write_pid_index
+
+
+def write_passages_file(dir, name, pids):
+    # the same files as DPRIndexer writes: the gzipped records, their offsets and the pid index
+    offsets = [0]
+    with open(os.path.join(dir, f'passages{name}.json.gz.records'), 'wb') as f:
+        for pid in pids:
+            vector = np.full(4, len(pid), dtype=np.float16)
+            record = {'pid': pid, 'title': f'title {pid}', 'text': f'text of {pid}',
+                      'vector': base64.b64encode(vector.tobytes()).decode('ascii')}
+            f.write(gzip_str(json.dumps(record)))
+            offsets.append(f.tell())
+
+    np.save(os.path.join(dir, f'offsets{name}.npy'), np.array(offsets, dtype=np.int64), allow_pickle=False)
+    with open(os.path.join(dir, f'pid_index{name}.npy'), 'wb') as f:
+        write_pid_index(f, pids)
+
+
+class TestSimpleMmapDataset(UnitTest):
+    def write_corpus(self, dir):
+        write_passages_file(dir, '_1_of_2', [f'doc{i}' for i in range(0, 50)])
+        write_passages_file(dir, '_2_of_2', [f'doc{i}' for i in range(50, 120)])
+
+    def test_get_by_pid(self):
+        with tempfile.TemporaryDirectory() as working_dir:
+            self.write_corpus(working_dir)
+
+            corpus = Corpus(working_dir)
+            assert corpus.pid_indexes is not None
+            assert len(corpus) == 120
+
+            for pid in ['doc0', 'doc49', 'doc50', 'doc77', 'doc119']:
+                passage = corpus.get_by_pid(pid)
+                assert passage['pid'] == pid
+                assert passage['text'] == f'text of {pid}'
+
+            assert corpus.get_by_pid('doc120') is None
+            assert corpus.get_by_pid('') is None
+
+            # the pid index was used, not the dict built by scanning every record
+            assert len(corpus.pid2ndx) == 0
+            corpus.close()
+
+    def test_get_by_pid_hash_collisions(self):
+        # with a hash of only the pid length, most pids collide and the record has to be checked
+        with patch.object(simple_mmap_dataset, 'pid_hash', len), tempfile.TemporaryDirectory() as working_dir:
+            self.write_corpus(working_dir)
+
+            corpus = Corpus(working_dir)
+            for pid in ['doc3', 'doc30', 'doc60', 'doc110']:
+                assert corpus.get_by_pid(pid)['pid'] == pid
+
+            assert corpus.get_by_pid('doc999') is None
+            assert len(corpus.pid2ndx) == 0
+            corpus.close()
+
+    def test_get_by_pid_without_pid_index(self):
+        with tempfile.TemporaryDirectory() as working_dir:
+            self.write_corpus(working_dir)
+            os.remove(os.path.join(working_dir, 'pid_index_2_of_2.npy'))
+
+            corpus = Corpus(working_dir)
+            assert corpus.pid_indexes is None
+            assert corpus.get_by_pid('doc77')['pid'] == 'doc77'
+            assert corpus.get_by_pid('doc120') is None
+            corpus.close()
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+import torch
+
+from primeqa.mrc.models.onnx_model import ONNX_OUTPUT_NAMES, OnnxExtractiveQAModel, export_extractive_model_to_onnx
+from tests.primeqa.mrc.common.base import UnitTest
+
+
+class TestOnnxExtractiveQAModel(UnitTest):
+    def test_onnx_model_matches_pytorch_model(self, config_and_model_with_extractive_head, tokenizer, tmp_path):
+        pytest.importorskip('onnxruntime')
+        _, model = config_and_model_with_extractive_head
+        onnx_model = OnnxExtractiveQAModel(
+            export_extractive_model_to_onnx(model, tokenizer, str(tmp_path / 'model.onnx')))
+
+        # Batch size and sequence length differ from the ones used for export
+        inputs = tokenizer(["What time is it?"] * 3,
+                           ["The quick brown fox jumps over the lazy dog", "Go", "Glenn the otter lives at the aquarium"],
+                           padding=True, return_tensors='pt')
+        was_training = model.training
+        model.eval()
+        try:
+            with torch.no_grad():
+                expected_outputs = model(**inputs)
+        finally:
+            model.train(was_training)
+        outputs = onnx_model(**inputs)
+
+        for name in ONNX_OUTPUT_NAMES:
+            np.testing.assert_allclose(getattr(outputs, name).numpy(), getattr(expected_outputs, name).numpy(),
+                                       atol=1e-4)
@@ -142,9 +142,43 @@ class TestExtractivePostProcessor(UnitTest):
             ptargettype = int(np.argmax(predicted['target_type_logits']))
             assert (predicted['start_index'], predicted['end_index']) == expected_start_end
             assert predicted['passage_index']  == expected['passage_index'] 
-            assert ptargettype  == expected['target_type'] 
-
-
-
-
-    
+            assert ptargettype  == expected['target_type']
+
+    @pytest.mark.parametrize("scorer_type", SupportedSpanScorers.get_supported())
+    def test_top_k_span_predictions_match_exhaustive_search(self, scorer_type):
+        rng = np.random.default_rng(0)
+        seq_len, num_features, max_answer_length, k = 24, 3, 5, 10
+        example = {'example_id': 'foo', 'context': ['x' * 100]}
+        features = []
+        for _ in range(num_features):
+            offset_mapping = [None] * 4 + [[3 * i, 3 * i + 2] for i in range(int(rng.integers(8, seq_len - 4)))]
+            features.append({'example_id': 'foo', 'example_idx': 0, 'context_idx': 0,
+                             'offset_mapping': offset_mapping,
+                             'token_is_max_context': {str(i): bool(rng.random() < 0.7)
+                                                      for i in range(len(offset_mapping))}})
+        start_logits = rng.standard_normal((num_features, seq_len)).astype(np.float32)
+        end_logits = rng.standard_normal((num_features, seq_len)).astype(np.float32)
+        target_type_logits = rng.standard_normal((num_features, len(TargetType))).astype(np.float32)
+
+        # n_best_size covers the whole sequence, so every valid span is a candidate
+        postprocessor = ExtractivePostProcessor(k=k, n_best_size=seq_len, max_answer_length=max_answer_length,
+                                                scorer_type=SupportedSpanScorers(scorer_type))
+        predictions = postprocessor._top_k_span_predictions(example, features, start_logits, end_logits,
+                                                            target_type_logits)
+
+        expected = []
+        for i, feature in enumerate(features):
+            null_score = float(start_logits[i, 0]) + float(end_logits[i, 0])
+            for start_index in range(len(feature['offset_mapping'])):
+                for end_index in range(start_index, min(start_index + max_answer_length,
+                                                        len(feature['offset_mapping']))):
+                    if feature['offset_mapping'][start_index] is None or feature['offset_mapping'][end_index] is None \
+                            or not feature['token_is_max_context'][str(start_index)]:
+                        continue
+                    score = postprocessor._score_calculator(float(start_logits[i, start_index]) +
+                                                            float(end_logits[i, end_index]), null_score,
+                                                            target_type_logits[i].tolist())
+                    expected.append((score, start_index, end_index))
+        expected = sorted(expected, key=itemgetter(0), reverse=True)[:k]
+
+        assert [(p['span_answer_score'], p['start_index'], p['end_index']) for p in predictions] == expected
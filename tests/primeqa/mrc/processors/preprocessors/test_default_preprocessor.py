@@ -184,6 +184,16 @@ class TestDefaultPreProcessor(UnitTest):
         assert isinstance(eval_examples, Dataset)
         assert isinstance(eval_features, Dataset)
 
+    def test_eval_preprocessing_in_memory_matches_eval_preprocessing(self, eval_examples, preprocessor):
+        expected_examples, expected_features = preprocessor.process_eval(eval_examples)
+        examples, features = preprocessor.process_eval_in_memory(eval_examples.to_dict())
+
+        assert examples == list(expected_examples)
+        assert len(features) == expected_features.num_rows
+        for feature, expected_feature in zip(features, expected_features):
+            feature['offset_mapping'] = [list(o) if o is not None else None for o in feature['offset_mapping']]
+            assert feature == expected_feature
+
     def test_cannot_adapt_dataset_with_invalid_train_schema_names(self, preprocessor, invalid_name_train_examples):
         with raises(ValueError):
             _ = preprocessor.adapt_dataset(invalid_name_train_examples, is_train=True)
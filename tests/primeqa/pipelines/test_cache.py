@@ -0,0 +1,223 @@
+import gc
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import List
+from unittest.mock import patch
+
+import pytest
+
+from primeqa.pipelines.components import cache
+from primeqa.pipelines.components.base import RetrieverComponent
+from primeqa.pipelines.components.cache import LRUCache, SharedResources
+from primeqa.pipelines.components.retriever.dense import ColBERTRetriever
+from primeqa.ir.dense.colbert_top.colbert.infra.config import ColBERTConfig
+
+
+@dataclass
+class CountingRetriever(RetrieverComponent):
+    """
+    Retriever that records the queries which reach the engine.
+    """
+
+    def __post_init__(self):
+        self.engine_queries = []
+        self.num_loads = 0
+        self.fail_loads = False
+
+    def __hash__(self) -> int:
+        return hash((self.index_root, self.index_name))
+
+    def load(self, *args, **kwargs):
+        if self.fail_loads:
+            raise OSError("index is being rebuilt")
+        self.num_loads += 1
+
+    def retrieve(self, input_texts: List[str], *args, **kwargs):
+        return self._cached_retrieve(input_texts, 5, self._retrieve)
+
+    def _retrieve(self, input_texts: List[str]):
+        self.engine_queries.append(list(input_texts))
+        return [[(text.strip(), 1.0)] for text in input_texts]
+
+    def get_engine_type(self):
+        return "Counting"
+
+
+class TestLRUCache:
+    def test_hits_and_misses(self):
+        lru = LRUCache(maxsize=2)
+        assert lru.get("a") is None
+        lru.put("a", 1)
+        lru.put("b", 2)
+        assert lru.get("a") == 1
+
+        # "b" is the least recently used
+        lru.put("c", 3)
+        assert lru.get("b") is None
+        assert lru.get("c") == 3
+
+        assert lru.stats() == {"hits": 2, "misses": 2, "size": 2}
+
+        lru.clear()
+        assert len(lru) == 0
+
+    def test_disabled(self):
+        lru = LRUCache(maxsize=0)
+        lru.put("a", 1)
+        assert lru.get("a") is None
+        assert len(lru) == 0
+
+    def test_ttl(self):
+        with patch.object(cache.time, "monotonic", return_value=100.0) as monotonic:
+            lru = LRUCache(maxsize=10, ttl=5)
+            lru.put("a", 1)
+
+            monotonic.return_value = 104.0
+            assert lru.get("a") == 1
+
+            monotonic.return_value = 106.0
+            assert lru.get("a") is None
+            assert lru.stats() == {"hits": 1, "misses": 1, "size": 0}
+
+
+class Weights:
+    pass
+
+
+class TestSharedResources:
+    def test_concurrent_requests_load_once(self):
+        resources = SharedResources()
+        started, release = threading.Event(), threading.Event()
+        loads = []
+
+        def load():
+            loads.append(1)
+            started.set()
+            release.wait()
+            return Weights()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(resources.get("weights", load))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        started.wait()
+        release.set()
+        for thread in threads:
+            thread.join(timeout=10)
+
+        assert len(loads) == 1
+        assert len(results) == 4 and all(result is results[0] for result in results)
+        assert len(resources) == 1
+
+    def test_released_when_no_longer_held(self):
+        resources = SharedResources()
+        weights = resources.get("weights", Weights)
+        assert resources.get("weights", Weights) is weights
+        assert len(resources) == 1
+
+        del weights
+        gc.collect()
+        assert len(resources) == 0
+
+        reloaded = []
+        resources.get("weights", lambda: reloaded.append(1) or Weights())
+        assert reloaded == [1]
+
+    def test_failed_load_is_retried(self):
+        resources = SharedResources()
+
+        def failing_load():
+            raise ValueError("cannot load")
+
+        with pytest.raises(ValueError):
+            resources.get("weights", failing_load)
+
+        weights = resources.get("weights", Weights)
+        assert resources.get("weights", failing_load) is weights
+
+
+class TestRetrieverCache:
+    def test_deduplicates_queries(self):
+        retriever = CountingRetriever(index_root="/nonexistent", index_name="index", collection=None)
+
+        results = retriever.retrieve(["what is  cached", "what is cached", "other", "what is cached "])
+        assert retriever.engine_queries == [["what is  cached", "other"]]
+        assert [result[0][0] for result in results] == ["what is  cached", "what is  cached", "other", "what is  cached"]
+
+        retriever.retrieve(["other", "new"])
+        assert retriever.engine_queries[-1] == ["new"]
+
+        # every query text is one lookup, duplicates included
+        assert retriever.cache_stats()["results"] == {"hits": 1, "misses": 5, "size": 3}
+
+    def test_query_encodings(self):
+        retriever = CountingRetriever(index_root="/nonexistent", index_name="index", collection=None)
+        encoded = []
+
+        def encode(texts):
+            encoded.append(list(texts))
+            return [len(text) for text in texts]
+
+        assert retriever._cached_query_encodings(["a b", "a  b", "cd"], encode) == [3, 3, 2]
+        assert retriever._cached_query_encodings(["cd", "efg"], encode) == [2, 3]
+        assert encoded == [["a b", "cd"], ["efg"]]
+
+    def test_reloaded_when_index_changes(self):
+        with tempfile.TemporaryDirectory() as index_root:
+            os.makedirs(os.path.join(index_root, "index"))
+            retriever = CountingRetriever(index_root=index_root, index_name="index", collection=None)
+            retriever.INDEX_VERSION_CHECK_INTERVAL = 0
+            retriever.load()
+
+            retriever.retrieve(["query"])
+            retriever.retrieve(["query"])
+            retriever._cached_query_encodings(["query"], lambda texts: [len(text) for text in texts])
+            assert len(retriever.engine_queries) == 1
+
+            # the index is rebuilt, while it cannot be loaded yet
+            metadata_path = os.path.join(index_root, "index", "metadata.json")
+            with open(metadata_path, "w") as f:
+                f.write("{}")
+            os.utime(metadata_path, ns=(1 << 62, 1 << 62))
+            retriever.fail_loads = True
+
+            retriever.retrieve(["query"])
+            assert len(retriever.engine_queries) == 1 and retriever.num_loads == 1
+
+            # once reloaded, results are retrieved from the new index, but query encodings are kept
+            retriever.fail_loads = False
+            retriever.retrieve(["query"])
+            retriever.retrieve(["query"])
+            assert len(retriever.engine_queries) == 2 and retriever.num_loads == 2
+            assert retriever.cache_stats()["results"]["size"] == 1
+            assert retriever.cache_stats()["queries"]["size"] == 1
+
+
+class TestColBERTRetriever:
+    def test_new_searcher_when_index_changes(self):
+        searchers = []
+
+        class FakeSearcher:
+            config = ColBERTConfig()
+
+        def load_searcher():
+            searchers.append(FakeSearcher())
+            return searchers[-1]
+
+        with tempfile.TemporaryDirectory() as index_root, \
+                patch.object(ColBERTRetriever, "_load_searcher", side_effect=load_searcher):
+            os.makedirs(os.path.join(index_root, "index"))
+            retrievers = [
+                ColBERTRetriever(index_root=index_root, index_name="index", ncells=ncells) for ncells in [1, 2]
+            ]
+            for retriever in retrievers:
+                retriever.load()
+            assert len(searchers) == 1
+
+            os.utime(os.path.join(index_root, "index"), ns=(1 << 62, 1 << 62))
+            retrievers[0].reload_index()
+            assert len(searchers) == 2
+            assert retrievers[0]._shared_searcher is searchers[1]
+            assert retrievers[1]._shared_searcher is searchers[0]
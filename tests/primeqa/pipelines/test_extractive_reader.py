@@ -0,0 +1,138 @@
+import random
+import tempfile
+import threading
+
+import pytest
+import torch
+from datasets import Dataset
+from transformers import BertConfig, BertTokenizerFast, DataCollatorWithPadding, TrainingArguments
+
+from primeqa.mrc.models.heads.extractive import EXTRACTIVE_HEAD
+from primeqa.mrc.models.task_model import ModelForDownstreamTasks
+from primeqa.mrc.processors.postprocessors.extractive import ExtractivePostProcessor
+from primeqa.mrc.trainers.mrc import MRCTrainer
+from primeqa.pipelines.components.reader.extractive import ExtractiveReader
+
+WORDS = "the a dog cat walks bob alice who what time is it quick brown fox jumps over lazy otter lives at".split() + [
+    f"w{i}" for i in range(200)
+]
+
+
+@pytest.fixture(scope="module")
+def model_dir():
+    """
+    A small, randomly initialized BERT with an extractive head, saved with its tokenizer.
+    """
+    torch.manual_seed(0)
+    with tempfile.TemporaryDirectory() as model_dir:
+        vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS
+        with open(f"{model_dir}/vocab.txt", "w") as f:
+            f.write("\n".join(vocab))
+        BertTokenizerFast(vocab_file=f"{model_dir}/vocab.txt").save_pretrained(model_dir)
+
+        config = BertConfig(
+            vocab_size=len(vocab),
+            hidden_size=32,
+            num_hidden_layers=2,
+            num_attention_heads=2,
+            intermediate_size=64,
+        )
+        model = ModelForDownstreamTasks.model_class_from_config(config)(config, task_heads=EXTRACTIVE_HEAD)
+        model.save_pretrained(model_dir)
+        config.save_pretrained(model_dir)
+        yield model_dir
+
+
+def random_examples(num_examples, seed=1):
+    rng = random.Random(seed)
+
+    def text(num_words):
+        return " ".join(rng.choice(WORDS) for _ in range(num_words))
+
+    questions = [text(rng.randint(2, 8)) for _ in range(num_examples)]
+    contexts = [[text(rng.randint(3, 150)) for _ in range(rng.randint(1, 3))] for _ in range(num_examples)]
+    return questions, contexts
+
+
+class TestExtractiveReader:
+    def test_readers_share_weights_but_not_tokenizers(self, model_dir):
+        readers = [
+            ExtractiveReader(model=model_dir, max_seq_len=64, stride=16),
+            ExtractiveReader(model=model_dir, max_seq_len=48, stride=8),
+        ]
+        for reader in readers:
+            reader.load()
+
+        assert readers[0]._loaded_model is readers[1]._loaded_model
+        assert readers[0]._tokenizer is not readers[1]._tokenizer
+
+        questions, contexts = random_examples(6)
+        expected = [reader.predict(questions, contexts) for reader in readers]
+
+        # readers running at once tokenize with their own stride and length
+        results, errors = {}, []
+
+        def predict(idx):
+            try:
+                for _ in range(10):
+                    results.setdefault(idx, []).append(readers[idx].predict(questions, contexts))
+            except Exception as err:
+                errors.append(err)
+
+        threads = [threading.Thread(target=predict, args=(idx,)) for idx in range(len(readers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=120)
+
+        assert errors == []
+        for idx in range(len(readers)):
+            assert results[idx] == [expected[idx]] * 10
+
+    def test_predict_matches_trainer(self, model_dir):
+        reader = ExtractiveReader(model=model_dir, max_seq_len=64, stride=16, batch_size=3, max_num_answers=5)
+        reader.load()
+        questions, contexts = random_examples(7)
+
+        predictions = reader.predict(questions, contexts)
+
+        # the Trainer-based path that `predict` replaced
+        postprocessor = ExtractivePostProcessor(
+            k=5,
+            n_best_size=reader.n_best_size,
+            max_answer_length=reader.max_answer_length,
+            scorer_type=reader._scorer_type_as_enum,
+        )
+        with tempfile.TemporaryDirectory() as output_dir:
+            trainer = MRCTrainer(
+                model=reader._loaded_model,
+                tokenizer=reader._tokenizer,
+                args=TrainingArguments(output_dir=output_dir, report_to=[]),
+                data_collator=DataCollatorWithPadding(reader._tokenizer),
+                post_process_function=postprocessor.process,
+            )
+            eval_examples, eval_dataset = reader._preprocessor.process_eval(
+                Dataset.from_dict(
+                    dict(question=questions, context=contexts, example_id=[str(idx) for idx in range(7)])
+                )
+            )
+            expected = trainer.predict(eval_dataset=eval_dataset, eval_examples=eval_examples)
+
+        assert sorted(predictions) == sorted(expected)
+        for example_id, expected_predictions in expected.items():
+            assert len(predictions[example_id]) == len(expected_predictions) > 0
+            for prediction, expected_prediction in zip(predictions[example_id], expected_predictions):
+                for key in ["example_id", "passage_index", "span_answer_text", "span_answer"]:
+                    assert prediction[key] == expected_prediction[key]
+                for key in ["span_answer_score", "confidence_score"]:
+                    assert prediction[key] == pytest.approx(expected_prediction[key], abs=1e-5)
+
+    def test_predict_without_features(self, model_dir):
+        reader = ExtractiveReader(model=model_dir, max_seq_len=64, stride=16)
+        reader.load()
+
+        assert reader.predict([], []) == {}
+        assert reader.predict(["who walks the dog"], [[]]) == {"0": []}
+
+        predictions = reader.predict(["who walks the dog", "what time is it"], [[], ["bob walks the dog"]])
+        assert predictions["0"] == [] and len(predictions["1"]) > 0
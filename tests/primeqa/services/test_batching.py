@@ -0,0 +1,144 @@
+import gc
+import threading
+import time
+
+import pytest
+
+from primeqa.services.batching import MicroBatcher, RetrieverScheduler
+
+
+class Recorder:
+    """
+    Batch function that records the batches it gets, optionally after waiting for `release`.
+    """
+
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, items):
+        self.release.wait()
+        self.batches.append(list(items))
+        if self.fail_on is not None and self.fail_on in items:
+            raise ValueError(f"cannot process {self.fail_on}")
+        return [item * 2 for item in items]
+
+
+class Retriever:
+    def __init__(self):
+        self.calls = []
+
+    def retrieve(self, input_texts, **kwargs):
+        self.calls.append((list(input_texts), kwargs))
+        return [(text, kwargs.get("max_num_documents")) for text in input_texts]
+
+
+class TestMicroBatcher:
+    def test_coalesces_requests(self):
+        recorder = Recorder()
+        batcher = MicroBatcher(recorder, max_batch_size=4, max_latency_ms=2000)
+
+        futures = [batcher.submit([idx]) for idx in range(3)]
+        futures.append(batcher.submit([3, 4]))
+        futures.append(batcher.submit([5]))
+
+        assert [future.result(timeout=10) for future in futures] == [[0], [2], [4], [6, 8], [10]]
+
+        # [3, 4] does not fit in the first batch, and starts the next one
+        assert recorder.batches == [[0, 1, 2], [3, 4, 5]]
+
+    def test_max_latency(self):
+        recorder = Recorder()
+        batcher = MicroBatcher(recorder, max_batch_size=100, max_latency_ms=50)
+
+        start = time.monotonic()
+        assert batcher([1]) == [2]
+        assert 0.04 <= time.monotonic() - start < 5
+        assert recorder.batches == [[1]]
+
+    def test_large_request(self):
+        recorder = Recorder()
+        batcher = MicroBatcher(recorder, max_batch_size=2, max_latency_ms=10)
+
+        assert batcher([1, 2, 3]) == [2, 4, 6]
+        assert batcher([]) == []
+        assert recorder.batches == [[1, 2, 3]]
+
+    def test_errors(self):
+        recorder = Recorder(fail_on=13)
+        recorder.release.clear()
+        batcher = MicroBatcher(recorder, max_batch_size=10, max_latency_ms=200)
+
+        good, bad = batcher.submit([1, 2]), batcher.submit([13])
+        recorder.release.set()
+
+        # the batch fails, so each request is re-run on its own and only the invalid one fails
+        assert good.result(timeout=10) == [2, 4]
+        with pytest.raises(ValueError, match="cannot process 13"):
+            bad.result(timeout=10)
+        assert recorder.batches == [[1, 2, 13], [1, 2], [13]]
+
+    def test_wrong_number_of_results(self):
+        batcher = MicroBatcher(lambda items: items[1:], max_batch_size=10, max_latency_ms=10)
+
+        with pytest.raises(RuntimeError):
+            batcher([1, 2])
+
+    def test_idle_worker_exits(self):
+        batcher = MicroBatcher(Recorder(), max_batch_size=10, max_latency_ms=10, idle_timeout_s=0.05)
+        assert batcher._worker is None
+
+        assert batcher([1]) == [2]
+        worker = batcher._worker
+        worker.join(timeout=10)
+        assert not worker.is_alive()
+        assert batcher._worker is None
+
+        # a new worker is started for the next request
+        assert batcher([2]) == [4]
+
+
+class TestScheduler:
+    def test_requests_with_different_arguments(self):
+        retriever = Retriever()
+        scheduler = RetrieverScheduler(max_batch_size=10, max_latency_ms=200)
+
+        results = {}
+
+        def retrieve(name, texts, **kwargs):
+            results[name] = scheduler.retrieve(retriever, texts, **kwargs)
+
+        threads = [
+            threading.Thread(target=retrieve, args=("a", ["q1", "q2"]), kwargs={"max_num_documents": 5}),
+            threading.Thread(target=retrieve, args=("b", ["q3"]), kwargs={"max_num_documents": 10}),
+            threading.Thread(target=retrieve, args=("c", ["q4"]), kwargs={"max_num_documents": 5}),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+
+        assert results == {
+            "a": [("q1", 5), ("q2", 5)],
+            "b": [("q3", 10)],
+            "c": [("q4", 5)],
+        }
+        # one batcher for the instance, whatever the arguments
+        assert len(scheduler._batchers) == 1
+        # each call got the queries of requests with the same arguments only
+        assert sorted(text for texts, _ in retriever.calls for text in texts) == ["q1", "q2", "q3", "q4"]
+        for texts, kwargs in retriever.calls:
+            assert (kwargs["max_num_documents"] == 10) == (texts == ["q3"])
+
+    def test_batcher_released_with_instance(self):
+        scheduler = RetrieverScheduler(max_batch_size=10, max_latency_ms=10)
+
+        retriever = Retriever()
+        assert scheduler.retrieve(retriever, ["q"]) == [("q", None)]
+        assert len(scheduler._batchers) == 1
+
+        del retriever
+        gc.collect()
+        assert len(scheduler._batchers) == 0
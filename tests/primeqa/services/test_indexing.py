@@ -0,0 +1,221 @@
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from primeqa.services.constants import (
+    ATTR_INDEX_ID,
+    ATTR_INDEXING_STARTED_AT,
+    ATTR_NUM_DOCUMENTS,
+    ATTR_NUM_DOCUMENTS_PROCESSED,
+    ATTR_STATUS,
+    IndexStatus,
+)
+from primeqa.services.grpc_server.grpc_generated.indexer_pb2 import (
+    Document,
+    GenerateIndexRequest,
+    IndexerComponent,
+)
+from primeqa.services.grpc_server.indexer_service import IndexerService
+from primeqa.services.indexing import IndexingJobs, get_index_progress
+from primeqa.services.store import EXTN_SQL_LITE, Store, StoreFactory
+
+
+class FakeIndexer:
+    """
+    Indexer which reports `num_indexed_documents` and, if given, waits for `release` before completing.
+    """
+
+    def __init__(self, fail=False, release=None):
+        self.fail = fail
+        self.release = release
+        self.num_indexed_documents = 0
+        self.indexed_paths = []
+
+    def get_engine_type(self):
+        return "FAKE"
+
+    def index(self, documents_path):
+        self.indexed_paths.append(documents_path)
+        if self.release is not None:
+            self.release.wait(timeout=10)
+        if self.fail:
+            raise RuntimeError("indexing failed")
+
+    def get_num_indexed_documents(self):
+        return self.num_indexed_documents
+
+
+@pytest.fixture
+def store():
+    with tempfile.TemporaryDirectory() as store_dir, patch.dict("os.environ", {"STORE_DIR": store_dir}), \
+            patch.object(StoreFactory, "_instance", None):
+        yield StoreFactory.get_store()
+
+
+def index_information(index_id, num_documents=10):
+    return {ATTR_INDEX_ID: index_id, ATTR_STATUS: IndexStatus.INDEXING.value, ATTR_NUM_DOCUMENTS: num_documents}
+
+
+class TestGetIndexProgress:
+    def test_ready(self):
+        progress = get_index_progress({ATTR_STATUS: IndexStatus.READY.value, ATTR_NUM_DOCUMENTS: 10})
+        assert progress == {ATTR_NUM_DOCUMENTS: 10, ATTR_NUM_DOCUMENTS_PROCESSED: 10, "eta_secs": 0.0}
+
+    def test_eta(self):
+        with patch("primeqa.services.indexing.time.time", return_value=130.0):
+            progress = get_index_progress(
+                {
+                    ATTR_STATUS: IndexStatus.INDEXING.value,
+                    ATTR_NUM_DOCUMENTS: 100,
+                    ATTR_NUM_DOCUMENTS_PROCESSED: 25,
+                    ATTR_INDEXING_STARTED_AT: 100.0,
+                }
+            )
+        # 25 documents in 30 seconds: 75 left take 90 more
+        assert progress == {ATTR_NUM_DOCUMENTS: 100, ATTR_NUM_DOCUMENTS_PROCESSED: 25, "eta_secs": 90.0}
+
+    def test_no_eta_before_progress_or_when_corrupt(self):
+        information = {
+            ATTR_STATUS: IndexStatus.INDEXING.value,
+            ATTR_NUM_DOCUMENTS: 100,
+            ATTR_INDEXING_STARTED_AT: time.time(),
+        }
+        assert get_index_progress(information)["eta_secs"] is None
+
+        information.update({ATTR_STATUS: IndexStatus.CORRUPT.value, ATTR_NUM_DOCUMENTS_PROCESSED: 25})
+        assert get_index_progress(information)["eta_secs"] is None
+
+
+class TestIndexingJobs:
+    def test_ready(self, store):
+        jobs = IndexingJobs(store, max_workers=1, progress_interval_secs=0)
+        indexer = FakeIndexer()
+
+        information = jobs.run(indexer, index_information("index-1"))
+
+        assert information[ATTR_STATUS] == IndexStatus.READY.value
+        assert information[ATTR_NUM_DOCUMENTS_PROCESSED] == 10
+        assert store.get_index_information("index-1") == information
+        assert indexer.indexed_paths == [store.get_index_documents_file_path("index-1")]
+        jobs.shutdown()
+
+    def test_corrupt(self, store):
+        jobs = IndexingJobs(store, max_workers=1, progress_interval_secs=0)
+
+        information = jobs.submit(FakeIndexer(fail=True), index_information("index-1")).result(timeout=10)
+
+        assert information[ATTR_STATUS] == IndexStatus.CORRUPT.value
+        assert information[ATTR_NUM_DOCUMENTS_PROCESSED] == 0
+        assert store.get_index_information("index-1")[ATTR_STATUS] == IndexStatus.CORRUPT.value
+        jobs.shutdown()
+
+    def test_progress(self, store):
+        jobs = IndexingJobs(store, max_workers=1, progress_interval_secs=0.01)
+        release = threading.Event()
+        indexer = FakeIndexer(release=release)
+
+        job = jobs.submit(indexer, index_information("index-1"))
+        for _ in range(500):
+            if indexer.indexed_paths:
+                break
+            time.sleep(0.01)
+        indexer.num_indexed_documents = 4
+        for _ in range(500):
+            if store.get_index_information("index-1").get(ATTR_NUM_DOCUMENTS_PROCESSED) == 4:
+                break
+            time.sleep(0.01)
+
+        progress = get_index_progress(store.get_index_information("index-1"))
+        assert progress[ATTR_NUM_DOCUMENTS_PROCESSED] == 4
+        assert progress["eta_secs"] is not None and progress["eta_secs"] >= 0
+
+        release.set()
+        assert job.result(timeout=10)[ATTR_STATUS] == IndexStatus.READY.value
+        assert get_index_progress(store.get_index_information("index-1"))[ATTR_NUM_DOCUMENTS_PROCESSED] == 10
+        jobs.shutdown()
+
+
+class TestIndexDocumentsWriter:
+    def test_write(self, store):
+        with store.open_index_documents_writer("index-1", batch_size=2) as writer:
+            assert writer.write([{"text": "first", "title": "one"}, {"text": "second"}]) == 2
+            assert writer.write(iter([{"text": "third", "document_id": "d3"}])) == 3
+
+        with open(store.get_index_documents_file_path("index-1"), encoding="utf-8") as f:
+            assert f.read() == "id\ttext\ttitle\n1\tfirst\tone\n2\tsecond\t\n3\tthird\t\n"
+
+        assert store.get_index_documents("index-1", [1, 2, 3]) == {
+            "1": {"text": "first", "title": "one"},
+            "2": {"text": "second"},
+            "3": {"text": "third", "document_id": "d3"},
+        }
+
+    def test_close_is_idempotent(self, store):
+        on_close = MagicMock()
+        writer = store.open_index_documents_writer("index-1")
+        writer._on_close = on_close
+        writer.write([{"text": "first"}])
+
+        writer.close()
+        writer.close()
+
+        on_close.assert_called_once()
+        assert os.path.exists(store.get_index_documents_file_path("index-1", extension=EXTN_SQL_LITE))
+
+
+class TestGenerateIndex:
+    @pytest.fixture
+    def service(self, store):
+        config = SimpleNamespace(
+            max_concurrent_indexing_jobs=1,
+            index_progress_interval_secs=0,
+            index_documents_batch_size=2,
+            background_indexing=False,
+        )
+        service = IndexerService(config)
+        yield service
+        service._indexing_jobs.shutdown()
+
+    def requests(self, interrupt_after=None):
+        for request_idx in range(3):
+            if request_idx == interrupt_after:
+                raise RuntimeError("stream cancelled")
+            yield GenerateIndexRequest(
+                indexer=IndexerComponent(indexer_id="BM25Indexer"),
+                documents=[Document(text=f"text {request_idx}", title=f"title {request_idx}")],
+                index_id="index-1",
+            )
+
+    def test_generate_index(self, service, store):
+        with patch("primeqa.services.grpc_server.indexer_service.IndexerFactory.get", return_value=FakeIndexer()):
+            response = service.GenerateIndex(self.requests(), MagicMock())
+
+        assert response.index_id == "index-1"
+        information = store.get_index_information("index-1")
+        assert information[ATTR_STATUS] == IndexStatus.READY.value
+        assert information[ATTR_NUM_DOCUMENTS] == 3
+
+    def test_interrupted_stream(self, service, store):
+        with patch("primeqa.services.grpc_server.indexer_service.IndexerFactory.get", return_value=FakeIndexer()):
+            with pytest.raises(RuntimeError, match="stream cancelled"):
+                service.GenerateIndex(self.requests(interrupt_after=2), MagicMock())
+
+        assert store.get_index_information("index-1")[ATTR_STATUS] == IndexStatus.CORRUPT.value
+        # the documents received before the interruption were saved
+        assert store.get_index_documents("index-1", [1, 2, 3]) == {
+            "1": {"text": "text 0", "title": "title 0"},
+            "2": {"text": "text 1", "title": "title 1"},
+        }
+
+    def test_interrupted_before_documents_writer_is_open(self, service, store):
+        with patch("primeqa.services.grpc_server.indexer_service.IndexerFactory.get", return_value=FakeIndexer()), \
+                patch.object(Store, "open_index_documents_writer", side_effect=OSError("disk full")):
+            with pytest.raises(OSError, match="disk full"):
+                service.GenerateIndex(self.requests(), MagicMock())
+
+        assert store.get_index_information("index-1")[ATTR_STATUS] == IndexStatus.CORRUPT.value
@@ -0,0 +1,122 @@
+import threading
+
+import numpy as np
+import pytest
+import torch
+
+from primeqa.services.instance_cache import InstanceCache, estimate_memory
+
+
+class Model:
+    def __init__(self, num_bytes, shared=None):
+        self.weights = torch.zeros(num_bytes, dtype=torch.uint8)
+        self.shared = shared
+
+
+class TestEstimateMemory:
+    def test_counts_shared_tensors_once(self):
+        shared = torch.zeros(1000, dtype=torch.uint8)
+        models = [Model(100, shared), Model(200, shared)]
+
+        assert estimate_memory(models) == 1300
+        assert estimate_memory([models[0]]) == 1100
+
+    def test_skips_views_and_memmaps(self, tmp_path):
+        array = np.zeros(100, dtype=np.uint8)
+        memmap = np.memmap(tmp_path / "array.bin", dtype=np.uint8, mode="w+", shape=(1000,))
+
+        assert estimate_memory([{"array": array, "view": array[10:], "memmap": memmap}]) == 100
+
+
+class TestInstanceCache:
+    def test_concurrent_loaders_share_one_load(self):
+        cache = InstanceCache(max_instances=2)
+        started, release = threading.Event(), threading.Event()
+        loads = []
+
+        def load():
+            loads.append(1)
+            started.set()
+            release.wait()
+            return Model(10)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get("model", load))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        started.wait()
+        assert cache.stats()["loading"] == 1
+
+        release.set()
+        for thread in threads:
+            thread.join(timeout=10)
+
+        assert len(loads) == 1
+        assert len(results) == 4 and all(result is results[0] for result in results)
+        assert cache.stats()["loading"] == 0
+
+    def test_failed_load_raises_to_waiters_and_is_retried(self):
+        cache = InstanceCache(max_instances=2)
+        started, release = threading.Event(), threading.Event()
+
+        def failing_load():
+            started.set()
+            release.wait()
+            raise ValueError("cannot load")
+
+        errors = []
+
+        def get():
+            try:
+                cache.get("model", failing_load)
+            except ValueError as err:
+                errors.append(err)
+
+        loader = threading.Thread(target=get)
+        loader.start()
+        started.wait()
+        waiter = threading.Thread(target=get)
+        waiter.start()
+
+        release.set()
+        loader.join(timeout=10)
+        waiter.join(timeout=10)
+
+        assert len(errors) == 2
+        assert cache.stats() == {"instances": 0, "loading": 0, "memory_mb": 0}
+
+        model = cache.get("model", lambda: Model(10))
+        assert cache.get("model", pytest.fail) is model
+
+    def test_evicts_least_recently_used_beyond_max_instances(self):
+        cache = InstanceCache(max_instances=2)
+        a = cache.get("a", lambda: Model(10))
+        cache.get("b", lambda: Model(10))
+        assert cache.get("a", pytest.fail) is a
+
+        cache.get("c", lambda: Model(10))
+
+        assert cache.stats()["instances"] == 2
+        assert cache.get("a", pytest.fail) is a
+        reloaded = []
+        cache.get("b", lambda: reloaded.append(1) or Model(10))
+        assert reloaded == [1]
+
+    def test_evicts_beyond_max_memory(self):
+        cache = InstanceCache(max_instances=10, max_memory_mb=3)
+        cache.get("a", lambda: Model(2**20))
+        cache.get("b", lambda: Model(2**20))
+        assert cache.stats() == {"instances": 2, "loading": 0, "memory_mb": 2}
+
+        cache.get("c", lambda: Model(2 * 2**20))
+        assert cache.stats() == {"instances": 2, "loading": 0, "memory_mb": 3}
+        reloaded = []
+        cache.get("a", lambda: reloaded.append(1) or Model(2**20))
+        assert reloaded == [1]
+
+        # the most recently used instance is kept even if it is larger than the bound
+        cache.get("d", lambda: Model(4 * 2**20))
+        assert cache.stats() == {"instances": 1, "loading": 0, "memory_mb": 4}
+
+        cache.clear()
+        assert cache.stats() == {"instances": 0, "loading": 0, "memory_mb": 0}
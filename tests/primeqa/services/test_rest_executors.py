@@ -0,0 +1,126 @@
+import asyncio
+import tempfile
+import threading
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from primeqa.services.exceptions import Error
+from primeqa.services.rest_server.executors import ComponentExecutor
+from primeqa.services.rest_server.server import RestServer
+from primeqa.services.store import StoreFactory
+
+
+def occupy(executor, release):
+    """
+    Starts a call that blocks `executor` until `release` is set. Returns the thread running it, once running.
+    """
+    running = threading.Event()
+
+    def block():
+        running.set()
+        release.wait()
+
+    thread = threading.Thread(target=asyncio.run, args=(executor.run(block),), daemon=True)
+    thread.start()
+    assert running.wait(timeout=10)
+    return thread
+
+
+def config(**kwargs):
+    values = dict(
+        reader_max_batch_size=1,
+        reader_max_batch_latency_ms=0,
+        retriever_max_batch_size=1,
+        retriever_max_batch_latency_ms=0,
+        rest_async_handlers=True,
+        rest_reader_threads=1,
+        rest_retriever_threads=1,
+        rest_indexer_threads=1,
+        rest_max_queued_requests=0,
+        require_client_auth=False,
+    )
+    values.update(kwargs)
+    return SimpleNamespace(**values)
+
+
+class TestComponentExecutor:
+    def test_stats(self):
+        executor = ComponentExecutor("reader", max_workers=2, max_queued=0)
+
+        def fail():
+            raise ValueError("failed")
+
+        assert asyncio.run(executor.run(sum, [1, 2])) == 3
+        with pytest.raises(ValueError):
+            asyncio.run(executor.run(fail))
+
+        assert executor.stats() == {
+            "running": 0,
+            "queued": 0,
+            "max_workers": 2,
+            "max_queued": 0,
+            "completed": 1,
+            "failed": 1,
+            "rejected": 0,
+        }
+        executor.shutdown()
+
+    def test_admission_limit(self):
+        executor = ComponentExecutor("reader", max_workers=1, max_queued=1)
+        release = threading.Event()
+
+        running = occupy(executor, release)
+        queued = threading.Thread(target=asyncio.run, args=(executor.run(sum, [1]),), daemon=True)
+        queued.start()
+
+        # one call running and one waiting: the next one is rejected right away
+        for _ in range(100):
+            if executor.stats()["queued"] == 1:
+                break
+            threading.Event().wait(0.01)
+        assert executor.stats()["running"] == 1 and executor.stats()["queued"] == 1
+
+        with pytest.raises(Error, match="E1002"):
+            asyncio.run(executor.run(sum, [1]))
+
+        release.set()
+        running.join(timeout=10)
+        queued.join(timeout=10)
+
+        stats = executor.stats()
+        assert (stats["running"], stats["queued"], stats["completed"], stats["rejected"]) == (0, 0, 2, 1)
+        executor.shutdown()
+
+
+class TestRestServerExecutors:
+    @pytest.fixture
+    def server(self):
+        with tempfile.TemporaryDirectory() as store_dir, patch.dict("os.environ", {"STORE_DIR": store_dir}), \
+                patch.object(StoreFactory, "_instance", None):
+            yield RestServer(config=config())
+
+    def test_busy_reader(self, server):
+        release = threading.Event()
+
+        with TestClient(server.create_app()) as client:
+            running = occupy(server._executors["reader"], release)
+
+            response = client.post("/answers", json={"reader": {"reader_id": "ExtractiveReader"}, "queries": ["q"]})
+            assert response.status_code == 503
+            assert response.json()["detail"]["code"] == "E1002"
+            assert response.headers["Retry-After"] == "1"
+
+            # cheap handlers are not affected
+            assert client.get("/metrics").json()["reader"]["rejected"] == 1
+
+            release.set()
+            running.join(timeout=10)
+
+            metrics = client.get("/metrics").json()
+            assert metrics["reader"]["completed"] == 1 and metrics["reader"]["running"] == 0
+
+        # the executors are shut down with the server
+        assert all(executor._executor._shutdown for executor in server._executors.values())
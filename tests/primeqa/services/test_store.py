@@ -0,0 +1,121 @@
+import tempfile
+from unittest.mock import patch
+
+import pytest
+from sqlitedict import SqliteDict
+
+from primeqa.services.store import (
+    EXTN_SQL_LITE,
+    TABLENAME_DOCUMENTS,
+    IndexDocumentsReader,
+    StoreFactory,
+    decode_document,
+    encode_document,
+)
+
+
+@pytest.fixture
+def store():
+    with tempfile.TemporaryDirectory() as store_dir, patch.dict("os.environ", {"STORE_DIR": store_dir}), \
+            patch.object(StoreFactory, "_instance", None):
+        yield StoreFactory.get_store()
+
+
+def documents(num_documents, prefix="text"):
+    return [{"text": f"{prefix} {i}"} for i in range(1, num_documents + 1)]
+
+
+class TestDocumentEncoding:
+    def test_json_and_pickled_documents(self):
+        document = {"text": "Gebäude", "title": "t", "document_id": "d1"}
+
+        encoded = encode_document(document)
+        assert isinstance(encoded, str) and "Gebäude" in encoded
+        assert decode_document(encoded) == document
+
+        with SqliteDict(":memory:") as legacy:
+            pickled = legacy.encode(document)
+        assert decode_document(pickled) == document
+
+
+class TestIndexDocumentsReader:
+    def test_chunks_ids(self, store):
+        store.save_index_documents("index-1", documents(1200))
+        reader = IndexDocumentsReader(
+            store.get_index_documents_file_path("index-1", extension=EXTN_SQL_LITE)
+        )
+        queries = []
+        reader._connection.set_trace_callback(queries.append)
+
+        fetched = reader.get([str(i) for i in range(1, 1201)] + ["1201", "unknown"])
+
+        assert len(queries) == 3
+        assert len(fetched) == 1200
+        assert fetched["1"] == {"text": "text 1"} and fetched["1200"] == {"text": "text 1200"}
+        reader.close()
+
+    def test_missing_database(self, store):
+        with pytest.raises(FileNotFoundError):
+            IndexDocumentsReader(store.get_index_documents_file_path("unknown", extension=EXTN_SQL_LITE))
+
+
+class TestGetIndexDocuments:
+    def test_missing_ids_are_left_out(self, store):
+        store.save_index_documents("index-1", documents(3))
+
+        assert store.get_index_documents("index-1", [3, "1", 7, 1]) == {
+            "3": {"text": "text 3"},
+            "1": {"text": "text 1"},
+        }
+        assert store.get_index_document("index-1", 2) == {"text": "text 2"}
+        with pytest.raises(KeyError):
+            store.get_index_document("index-1", 7)
+
+    def test_legacy_pickled_rows(self, store):
+        store.save_index_documents("index-1", documents(2))
+        # rows written before documents were encoded as JSON are pickled
+        with SqliteDict(
+            store.get_index_documents_file_path("index-1", extension=EXTN_SQL_LITE),
+            tablename=TABLENAME_DOCUMENTS,
+            autocommit=True,
+        ) as legacy:
+            legacy["3"] = {"text": "pickled", "title": "legacy"}
+
+        assert store.get_index_documents("index-1", [1, 3]) == {
+            "1": {"text": "text 1"},
+            "3": {"text": "pickled", "title": "legacy"},
+        }
+
+    def test_cached_documents(self, store):
+        store.save_index_documents("index-1", documents(3))
+
+        store.get_index_documents("index-1", [1, 2])
+        with patch.object(store, "get_index_documents_database", side_effect=AssertionError("not cached")):
+            assert store.get_index_documents("index-1", [2, 1]) == {
+                "2": {"text": "text 2"},
+                "1": {"text": "text 1"},
+            }
+
+    def test_cache_cleared_when_index_is_deleted(self, store):
+        store.save_index_documents("index-1", documents(3))
+        store.get_index_documents("index-1", [1, 2])
+        assert len(store._documents_cache) == 2
+
+        store.delete_index("index-1")
+
+        assert len(store._documents_cache) == 0
+        with pytest.raises(FileNotFoundError):
+            store.get_index_documents("index-1", [1])
+
+    def test_cache_cleared_when_index_is_rewritten(self, store):
+        store.save_index_documents("index-1", documents(3))
+        store.get_index_documents("index-1", [1, 2])
+
+        writer = store.open_index_documents_writer("index-1")
+        writer.write(documents(3, prefix="new"))
+        writer.close()
+
+        assert store.get_index_documents("index-1", [1, 2]) == {
+            "1": {"text": "new 1"},
+            "2": {"text": "new 2"},
+        }
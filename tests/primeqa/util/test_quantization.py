@@ -0,0 +1,35 @@
+import torch
+
+from primeqa.util.transformers_utils.quantization import quantize_dynamic_int8, output_similarity
+
+
+class Tester:
+    def test_quantize_dynamic_int8(self):
+        torch.manual_seed(0)
+        model = torch.nn.Sequential(torch.nn.Linear(64, 64), torch.nn.ReLU(), torch.nn.Linear(64, 16)).eval()
+        inputs = torch.randn(8, 64)
+
+        quantized = quantize_dynamic_int8(model)
+        assert quantized is not model
+        assert isinstance(model[0], torch.nn.Linear)
+        assert not isinstance(quantized[0], torch.nn.Linear)
+        with torch.no_grad():
+            assert output_similarity(model(inputs), quantized(inputs)) > 0.99
+
+    def test_quantize_dynamic_int8_keeps_model_failing_accuracy_check(self):
+        model = torch.nn.Sequential(torch.nn.Linear(8, 8)).eval()
+        scores = []
+
+        def accuracy_check(reference, quantized):
+            scores.append(0.5)
+            return scores[-1]
+
+        assert quantize_dynamic_int8(model, accuracy_check=accuracy_check, min_score=0.9) is model
+        assert quantize_dynamic_int8(model, accuracy_check=accuracy_check, min_score=0.1) is not model
+        assert scores == [0.5, 0.5]
+
+    def test_output_similarity_with_mask(self):
+        reference = torch.tensor([[1.0, 0.0], [0.0, 1.0]])
+        quantized = torch.tensor([[1.0, 0.0], [1.0, 0.0]])
+        assert output_similarity(reference, quantized) == 0.5
+        assert output_similarity(reference, quantized, mask=torch.tensor([True, False])) == 1.0